@@ -0,0 +1,89 @@
+"""Database profiles selected with the ``DATABASE_PROFILE`` environment variable.
+
+``sqlite`` (the default) suits a single node: WAL journaling lets readers
+carry on while a booking is written, ``IMMEDIATE`` transactions take the
+write lock up front so concurrent writers wait for it (up to
+``SQLITE_BUSY_TIMEOUT`` seconds) instead of failing halfway through, and
+``synchronous=NORMAL`` is safe with WAL.
+
+``postgres`` suits several workers. Connections are kept open for
+``DB_CONN_MAX_AGE`` seconds, or, with ``DB_POOL=1``, taken from a
+psycopg pool of up to ``DB_POOL_MAX_SIZE`` connections per process
+(requires ``psycopg[pool]``). Connection details come from ``POSTGRES_DB``,
+``POSTGRES_USER``, ``POSTGRES_PASSWORD``, ``POSTGRES_HOST`` and
+``POSTGRES_PORT``.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    # 64 MiB page cache and memory-mapped reads
+    'PRAGMA cache_size=-65536',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+]
+
+
+def _flag(name, default='0'):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+
+def sqlite(base_dir):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', base_dir / 'db.sqlite3'),
+        'OPTIONS': {
+            'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+        },
+        'TEST': {
+            # A file rather than the shared-cache in-memory default, so
+            # threaded tests see SQLite's real locking behaviour.
+            'NAME': base_dir / 'test_db.sqlite3',
+        },
+    }
+
+
+def postgres(base_dir):
+    pool = _flag('DB_POOL')
+    options = {}
+    if pool:
+        options['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'barber_booking'),
+        'USER': os.environ.get('POSTGRES_USER', ''),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', ''),
+        'PORT': os.environ.get('POSTGRES_PORT', ''),
+        # Django refuses persistent connections on top of a pool
+        'CONN_MAX_AGE': 0 if pool else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': not pool,
+        'OPTIONS': options,
+    }
+
+
+PROFILES = {
+    'sqlite': sqlite,
+    'postgres': postgres,
+}
+
+
+def from_environment(base_dir):
+    """Return the ``default`` database settings of the ``DATABASE_PROFILE`` profile."""
+    name = os.environ.get('DATABASE_PROFILE', 'sqlite')
+    try:
+        return PROFILES[name](base_dir)
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown DATABASE_PROFILE {name!r}; expected one of {', '.join(PROFILES)}"
+        ) from None
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 
+from . import databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'booking.profiling.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,13 +80,38 @@ WSGI_APPLICATION = 'barber_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite for a single node or PostgreSQL for several workers; see barber_system/databases.py
 DATABASES = {
+    'default': databases.from_environment(BASE_DIR),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# LocMem is per process; multi-worker deployments should point
+# CACHE_BACKEND/CACHE_LOCATION at a shared cache such as Redis or Memcached
+# so availability invalidation reaches every worker.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'barber-booking'),
     }
 }
 
+AVAILABILITY_CACHE_ALIAS = 'default'
+AVAILABILITY_CACHE_TIMEOUT = 60 * 60
+# Seconds browsers may reuse availability JSON before revalidating its ETag
+AVAILABILITY_HTTP_MAX_AGE = 0
+
+# Fans committed booking changes out to live availability streams. The
+# in-process broker only reaches viewers of the same ASGI process.
+LIVE_UPDATES_BROKER = 'booking.live.InProcessBroker'
+# Comment sent on idle streams so proxies keep the connection open
+LIVE_UPDATES_KEEPALIVE_SECONDS = 15
+# Under WSGI a stream holds a worker thread, so it ends after this long
+LIVE_UPDATES_WSGI_STREAM_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -139,4 +167,44 @@ EMAIL_HOST = 'smtp.example.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'your-email@example.com'
-EMAIL_HOST_PASSWORD = 'your-password'
\ No newline at end of file
+EMAIL_HOST_PASSWORD = 'your-password'
+
+# Booking emails are queued in the outbox and sent by `manage.py send_outbox`
+BOOKING_NOTIFICATION_EMAILS = ['admin@example.com']
+
+# Request profiling (booking.profiling.RequestProfilingMiddleware)
+# Server-Timing headers expose internals, so they are on only in DEBUG by
+# default. REQUEST_PROFILING_SAMPLE_RATE is the fraction of requests run
+# under cProfile; profiles of requests slower than REQUEST_PROFILING_SLOW_MS
+# are logged and, if REQUEST_PROFILING_DIR is set, dumped there.
+REQUEST_PROFILING_SERVER_TIMING = DEBUG
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 0))
+REQUEST_PROFILING_SLOW_MS = 500
+REQUEST_PROFILING_DIR = os.environ.get('REQUEST_PROFILING_DIR')
+
+
+# Logging
+# BOOKING_LOG_LEVEL=INFO adds one structured line per request from
+# booking.profiling; DEBUG also logs the views' debug output.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'plain',
+        },
+    },
+    'loggers': {
+        'booking': {
+            'handlers': ['console'],
+            'level': os.environ.get('BOOKING_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
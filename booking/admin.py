@@ -1,12 +1,98 @@
 from django.contrib import admin
-from .models import Barber, Customer, Booking
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from . import pagination, weekdays
+from .models import Barber, Customer, Booking, OutboundEmail, ScheduleException, Service, WaitlistEntry
+
+
+class KeysetPaginator(Paginator):
+    """Paginator for keyset-filtered querysets that never runs COUNT(*).
+
+    The queryset already starts at the cursor, so only "this page" and
+    "is there more" matter: the count is capped at one row past the page.
+    """
+
+    @cached_property
+    def count(self):
+        return len(self.object_list[:self.per_page + 1])
 
 
 admin.site.register(Customer)
-admin.site.register(Booking)
+
+
+@admin.register(Booking)
+class BookingAdmin(admin.ModelAdmin):
+    list_display = ('customer', 'barber', 'date', 'time', 'service')
+    # __str__ and the list columns read customer, barber and service for every row
+    list_select_related = ('customer', 'barber', 'service')
+    raw_id_fields = ('customer', 'barber')
+    # Keyset pagination on (date, time, id); see changelist_view
+    ordering = pagination.ORDERING
+    sortable_by = ()
+    paginator = KeysetPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/booking/booking/change_list.html'
+
+    def changelist_view(self, request, extra_context=None):
+        # The cursor is not a field lookup, so keep it away from ChangeList
+        request.GET = request.GET.copy()
+        request.booking_cursor = request.GET.pop(pagination.CURSOR_VAR, [None])[-1]
+        response = super().changelist_view(request, extra_context)
+
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is not None and changelist.multi_page:
+            changelist.result_list = list(changelist.result_list)
+            if changelist.result_list:
+                response.context_data['next_cursor'] = pagination.encode_cursor(changelist.result_list[-1])
+        return response
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        cursor = getattr(request, 'booking_cursor', None)
+        if cursor:
+            try:
+                queryset = pagination.after(queryset, cursor)
+            except ValueError:
+                pass
+        return queryset
+
 
 @admin.register(Barber)
 class BarberAdmin(admin.ModelAdmin):
-    list_display = ('name', 'specialization', 'start_time', 'end_time', 'working_days')
+    list_display = ('name', 'specialization', 'start_time', 'end_time', 'working_days_display')
     list_filter = ('specialization',)
-    search_fields = ('name',)
\ No newline at end of file
+    search_fields = ('name',)
+
+    @admin.display(description='Working days', ordering='working_days')
+    def working_days_display(self, obj):
+        return weekdays.display(obj.working_days)
+
+
+@admin.register(ScheduleException)
+class ScheduleExceptionAdmin(admin.ModelAdmin):
+    list_display = ('barber', 'kind', 'start_date', 'end_date', 'start_time', 'end_time', 'reason')
+    list_filter = ('kind', 'barber')
+    list_select_related = ('barber',)
+    date_hierarchy = 'start_date'
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('customer', 'barber', 'date', 'earliest_time', 'latest_time', 'service', 'status', 'created_at')
+    list_filter = ('status', 'barber')
+    list_select_related = ('customer', 'barber')
+    raw_id_fields = ('customer', 'booking')
+    date_hierarchy = 'date'
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+
+
+@admin.register(Service)
+class ServiceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'duration_minutes', 'description')
+    search_fields = ('name',)
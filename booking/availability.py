@@ -0,0 +1,267 @@
+"""Availability calculations shared by the booking views.
+
+Bookings for a whole date window are loaded with a single query and folded
+into per (barber, date) :class:`~booking.occupancy.Occupancy` bitmasks, so
+the cost of a page no longer grows with the number of days and barbers
+being checked.
+"""
+from datetime import date, timedelta
+
+from django.db.models import Sum
+
+from .models import Booking
+from .occupancy import Occupancy, slot_count
+from .schedule import DaySchedule
+from .slots import SLOT_MINUTES, booked_slots_expression
+from .weekdays import weekdays as mask_weekdays
+
+
+LOOKAHEAD_DAYS = 30
+
+
+def daterange(start_date, end_date):
+    """Yield every date from start_date to end_date inclusive."""
+    for i in range((end_date - start_date).days + 1):
+        yield start_date + timedelta(days=i)
+
+
+def working_weekdays(barber):
+    """Return the set of weekday numbers (Monday = 0) the barber works."""
+    return mask_weekdays(barber.working_days)
+
+
+def _occupancy_rows(barbers_by_id, start_date, end_date):
+    return Booking.objects.filter(
+        barber_id__in=barbers_by_id, date__range=(start_date, end_date)
+    ).values_list('barber_id', 'date', 'time', 'duration_minutes')
+
+
+def _fold_occupancy(barbers_by_id, rows, exceptions):
+    occupancies = {}
+    for barber_id, day, time, duration in rows:
+        key = (barber_id, day)
+        if key not in occupancies:
+            occupancies[key] = Occupancy.for_barber(
+                barbers_by_id[barber_id], slot_minutes=SLOT_MINUTES, day=day, exceptions=exceptions.get(barber_id),
+            )
+        occupancies[key].book(time, duration_minutes=duration)
+    return occupancies
+
+
+def load_occupancy(barbers, start_date, end_date, exceptions=None):
+    """Load the barbers' bookings for a window in one query.
+
+    Returns a mapping of ``(barber_id, date)`` to :class:`Occupancy`. Days
+    without bookings are left out; use :func:`occupancy_for` to read it.
+    ``exceptions`` maps barber ids to their
+    :class:`~booking.schedule_exceptions.ExceptionIndex`, so days with
+    changed hours keep bookings outside the usual ones.
+    """
+    barbers_by_id = {barber.id: barber for barber in barbers}
+    return _fold_occupancy(barbers_by_id, _occupancy_rows(barbers_by_id, start_date, end_date), exceptions or {})
+
+
+async def aload_occupancy(barbers, start_date, end_date, exceptions=None):
+    """Async version of :func:`load_occupancy`."""
+    barbers_by_id = {barber.id: barber for barber in barbers}
+    rows = [row async for row in _occupancy_rows(barbers_by_id, start_date, end_date)]
+    return _fold_occupancy(barbers_by_id, rows, exceptions or {})
+
+
+def occupancy_for(barber, day, occupancies):
+    """Return the barber's occupancy on a day from a :func:`load_occupancy` mapping."""
+    occupancy = occupancies.get((barber.id, day))
+    if occupancy is None:
+        occupancy = Occupancy.for_barber(barber, slot_minutes=SLOT_MINUTES)
+    return occupancy
+
+
+def free_slots(barber, day, occupancies, now=None, slots=1, exceptions=None):
+    """Return the times on a day where the barber has ``slots`` free slots in a row.
+
+    When ``now`` is given and ``day`` is today, slots that have already
+    started are dropped. Days with time off or changed hours in
+    ``exceptions`` (the barber's
+    :class:`~booking.schedule_exceptions.ExceptionIndex`) are worked out on
+    the interval schedule instead of the bitmask.
+    """
+    after = now.time() if now is not None and day == now.date() else None
+    occupancy = occupancy_for(barber, day, occupancies)
+    if not exceptions or not exceptions.affects(day):
+        return occupancy.free_slots(after=after, slots=slots)
+    schedule = DaySchedule.for_barber(barber, occupancy.booked_runs(), day=day, exceptions=exceptions)
+    return schedule.free_starts(slots * occupancy.template.slot_minutes, after)
+
+
+def free_slots_by_barber(barbers, start_date, end_date, occupancies, now=None, exceptions=None):
+    """Return ``{barber_id: {date: [free slot times]}}`` for every working day in the window.
+
+    ``exceptions`` maps barber ids to their
+    :class:`~booking.schedule_exceptions.ExceptionIndex`.
+    """
+    exceptions = exceptions or {}
+    result = {}
+    for barber in barbers:
+        weekdays = working_weekdays(barber)
+        index = exceptions.get(barber.id)
+        result[barber.id] = {
+            day: free_slots(barber, day, occupancies, now=now, exceptions=index)
+            for day in daterange(start_date, end_date)
+            if is_working(barber, day, weekdays, index)
+        }
+    return result
+
+
+def has_free_slot(barber, day, occupancies):
+    """Whether the barber has at least one unbooked slot on a day."""
+    return not occupancy_for(barber, day, occupancies).is_fully_booked()
+
+
+def _count_rows(barbers, start_date, end_date):
+    return Booking.objects.filter(
+        barber_id__in=[barber.id for barber in barbers], date__range=(start_date, end_date)
+    ).values('barber_id', 'date').annotate(booked=Sum(booked_slots_expression()))
+
+
+def booked_counts(barbers, start_date, end_date):
+    """Count booked slots per ``(barber_id, date)`` in the window with one aggregate query."""
+    return {
+        (row['barber_id'], row['date']): row['booked']
+        for row in _count_rows(barbers, start_date, end_date)
+    }
+
+
+async def abooked_counts(barbers, start_date, end_date):
+    """Async version of :func:`booked_counts`."""
+    return {
+        (row['barber_id'], row['date']): row['booked']
+        async for row in _count_rows(barbers, start_date, end_date)
+    }
+
+
+def full_days_from_counts(barbers, counts, exceptions=None):
+    """Return the ``(barber_id, date)`` pairs whose booked slots reach the barber's capacity.
+
+    On days with time off or changed hours in ``exceptions`` (barber id to
+    :class:`~booking.schedule_exceptions.ExceptionIndex`), the capacity is
+    that of the changed hours, less the slots the time off touches.
+    """
+    barbers_by_id = {barber.id: barber for barber in barbers}
+    capacity = {barber.id: slot_count(barber) for barber in barbers}
+    exceptions = exceptions or {}
+    full = set()
+    for (barber_id, day), booked in counts.items():
+        index = exceptions.get(barber_id)
+        if index and index.affects(day):
+            limit = Occupancy.for_barber(
+                barbers_by_id[barber_id], slot_minutes=SLOT_MINUTES, day=day, exceptions=index,
+            ).capacity
+        else:
+            limit = capacity[barber_id]
+        if booked >= limit:
+            full.add((barber_id, day))
+    return full
+
+
+def is_working(barber, day, weekdays, exceptions=None):
+    """Whether the barber works on ``day``, given their ``working_weekdays`` and exception index.
+
+    Changed hours open days the barber does not usually work, and time off
+    covering the day's hours closes it.
+    """
+    if not exceptions:
+        return day.weekday() in weekdays
+    return exceptions.is_working(day, day.weekday() in weekdays, barber.start_time, barber.end_time)
+
+
+def is_open(barber, day, full_days, weekdays, exceptions=None):
+    """Whether the barber works on ``day`` and it is not fully booked."""
+    return (barber.id, day) not in full_days and is_working(barber, day, weekdays, exceptions)
+
+
+def open_dates_by_barber(barbers, start_date, end_date, full_days, exceptions=None):
+    """Return each barber's open dates in the window, given the set of fully booked days.
+
+    ``exceptions`` maps barber ids to their
+    :class:`~booking.schedule_exceptions.ExceptionIndex`.
+    """
+    exceptions = exceptions or {}
+    dates = {}
+    for barber in barbers:
+        weekdays = working_weekdays(barber)
+        index = exceptions.get(barber.id)
+        dates[barber.id] = [
+            day for day in daterange(start_date, end_date)
+            if is_open(barber, day, full_days, weekdays, index)
+        ]
+    return dates
+
+
+def first_open_dates(barbers, start_date, end_date, full_days, exceptions=None):
+    """Return each barber's first open date in the window (or None), given the fully booked days."""
+    exceptions = exceptions or {}
+    first = {}
+    for barber in barbers:
+        weekdays = working_weekdays(barber)
+        index = exceptions.get(barber.id)
+        first[barber.id] = next(
+            (day for day in daterange(start_date, end_date) if is_open(barber, day, full_days, weekdays, index)),
+            None,
+        )
+    return first
+
+
+def available_dates_by_barber(barbers, start_date, end_date, exceptions=None):
+    """Return each barber's dates with at least one free slot, keyed by barber id.
+
+    A day is only unavailable for a barber once its booked slots reach the
+    barber's slot capacity, so the whole roster costs a single query.
+    """
+    barbers = list(barbers)
+    counts = booked_counts(barbers, start_date, end_date)
+    return open_dates_by_barber(
+        barbers, start_date, end_date, full_days_from_counts(barbers, counts, exceptions), exceptions,
+    )
+
+
+async def aavailable_dates_by_barber(barbers, start_date, end_date, exceptions=None):
+    """Async version of :func:`available_dates_by_barber`."""
+    barbers = list(barbers)
+    counts = await abooked_counts(barbers, start_date, end_date)
+    return open_dates_by_barber(
+        barbers, start_date, end_date, full_days_from_counts(barbers, counts, exceptions), exceptions,
+    )
+
+
+def available_dates(barbers, start_date, end_date):
+    """Return the sorted dates on which at least one of the barbers has a free slot."""
+    dates = set()
+    for barber_dates in available_dates_by_barber(barbers, start_date, end_date).values():
+        dates.update(barber_dates)
+    return sorted(dates)
+
+
+def next_available_dates(barbers, today=None, days=LOOKAHEAD_DAYS, exceptions=None):
+    """Return each barber's first open day in the next ``days`` days, keyed by barber id.
+
+    Barbers with no open day in the window map to None.
+    """
+    barbers = list(barbers)
+    today = today or date.today()
+    end_date = today + timedelta(days=days - 1)
+    counts = booked_counts(barbers, today, end_date)
+    full = full_days_from_counts(barbers, counts, exceptions)
+    return first_open_dates(barbers, today, end_date, full, exceptions)
+
+
+def annotate_next_available(barbers, next_dates):
+    """Set ``next_available_date`` and ``is_fully_booked`` on each barber.
+
+    ``next_dates`` maps barber ids to dates as returned by
+    :func:`next_available_dates`. Returns the barbers as a list.
+    """
+    barbers = list(barbers)
+    for barber in barbers:
+        barber.next_available_date = next_dates.get(barber.id)
+        barber.is_fully_booked = barber.next_available_date is None
+    return barbers
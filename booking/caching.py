@@ -0,0 +1,248 @@
+"""Versioned cache in front of the availability engine.
+
+Every entry key embeds a per-barber version counter. Saving or deleting a
+booking or barber bumps that barber's counter (see ``booking.signals``), so
+entries computed before the change are never read again and simply expire.
+
+The cache alias comes from ``AVAILABILITY_CACHE_ALIAS`` and entry lifetime
+from ``AVAILABILITY_CACHE_TIMEOUT``. Version counters never expire.
+
+Schedule exception indexes are kept in process memory instead, under a
+separate ``exceptions`` counter that only changes with the barber's
+exceptions, so new bookings do not throw them away.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import schedule, schedule_exceptions, summaries
+
+
+AVAILABILITY = 'availability'
+EXCEPTIONS = 'exceptions'
+# Keyed by customer rather than barber; see user_bookings_version()
+BOOKINGS = 'bookings'
+
+# {barber_id: (exceptions version, ExceptionIndex)}
+_exception_indexes = {}
+
+
+def get_cache():
+    return caches[getattr(settings, 'AVAILABILITY_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 60 * 60)
+
+
+def _version_key(barber_id, namespace=AVAILABILITY):
+    return f'{namespace}:version:{barber_id}'
+
+
+def _new_version():
+    # Seeded from the clock rather than 1, so a counter that was evicted never
+    # comes back at a value an old entry was stored under.
+    return time.time_ns()
+
+
+def get_versions(barber_ids, namespace=AVAILABILITY):
+    """Return the current version counter of each barber, keyed by barber id."""
+    cache = get_cache()
+    keys = {_version_key(barber_id, namespace): barber_id for barber_id in barber_ids}
+    versions = {keys[key]: version for key, version in cache.get_many(keys).items()}
+    for key, barber_id in keys.items():
+        if barber_id not in versions:
+            new_version = _new_version()
+            cache.add(key, new_version, timeout=None)
+            versions[barber_id] = cache.get(key, new_version)
+    return versions
+
+
+async def aget_versions(barber_ids, namespace=AVAILABILITY):
+    """Async version of :func:`get_versions`."""
+    cache = get_cache()
+    keys = {_version_key(barber_id, namespace): barber_id for barber_id in barber_ids}
+    versions = {keys[key]: version for key, version in (await cache.aget_many(keys)).items()}
+    for key, barber_id in keys.items():
+        if barber_id not in versions:
+            new_version = _new_version()
+            await cache.aadd(key, new_version, timeout=None)
+            versions[barber_id] = await cache.aget(key, new_version)
+    return versions
+
+
+def bump_version(barber_id, namespace=AVAILABILITY):
+    """Invalidate every cached availability entry (or the exception index) of a barber."""
+    cache = get_cache()
+    key = _version_key(barber_id, namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def user_bookings_version(user_id):
+    """Return the version counter of a customer's bookings, for keying their cached fragments."""
+    return get_versions([user_id], BOOKINGS)[user_id]
+
+
+def bump_user_bookings(user_id):
+    """Invalidate every cached fragment showing a customer's bookings."""
+    bump_version(user_id, BOOKINGS)
+
+
+def _entry_key(kind, barber_id, suffix, version):
+    return f'availability:{kind}:{barber_id}:{suffix}:{version}'
+
+
+def _get_or_compute(kind, barbers, suffix, compute):
+    """Look up one entry per barber, computing all misses in a single call.
+
+    ``compute`` receives the list of barbers without a cached entry and
+    returns their values keyed by barber id.
+    """
+    cache = get_cache()
+    versions = get_versions([barber.id for barber in barbers])
+    keys = {
+        barber.id: _entry_key(kind, barber.id, suffix, versions[barber.id])
+        for barber in barbers
+    }
+    found = cache.get_many(keys.values())
+    values = {barber_id: found[key] for barber_id, key in keys.items() if key in found}
+
+    missing = [barber for barber in barbers if barber.id not in values]
+    if missing:
+        computed = compute(missing)
+        cache.set_many({keys[barber_id]: value for barber_id, value in computed.items()}, _timeout())
+        values.update(computed)
+    return values
+
+
+async def _aget_or_compute(kind, barbers, suffix, compute):
+    """Async version of :func:`_get_or_compute`; ``compute`` is a coroutine function."""
+    cache = get_cache()
+    versions = await aget_versions([barber.id for barber in barbers])
+    keys = {
+        barber.id: _entry_key(kind, barber.id, suffix, versions[barber.id])
+        for barber in barbers
+    }
+    found = await cache.aget_many(keys.values())
+    values = {barber_id: found[key] for barber_id, key in keys.items() if key in found}
+
+    missing = [barber for barber in barbers if barber.id not in values]
+    if missing:
+        computed = await compute(missing)
+        await cache.aset_many({keys[barber_id]: value for barber_id, value in computed.items()}, _timeout())
+        values.update(computed)
+    return values
+
+
+def _union(by_barber):
+    dates = set()
+    for barber_dates in by_barber.values():
+        dates.update(barber_dates)
+    return sorted(dates)
+
+
+def exception_indexes(barbers):
+    """Return ``{barber_id: ExceptionIndex}``; indexes that changed are loaded in one query."""
+    barbers = list(barbers)
+    versions = get_versions([barber.id for barber in barbers], EXCEPTIONS)
+    indexes = {}
+    for barber in barbers:
+        version, index = _exception_indexes.get(barber.id, (None, None))
+        if version == versions[barber.id]:
+            indexes[barber.id] = index
+    missing = [barber.id for barber in barbers if barber.id not in indexes]
+    if missing:
+        for barber_id, index in schedule_exceptions.load_indexes(missing).items():
+            _exception_indexes[barber_id] = (versions[barber_id], index)
+            indexes[barber_id] = index
+    return indexes
+
+
+async def aexception_indexes(barbers):
+    """Async version of :func:`exception_indexes`."""
+    barbers = list(barbers)
+    versions = await aget_versions([barber.id for barber in barbers], EXCEPTIONS)
+    indexes = {}
+    for barber in barbers:
+        version, index = _exception_indexes.get(barber.id, (None, None))
+        if version == versions[barber.id]:
+            indexes[barber.id] = index
+    missing = [barber.id for barber in barbers if barber.id not in indexes]
+    if missing:
+        for barber_id, index in (await schedule_exceptions.aload_indexes(missing)).items():
+            _exception_indexes[barber_id] = (versions[barber_id], index)
+            indexes[barber_id] = index
+    return indexes
+
+
+def available_dates(barbers, start_date, end_date):
+    """Available dates read from the day summaries, cached per barber and window."""
+    barbers = list(barbers)
+    by_barber = _get_or_compute(
+        'dates', barbers, f'{start_date.isoformat()}:{end_date.isoformat()}',
+        lambda missing: summaries.available_dates_by_barber(
+            missing, start_date, end_date, exception_indexes(missing),
+        ),
+    )
+    return _union(by_barber)
+
+
+async def aavailable_dates(barbers, start_date, end_date):
+    """Async version of :func:`available_dates`."""
+    barbers = list(barbers)
+
+    async def compute(missing):
+        return await summaries.aavailable_dates_by_barber(
+            missing, start_date, end_date, await aexception_indexes(missing),
+        )
+
+    by_barber = await _aget_or_compute(
+        'dates', barbers, f'{start_date.isoformat()}:{end_date.isoformat()}', compute,
+    )
+    return _union(by_barber)
+
+
+def next_available_dates(barbers, today):
+    """Next available dates read from the day summaries, cached per barber and day."""
+    return _get_or_compute(
+        'next', list(barbers), today.isoformat(),
+        lambda missing: summaries.next_available_dates(missing, today, exceptions=exception_indexes(missing)),
+    )
+
+
+def day_schedules(barbers, day):
+    """Return ``{barber_id: DaySchedule}`` for a day; misses are loaded in one query.
+
+    The schedules include the barbers' time off and changed hours.
+    """
+    barbers = list(barbers)
+    bookings = _get_or_compute(
+        'intervals', barbers, day.isoformat(),
+        lambda missing: schedule.intervals_by_barber([barber.id for barber in missing], day),
+    )
+    indexes = exception_indexes(barbers)
+    return {
+        barber.id: schedule.DaySchedule.for_barber(
+            barber, bookings[barber.id], day=day, exceptions=indexes[barber.id],
+        )
+        for barber in barbers
+    }
+
+
+def day_schedule(barber, day):
+    """Return the barber's :class:`~booking.schedule.DaySchedule`; the day's bookings are cached."""
+    return day_schedules([barber], day)[barber.id]
+
+
+async def aday_schedule(barber, day):
+    """Async version of :func:`day_schedule`."""
+    bookings = await _aget_or_compute(
+        'intervals', [barber], day.isoformat(),
+        lambda missing: schedule.aintervals_by_barber([barber.id for barber in missing], day),
+    )
+    indexes = await aexception_indexes([barber])
+    return schedule.DaySchedule.for_barber(barber, bookings[barber.id], day=day, exceptions=indexes[barber.id])
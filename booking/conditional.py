@@ -0,0 +1,67 @@
+"""Conditional GET for the availability JSON endpoints.
+
+An availability response only changes when a barber it covers changes
+version (see :mod:`booking.caching`): every booking, barber and schedule
+exception write bumps it. Hashing the request parameters together with
+those versions gives a strong ETag that costs a cache lookup, so a request
+whose ``If-None-Match`` still matches gets a 304 before the view computes
+anything.
+
+Responses are marked ``Cache-Control: public, max-age=N, must-revalidate``
+with N from ``AVAILABILITY_HTTP_MAX_AGE`` (default 0), so browsers keep the
+body and revalidate it on every use.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from . import caching
+
+
+def make_etag(*parts):
+    """Return a strong ETag for the given parts."""
+    return quote_etag(hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()[:32])
+
+
+async def barber_versions(barber_ids):
+    """Return ``id:version`` parts of the barbers' availability versions, for :func:`make_etag`."""
+    versions = await caching.aget_versions(barber_ids)
+    return [f'{barber_id}:{versions[barber_id]}' for barber_id in sorted(versions)]
+
+
+def _patch_cache_control(response):
+    patch_cache_control(
+        response, public=True, max_age=getattr(settings, 'AVAILABILITY_HTTP_MAX_AGE', 0), must_revalidate=True,
+    )
+
+
+def etag_condition(etag_func):
+    """Async counterpart of Django's ``condition(etag_func=...)`` decorator.
+
+    ``etag_func`` is a coroutine function taking the view's arguments and
+    returning the ETag, or None to skip conditional handling (for instance
+    when the parameters are invalid and the view will answer with an error).
+    Only successful responses get the ETag and caching headers.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs)
+            if etag is None:
+                return await view(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response.headers['ETag'] = etag
+            _patch_cache_control(response)
+            return response
+
+        return inner
+
+    return decorator
@@ -1,5 +1,8 @@
 from django import forms
-from .models import Booking
+from django.utils import timezone
+from . import availability, caching
+from .models import Booking, WaitlistEntry
+from .schedule import DaySchedule
 from django.contrib.auth.models import User
 
 class BookingForm(forms.ModelForm):
@@ -10,14 +13,43 @@ class BookingForm(forms.ModelForm):
     def clean(self):
         cleaned_data = super().clean()
         barber = cleaned_data.get('barber')
+        date = cleaned_data.get('date')
         time = cleaned_data.get('time')
+        service = cleaned_data.get('service')
 
-        if barber and time:
-            if time < barber.start_time or time > barber.end_time:
+        if date and date < timezone.localdate():
+            raise forms.ValidationError("You cannot book a past date.")
+        if barber and time and service:
+            # Working days, then working hours and time off on the day, then the other bookings
+            exceptions = caching.exception_indexes([barber])[barber.id]
+            if date and not availability.is_working(barber, date, availability.working_weekdays(barber), exceptions):
+                raise forms.ValidationError(f"{barber.name} does not work on {date:%A %d %B}.")
+            if not DaySchedule.for_barber(barber, day=date, exceptions=exceptions).fits(time, service.duration_minutes):
                 raise forms.ValidationError(f"{barber.name} is not available at the selected time.")
+            if date:
+                bookings = Booking.objects.filter(barber=barber, date=date)
+                if self.instance.pk:
+                    bookings = bookings.exclude(pk=self.instance.pk)
+                day = DaySchedule.for_barber(
+                    barber, bookings.values_list('time', 'duration_minutes'), day=date, exceptions=exceptions,
+                )
+                if not day.fits(time, service.duration_minutes):
+                    raise forms.ValidationError(f"{barber.name} is already booked at the selected time.")
         return cleaned_data
 
 
+class WaitlistForm(forms.ModelForm):
+    class Meta:
+        model = WaitlistEntry
+        fields = ['barber', 'date', 'service', 'earliest_time', 'latest_time']
+
+    def clean_date(self):
+        date = self.cleaned_data['date']
+        if date < timezone.localdate():
+            raise forms.ValidationError("You cannot join the waitlist for a past date.")
+        return date
+
+
 class CustomUserCreationForm(forms.ModelForm):
     class Meta:
         model = User
@@ -0,0 +1,388 @@
+"""Bulk import of barbers and (recurring) bookings from CSV or JSONL files.
+
+Rows are validated in memory and written with ``bulk_create`` in batches.
+Conflicts, including overlaps of services longer than one slot, are checked
+against a per-barber index of booked intervals and schedule exceptions
+that is loaded from the database once per barber, so importing does not
+issue a query per row. New customers are created in batches as well.
+``bulk_create`` bypasses the model signals, so day summaries are rebuilt
+and cached availability invalidated once at the end.
+
+Barber rows: ``name``, ``specialization``, ``working_days`` (e.g.
+``Mon,Tue,Fri``), ``start_time``, ``end_time``. Barbers are matched on
+name, so importing the same file twice updates rather than duplicates.
+
+Booking rows: ``customer`` (username), ``barber`` (name), ``date``,
+``time``, ``service`` (name of an existing service), and for recurring bookings ``every_weeks`` plus
+``until`` (inclusive date) and/or ``count``. "Every other Tuesday at 10:00
+for 6 months" is ``date`` = the first Tuesday, ``time`` = 10:00,
+``every_weeks`` = 2 and ``until`` = six months later.
+"""
+import csv
+import json
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import availability, caching, schedule_exceptions, summaries, weekdays
+from .models import Barber, Booking, Service
+from .schedule import DaySchedule
+
+
+BATCH_SIZE = 5000
+# Packs a booking's start and end minute into one int in SlotIndex
+_PACK = 1 << 12
+MAX_REPORTED_ERRORS = 100
+FORMATS = ('csv', 'jsonl')
+
+
+class ImportResult:
+    """Counts of what an import wrote and the first row errors it hit."""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+        self.barber_ids = set()
+        self.customer_ids = set()
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {line}: {message}')
+
+
+def detect_format(path):
+    """Return ``'csv'`` or ``'jsonl'`` from a file name's extension."""
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise ValueError(f'Cannot tell the format of {path}; pass it explicitly.')
+
+
+def read_rows(file, file_format):
+    """Yield ``(line_number, row)`` from an open CSV or JSONL file.
+
+    JSONL lines are yielded as read and parsed by the importers inside
+    their per-row error handling, so a malformed line is reported and
+    skipped like any other invalid row.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if line.strip():
+                yield line_number, line
+
+
+def _parse_row(row):
+    if isinstance(row, str):
+        try:
+            row = json.loads(row)
+        except ValueError as exc:
+            raise ValueError(f'invalid JSON: {exc}') from None
+    if not isinstance(row, dict):
+        raise ValueError('expected an object of fields')
+    return row
+
+
+def _value(row, field, required=True):
+    value = row.get(field)
+    if isinstance(value, str):
+        value = value.strip()
+    if value in (None, ''):
+        if required:
+            raise ValueError(f'{field} is required')
+        return None
+    return value
+
+
+def _text(row, field, required=True):
+    value = _value(row, field, required)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f'{field} must be a string, not {value!r}')
+    return value
+
+
+def _whole_number(row, field):
+    value = _value(row, field, required=False)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f'{field} must be a whole number, not {value!r}')
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{field} must be a whole number, not {value!r}') from None
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'invalid date {value!r}') from None
+
+
+def _parse_time(value):
+    for time_format in ('%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.strptime(value, time_format).time()
+        except ValueError:
+            pass
+    raise ValueError(f'invalid time {value!r}')
+
+
+def _parse_days(value):
+    if isinstance(value, str):
+        value = value.replace(';', ',').split(',')
+    elif not isinstance(value, list):
+        raise ValueError(f'invalid working_days {value!r}')
+    return weekdays.to_mask([day for day in value if not isinstance(day, str) or day.strip()])
+
+
+def _parse_barber(row):
+    row = _parse_row(row)
+    barber = Barber(
+        name=_text(row, 'name'),
+        specialization=_text(row, 'specialization', required=False) or '',
+        start_time=_parse_time(_text(row, 'start_time')),
+        end_time=_parse_time(_text(row, 'end_time')),
+        working_days=_parse_days(_value(row, 'working_days')),
+    )
+    if barber.start_time >= barber.end_time:
+        raise ValueError('start_time must be before end_time')
+    return barber
+
+
+def import_barbers(rows, result=None, batch_size=BATCH_SIZE):
+    """Create or update barbers from ``rows``, matching existing ones by name."""
+    result = result or ImportResult()
+    parsed = {}
+    for line, row in rows:
+        try:
+            barber = _parse_barber(row)
+        except ValueError as exc:
+            result.error(line, exc)
+            continue
+        parsed[barber.name] = barber
+
+    existing = {barber.name: barber for barber in Barber.objects.filter(name__in=parsed)}
+    to_update = []
+    for name, barber in parsed.items():
+        if name in existing:
+            barber.pk = existing[name].pk
+            to_update.append(barber)
+    to_create = [barber for name, barber in parsed.items() if name not in existing]
+
+    Barber.objects.bulk_create(to_create, batch_size=batch_size)
+    Barber.objects.bulk_update(
+        to_update, ['specialization', 'start_time', 'end_time', 'working_days'], batch_size=batch_size,
+    )
+    result.created += len(to_create)
+    result.updated += len(to_update)
+    result.barber_ids.update(barber.pk for barber in parsed.values())
+    return result
+
+
+class SlotIndex:
+    """Booked intervals per barber and day, loaded from the database on first use.
+
+    Existing bookings are held as one packed int per booking until the import
+    reaches their day. The day is then laid out as a
+    :class:`~booking.schedule.DaySchedule` with the barber's time off and
+    changed hours, so bookings off the slot grid or running past the end of
+    the day block exactly the minutes they cover.
+    """
+
+    def __init__(self):
+        self._booked = {}
+        self._schedules = {}
+
+    def _days(self, barber):
+        booked = self._booked.get(barber.pk)
+        if booked is None:
+            booked = self._booked[barber.pk] = {}
+            rows = Booking.objects.filter(barber=barber).values_list('date', 'time', 'duration_minutes')
+            for day, at, duration in rows.iterator():
+                start = at.hour * 60 + at.minute
+                booked.setdefault(day.toordinal(), []).append(start * _PACK + start + duration)
+        return booked
+
+    def schedule(self, barber, day, exceptions):
+        """Return the barber's schedule of ``day``, including what this import claimed so far."""
+        key = (barber.pk, day.toordinal())
+        schedule = self._schedules.get(key)
+        if schedule is None:
+            schedule = DaySchedule.for_barber(barber, day=day, exceptions=exceptions)
+            booked = [divmod(value, _PACK) for value in self._days(barber).pop(day.toordinal(), ())]
+            if booked:
+                schedule = DaySchedule(schedule.template, schedule.intervals + booked)
+            self._schedules[key] = schedule
+        return schedule
+
+
+def occurrences(row):
+    """Return the dates a booking row occurs on, expanding recurrences."""
+    first = _parse_date(_text(row, 'date'))
+    every_weeks = _whole_number(row, 'every_weeks')
+    if every_weeks is None:
+        return [first]
+
+    step = timedelta(weeks=every_weeks)
+    if step.days < 7:
+        raise ValueError('every_weeks must be at least 1')
+    until = _text(row, 'until', required=False)
+    count = _whole_number(row, 'count')
+    if until is None and count is None:
+        raise ValueError('recurring bookings need until or count')
+    until = _parse_date(until) if until is not None else date.max - step
+
+    dates = []
+    day = first
+    while day <= until and (count is None or len(dates) < count):
+        dates.append(day)
+        day += step
+    return dates
+
+
+class _Barbers:
+    """Barber lookups by name with the per-barber weekdays and schedule exceptions."""
+
+    def __init__(self):
+        self.by_name = {}
+        self.ambiguous = set()
+        for barber in Barber.objects.all():
+            if barber.name in self.by_name:
+                self.ambiguous.add(barber.name)
+            self.by_name[barber.name] = barber
+        self._calendars = {}
+
+    def get(self, name):
+        if name in self.ambiguous:
+            raise ValueError(f'more than one barber is called {name!r}')
+        barber = self.by_name.get(name)
+        if barber is None:
+            raise ValueError(f'unknown barber {name!r}')
+        return barber
+
+    def calendar(self, barber):
+        calendar = self._calendars.get(barber.pk)
+        if calendar is None:
+            calendar = self._calendars[barber.pk] = (
+                availability.working_weekdays(barber),
+                schedule_exceptions.load_indexes([barber.pk])[barber.pk],
+            )
+        return calendar
+
+
+def import_bookings(rows, result=None, create_customers=False, batch_size=BATCH_SIZE):
+    """Validate and bulk insert bookings from ``rows``.
+
+    Occurrences on a day the barber does not work, outside that day's
+    working hours, during time off or overlapping time that is already
+    booked (in the database or earlier in the file) are skipped and
+    reported. Unknown customers are reported too, unless
+    ``create_customers`` is set, in which case they are created in batches
+    with an unusable password.
+    """
+    result = result or ImportResult()
+    barbers = _Barbers()
+    customers = dict(User.objects.values_list('username', 'id'))
+    new_customers = {}
+    pending_customers = []
+    durations = dict(Service.objects.values_list('name', 'duration_minutes'))
+    index = SlotIndex()
+    batch = []
+
+    def flush():
+        User.objects.bulk_create(pending_customers, batch_size=batch_size)
+        result.customer_ids.update(customer.pk for customer in pending_customers)
+        pending_customers.clear()
+        Booking.objects.bulk_create(batch, batch_size=batch_size)
+        result.created += len(batch)
+        batch.clear()
+
+    for line, row in rows:
+        try:
+            row = _parse_row(row)
+            barber = barbers.get(_text(row, 'barber'))
+            username = _text(row, 'customer')
+            email = _text(row, 'email', required=False) or ''
+            at = _parse_time(_text(row, 'time'))
+            service = _text(row, 'service')
+            dates = occurrences(row)
+        except ValueError as exc:
+            result.error(line, exc)
+            continue
+        duration = durations.get(service)
+        if duration is None:
+            result.error(line, f'unknown service {service!r}')
+            continue
+
+        customer_id = customers.get(username)
+        if customer_id is None and not create_customers:
+            result.error(line, f'unknown customer {username!r}')
+            continue
+
+        weekdays, exceptions = barbers.calendar(barber)
+        start = at.hour * 60 + at.minute
+        accepted = []
+        for day in dates:
+            if not availability.is_working(barber, day, weekdays, exceptions):
+                result.error(line, f'{barber.name} does not work on {day:%A} {day}')
+                continue
+            schedule = index.schedule(barber, day, exceptions)
+            if not schedule.within_hours(at, duration):
+                result.error(line, f'{service} at {at:%H:%M} does not fit in {barber.name}\'s working hours on {day}')
+            elif exceptions.is_blocked(day, start, start + duration):
+                result.error(line, f'{barber.name} is off on {day} at {at:%H:%M}')
+            elif not schedule.fits(at, duration):
+                result.error(line, f'{barber.name} is already booked on {day} at {at:%H:%M}')
+            else:
+                schedule.add(at, duration)
+                accepted.append(day)
+        if not accepted:
+            continue
+
+        if customer_id is None:
+            customer = new_customers.get(username)
+            if customer is None:
+                customer = new_customers[username] = User(
+                    username=username, email=email, password=make_password(None),
+                )
+                pending_customers.append(customer)
+            # The bookings pick up the customer's id once flush() has created it
+            owner = {'customer': customer}
+        else:
+            owner = {'customer_id': customer_id}
+            result.customer_ids.add(customer_id)
+        batch.extend(
+            Booking(**owner, barber_id=barber.pk, date=day, time=at, service_id=service, duration_minutes=duration)
+            for day in accepted
+        )
+        result.barber_ids.add(barber.pk)
+
+        if len(batch) >= batch_size:
+            flush()
+
+    flush()
+    return result
+
+
+def finish(barber_ids, batch_size=BATCH_SIZE, customer_ids=()):
+    """Rebuild day summaries and invalidate cached availability of imported barbers.
+
+    Cached calendars of ``customer_ids`` are invalidated too. ``bulk_create``
+    and ``bulk_update`` skip the signals that normally do this.
+    """
+    barber_ids = set(barber_ids)
+    customer_ids = set(customer_ids)
+    summaries.rebuild(Barber.objects.filter(pk__in=barber_ids), batch_size=batch_size)
+    transaction.on_commit(lambda: [caching.bump_version(barber_id) for barber_id in barber_ids])
+    transaction.on_commit(lambda: [caching.bump_user_bookings(customer_id) for customer_id in customer_ids])
@@ -0,0 +1,183 @@
+"""Live slot updates for open booking pages.
+
+Committed booking changes are published as deltas on one channel per barber
+and day: ``slot-taken`` when a booking starts occupying time and
+``slot-freed`` when it stops, each carrying the start time and duration.
+The server-sent events view subscribes a page to the channel of the barber
+and day it shows, so under ASGI idle viewers cost one queue and one parked
+coroutine each and never poll. WSGI servers read an async stream to the end
+before sending any of it, so there the view streams from a thread for a
+limited time instead, and the booking page only subscribes under ASGI.
+
+The broker is the ``LIVE_UPDATES_BROKER`` setting, a dotted path to a
+:class:`Broker` subclass. The default :class:`InProcessBroker` only reaches
+viewers served by the same process; with several ASGI workers, point the
+setting at a broker backed by a shared message bus.
+"""
+import asyncio
+import queue
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+TAKEN = 'slot-taken'
+FREED = 'slot-freed'
+# Sent instead of deltas a viewer fell too far behind on; it should refetch
+RESYNC = 'resync'
+QUEUE_SIZE = 100
+
+
+def channel(barber_id, day):
+    return f'{barber_id}:{day.isoformat()}'
+
+
+class Subscription:
+    """Messages published on one channel since subscribing, for one viewer on an event loop."""
+
+    def __init__(self, broker, channel, loop, queue_size=QUEUE_SIZE):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def push(self, message):
+        """Hand a message over from any thread; raises RuntimeError once the loop is closed."""
+        self.loop.call_soon_threadsafe(self.deliver, message)
+
+    def deliver(self, message):
+        """Queue a message; runs on the subscriber's event loop."""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """Return the next message, or None if none arrives within ``timeout`` seconds."""
+        if self.overflowed:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflowed = False
+            return {'event': RESYNC}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class ThreadSubscription:
+    """Messages published on one channel since subscribing, for one viewer on a thread."""
+
+    def __init__(self, broker, channel, queue_size=QUEUE_SIZE):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(queue_size)
+        self.overflowed = False
+
+    def push(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """Return the next message, or None if none arrives within ``timeout`` seconds."""
+        if self.overflowed:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflowed = False
+            return {'event': RESYNC}
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker(ABC):
+    """Publishes messages to the subscribers of a channel.
+
+    ``publish`` may be called from any thread. ``subscribe`` called on an
+    event loop returns a :class:`Subscription` read on that loop; called
+    outside one, it returns a :class:`ThreadSubscription` read by the
+    calling thread.
+    """
+
+    @abstractmethod
+    def publish(self, channel, message):
+        """Send ``message`` to the channel's subscribers; returns how many there were."""
+
+    @abstractmethod
+    def subscribe(self, channel):
+        """Start receiving the channel's messages."""
+
+    @abstractmethod
+    def unsubscribe(self, subscription):
+        """Stop delivering messages to ``subscription``."""
+
+
+class InProcessBroker(Broker):
+    """Broker reaching the subscribers of the current process."""
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.push(message)
+            except RuntimeError:
+                # The subscriber's event loop is gone
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+    def subscribe(self, channel):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            subscription = ThreadSubscription(self, channel, self.queue_size)
+        else:
+            subscription = Subscription(self, channel, loop, self.queue_size)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'LIVE_UPDATES_BROKER', 'booking.live.InProcessBroker'))()
+
+
+def publish(event, barber_id, day, start, duration):
+    """Publish a delta of a barber's day right away."""
+    get_broker().publish(channel(barber_id, day), {
+        'event': event, 'time': start.strftime('%H:%M'), 'duration': duration,
+    })
+
+
+def publish_on_commit(event, barber_id, day, start, duration):
+    """Publish a delta once the current transaction commits, so viewers never see rolled-back changes."""
+    transaction.on_commit(lambda: publish(event, barber_id, day, start, duration), robust=True)
@@ -0,0 +1,180 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import date, timedelta
+from itertools import count
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from booking import caching
+from booking.models import Booking
+from booking.seeding import SLOTS_PER_DAY, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed throwaway test databases of the given sizes and measure latency and "
+        "query counts of the booking hot paths through the test client. Results "
+        "can be saved as JSON and compared against an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', action='append', dest='sizes', metavar='BARBERS:BOOKINGS',
+                            help="Dataset to benchmark, e.g. 100:100000; may be given more than once "
+                                 "(default 10:10000).")
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=50, help="Timed requests per scenario.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--compare', help="Print the change against the results in this JSON file.")
+
+    def handle(self, *args, **options):
+        sizes = [self.parse_size(size) for size in options['sizes'] or ['10:10000']]
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = {
+                    (dataset['barbers'], dataset['bookings']): dataset['scenarios']
+                    for dataset in json.load(file)['datasets']
+                }
+
+        results = {
+            'commit': self.git_commit(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'datasets': [],
+        }
+        setup_test_environment()
+        try:
+            for barbers, bookings in sizes:
+                dataset = self.run_dataset(barbers, bookings, options['customers'], options['repeat'])
+                results['datasets'].append(dataset)
+                self.print_dataset(dataset, (baseline or {}).get((barbers, bookings)))
+        finally:
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def parse_size(self, size):
+        try:
+            barbers, bookings = (int(part) for part in size.split(':'))
+        except ValueError:
+            raise CommandError(f"Invalid --size {size!r}; expected BARBERS:BOOKINGS, e.g. 100:100000")
+        return barbers, bookings
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def run_dataset(self, barbers, bookings, customers, repeat):
+        # Never touch the configured database: work on a fresh test database.
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Seeding {barbers} barbers and {bookings} bookings...")
+            started = time.perf_counter()
+            barber_objs, customer_objs = seed(barbers=barbers, customers=customers, bookings=bookings)
+            seed_seconds = time.perf_counter() - started
+
+            scenarios = {}
+            for name, request in self.scenarios(barber_objs, customer_objs).items():
+                scenarios[name] = self.measure(request, repeat)
+            return {
+                'barbers': barbers,
+                'bookings': bookings,
+                'customers': customers,
+                'seed_seconds': round(seed_seconds, 1),
+                'scenarios': scenarios,
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def scenarios(self, barbers, customers):
+        """Return ``{name: callable}``; each call makes one request and returns its response."""
+        today = date.today()
+        barber = barbers[0]
+        client = Client()
+        client.force_login(customers[0])
+
+        # Slots past the seeded window are free, so every creation succeeds.
+        first_free_day = Booking.objects.latest('date').date + timedelta(days=1)
+        free_slots = count()
+
+        def create_booking():
+            index = next(free_slots)
+            day, rest = divmod(index, len(barbers) * SLOTS_PER_DAY)
+            barber_index, slot = divmod(rest, SLOTS_PER_DAY)
+            return client.post('/book/', {
+                'barber': barbers[barber_index].id,
+                'date': (first_free_day + timedelta(days=day)).isoformat(),
+                'time': f'{9 + slot // 2:02d}:{30 * (slot % 2):02d}',
+                'service': 'Haircut',
+            })
+
+        return {
+            'book_appointment': lambda: client.get('/book/'),
+            'fetch_available_dates (one barber)': lambda: client.get(
+                f'/fetch_available_dates/?barber_id={barber.id}&year={today.year}&month={today.month}'
+            ),
+            'fetch_available_dates (all barbers)': lambda: client.get(
+                f'/fetch_available_dates/?year={today.year}&month={today.month}'
+            ),
+            'available_time_slots': lambda: client.get(
+                f'/available_time_slots/?barber_id={barber.id}&date={today.isoformat()}'
+            ),
+            'calendar_view': lambda: client.get(f'/calendar/{today.year}/{today.month}/'),
+            'create booking': create_booking,
+        }
+
+    def measure(self, request, repeat):
+        # The first request runs against a cold availability cache.
+        caching.get_cache().clear()
+        timings, queries = [], []
+        for _ in range(repeat + 1):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f"{response.request['PATH_INFO']} returned {response.status_code}")
+            queries.append(len(captured))
+
+        first_ms, timings = timings[0], sorted(timings[1:])
+        return {
+            'first_ms': round(first_ms, 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[max(0, int(len(timings) * 0.95) - 1)], 3),
+            'min_ms': round(timings[0], 3),
+            'max_ms': round(timings[-1], 3),
+            'queries': queries[0],
+            'warm_queries': max(queries[1:], default=queries[0]),
+        }
+
+    def print_dataset(self, dataset, baseline):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{dataset['barbers']} barbers, {dataset['bookings']} bookings (seeded in {dataset['seed_seconds']}s)"
+        ))
+        for name, result in dataset['scenarios'].items():
+            line = (
+                f"  {name:<38} median {result['median_ms']:8.3f} ms  p95 {result['p95_ms']:8.3f} ms  "
+                f"cold {result['first_ms']:8.3f} ms  queries {result['queries']}/{result['warm_queries']}"
+            )
+            if baseline and name in baseline:
+                before = baseline[name]
+                change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100
+                line += f"  ({change:+.0f}% median, was {before['queries']}/{before['warm_queries']} queries)"
+            self.stdout.write(line)
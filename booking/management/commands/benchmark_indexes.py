@@ -0,0 +1,104 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count
+
+from booking.models import Booking
+from booking.seeding import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and compare query plans and latency of "
+        "the booking hot queries before and after the Booking index migration."
+    )
+
+    UNINDEXED = ('booking', '0003_barber_end_time_barber_start_time_and_more')
+    INDEXED = ('booking', '0004_booking_indexes_and_unique_slot')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=1_000_000)
+        parser.add_argument('--barbers', type=int, default=100)
+        parser.add_argument('--customers', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Never touch the configured database: work on a fresh test database.
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Seed with the current models, then measure the schema as it was
+            # before the indexes existed.
+            self.stdout.write(f"Seeding {options['bookings']} bookings...")
+            started = time.perf_counter()
+            barbers, customers = seed(
+                barbers=options['barbers'],
+                customers=options['customers'],
+                bookings=options['bookings'],
+                summarize=False,
+            )
+            self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+            self.migrate(self.UNINDEXED)
+            self.analyze()
+
+            queries = self.queries(barbers[0], customers[0])
+            before = self.measure(queries, options['repeat'])
+
+            started = time.perf_counter()
+            self.migrate(self.INDEXED)
+            self.stdout.write(f"Applied {self.INDEXED[1]} in {time.perf_counter() - started:.1f}s")
+            self.analyze()
+            after = self.measure(queries, options['repeat'])
+
+            for name in queries:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(f"  before: {before[name]['ms']:.3f} ms  {before[name]['plan']}")
+                self.stdout.write(f"  after:  {after[name]['ms']:.3f} ms  {after[name]['plan']}")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([target])
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def queries(self, barber, customer):
+        day = Booking.objects.filter(barber=barber).values_list('date', flat=True).first()
+        month_start = day.replace(day=1)
+        month_end = month_start + timedelta(days=30)
+        return {
+            'month availability (barber + date range)': Booking.objects.filter(
+                barber=barber, date__range=(month_start, month_end)
+            ).values('barber_id', 'date').annotate(booked=Count('id')),
+            'day occupancy (barber + date)': Booking.objects.filter(
+                barber=barber, date=day
+            ).values_list('time', flat=True),
+            # Only columns that exist in both schemas being compared
+            'calendar_view (customer + date range)': Booking.objects.filter(
+                customer=customer, date__range=(month_start, month_end)
+            ).values_list('id', 'barber_id', 'date', 'time'),
+            'view_bookings (customer, ordered)': Booking.objects.filter(
+                customer=customer
+            ).order_by('date', 'time').values_list('id', 'barber_id', 'date', 'time'),
+        }
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {
+                'ms': statistics.median(timings),
+                'plan': ' | '.join(queryset.explain().splitlines()),
+            }
+        return results
@@ -0,0 +1,157 @@
+import re
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from booking.models import Service
+from booking.seeding import SLOTS_PER_DAY, seed
+from booking.services import SlotUnavailable, create_booking
+
+
+JOURNAL_MODE_PRAGMA = re.compile(r'PRAGMA journal_mode\s*=\s*\w+', re.IGNORECASE)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure booking write throughput under concurrency against a throwaway "
+        "test database of the configured DATABASE_PROFILE. Every worker books "
+        "distinct free slots through the normal reservation path, so the "
+        "numbers show lock contention rather than slot conflicts. On SQLite, "
+        "several journal modes can be compared in one run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=2000, help="Bookings to create per run.")
+        parser.add_argument('--concurrency', type=int, action='append', dest='concurrency',
+                            help="Worker threads; may be given more than once (default 1 and 16).")
+        parser.add_argument('--barbers', type=int, default=20)
+        parser.add_argument('--journal-mode', action='append', dest='journal_modes',
+                            help="SQLite only: journal modes to compare, e.g. wal and delete "
+                                 "(default: the profile's own).")
+
+    def handle(self, *args, **options):
+        modes = options['journal_modes'] or [None]
+        if modes != [None] and connection.vendor != 'sqlite':
+            raise CommandError("--journal-mode only applies to SQLite.")
+
+        db_options = connection.settings_dict['OPTIONS']
+        init_command = db_options.get('init_command')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            barbers, customers = seed(barbers=options['barbers'], customers=100, bookings=0)
+            Service.objects.get_or_create(name='Haircut', defaults={'duration_minutes': 30})
+            first_day = date.today() + timedelta(days=1)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{connection.vendor} ({connection.settings_dict['NAME']}), "
+                f"CONN_MAX_AGE={connection.settings_dict['CONN_MAX_AGE']}"
+            ))
+
+            for mode in modes:
+                if mode is not None:
+                    # Worker threads open their own connections, which run the
+                    # init_command, so the profile's journal mode is replaced there too
+                    db_options['init_command'] = self.with_journal_mode(init_command, mode)
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'PRAGMA journal_mode={mode}')
+                        mode = cursor.fetchone()[0]
+                for concurrency in options['concurrency'] or [1, 16]:
+                    slots = self.slots(barbers, first_day, options['bookings'])
+                    # Each run books days after the previous run's
+                    first_day += timedelta(days=len(slots) // (len(barbers) * SLOTS_PER_DAY) + 1)
+                    result = self.run(slots, customers, concurrency)
+                    if mode is not None and result['journal_modes'] != {mode}:
+                        raise CommandError(
+                            f"Workers ran with journal_mode {', '.join(sorted(result['journal_modes']))} "
+                            f"instead of {mode}."
+                        )
+                    label = f"journal_mode={mode} " if mode else ""
+                    self.stdout.write(
+                        f"  {label}concurrency {concurrency:>3}: {result['per_second']:8.1f} bookings/s  "
+                        f"p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms  "
+                        f"{result['created']} created, {result['unavailable']} unavailable, "
+                        f"{result['lock_errors']} lock errors"
+                    )
+        finally:
+            if modes != [None]:
+                if init_command is None:
+                    db_options.pop('init_command', None)
+                else:
+                    db_options['init_command'] = init_command
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def with_journal_mode(self, init_command, mode):
+        """Return ``init_command`` setting journal mode ``mode`` instead of its own."""
+        pragma = f'PRAGMA journal_mode={mode}'
+        if not init_command:
+            return pragma
+        command, replaced = JOURNAL_MODE_PRAGMA.subn(pragma, init_command)
+        return command if replaced else f'{init_command};{pragma}'
+
+    def slots(self, barbers, first_day, count):
+        """Return ``count`` distinct free ``(barber, date, time)`` slots from ``first_day`` on."""
+        slots = []
+        for index in range(count):
+            day, rest = divmod(index, len(barbers) * SLOTS_PER_DAY)
+            # Consecutive jobs go to different barbers, as concurrent customers would
+            slot, barber_index = divmod(rest, len(barbers))
+            slots.append((barbers[barber_index], first_day + timedelta(days=day), time(9 + slot // 2, 30 * (slot % 2))))
+        return slots
+
+    def run(self, slots, customers, concurrency):
+        latencies = []
+        counts = {'created': 0, 'unavailable': 0, 'lock_errors': 0}
+        journal_modes = set()
+        lock = threading.Lock()
+
+        def book(job):
+            index, (barber, day, at) = job
+            started = perf_counter()
+            try:
+                create_booking(customers[index % len(customers)], barber, day, at, 'Haircut')
+                outcome = 'created'
+            except SlotUnavailable:
+                outcome = 'unavailable'
+            except OperationalError:
+                outcome = 'lock_errors'
+            elapsed = (perf_counter() - started) * 1000
+            with lock:
+                counts[outcome] += 1
+                latencies.append(elapsed)
+
+        def worker(jobs):
+            try:
+                if connection.vendor == 'sqlite':
+                    with connection.cursor() as cursor:
+                        cursor.execute('PRAGMA journal_mode')
+                        mode = cursor.fetchone()[0]
+                    with lock:
+                        journal_modes.add(mode)
+                for job in jobs:
+                    book(job)
+            finally:
+                connection.close()
+
+        jobs = list(enumerate(slots))
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, [jobs[i::concurrency] for i in range(concurrency)]))
+        elapsed = perf_counter() - started
+
+        latencies.sort()
+        return {
+            **counts,
+            'journal_modes': journal_modes,
+            'per_second': counts['created'] / elapsed,
+            'p50_ms': statistics.median(latencies),
+            'p95_ms': latencies[max(0, int(len(latencies) * 0.95) - 1)],
+        }
+
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from booking import importing
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import barbers and (recurring) bookings from CSV or JSONL files. "
+        "See booking/importing.py for the columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--barbers', help="CSV or JSONL file of barbers.")
+        parser.add_argument('--bookings', help="CSV or JSONL file of bookings.")
+        parser.add_argument('--format', choices=importing.FORMATS,
+                            help="File format; by default taken from the file extensions.")
+        parser.add_argument('--create-customers', action='store_true',
+                            help="Create users for unknown customer usernames instead of skipping their rows.")
+        parser.add_argument('--batch-size', type=int, default=importing.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Validate everything, then roll back.")
+
+    def handle(self, *args, **options):
+        if not options['barbers'] and not options['bookings']:
+            raise CommandError("Pass --barbers and/or --bookings.")
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            barbers = bookings = None
+            if options['barbers']:
+                barbers = self.run(importing.import_barbers, options['barbers'], options)
+            if options['bookings']:
+                bookings = self.run(importing.import_bookings, options['bookings'], options,
+                                    create_customers=options['create_customers'])
+            touched = set()
+            for result in (barbers, bookings):
+                if result is not None:
+                    touched |= result.barber_ids
+            importing.finish(
+                touched, batch_size=options['batch_size'],
+                customer_ids=bookings.customer_ids if bookings is not None else (),
+            )
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        elapsed = time.perf_counter() - started
+        if barbers is not None:
+            self.report('Barbers', barbers, f"{barbers.created} created, {barbers.updated} updated")
+        if bookings is not None:
+            self.report('Bookings', bookings, f"{bookings.created} created")
+        suffix = " (dry run, rolled back)" if options['dry_run'] else ""
+        self.stdout.write(f"Finished in {elapsed:.1f}s{suffix}")
+
+    def run(self, importer, path, options, **kwargs):
+        try:
+            file_format = options['format'] or importing.detect_format(path)
+        except ValueError as exc:
+            raise CommandError(exc)
+        with open(path, newline='', encoding='utf-8') as file:
+            return importer(importing.read_rows(file, file_format), batch_size=options['batch_size'], **kwargs)
+
+    def report(self, label, result, summary):
+        self.stdout.write(f"{label}: {summary}, {result.error_count} skipped")
+        for message in result.errors:
+            self.stderr.write(f"  {message}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f"  ... and {result.error_count - len(result.errors)} more")
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from booking.seeding import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the availability JSON endpoints served through "
+        "Django's WSGI handler (thread pool) and ASGI handler (event loop), "
+        "in process and against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--barbers', type=int, default=20)
+        parser.add_argument('--bookings', type=int, default=20_000)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            barbers, _ = seed(barbers=options['barbers'], customers=100, bookings=options['bookings'])
+            today = date.today()
+            urls = [
+                f'/fetch_available_dates/?year={today.year}&month={today.month}',
+                f'/fetch_available_dates/?barber_id={barbers[0].id}&year={today.year}&month={today.month}',
+                f'/available_time_slots/?barber_id={barbers[0].id}&date={today.isoformat()}',
+            ]
+            requests = [urls[i % len(urls)] for i in range(options['requests'])]
+            concurrency = options['concurrency']
+
+            for name, run in (('WSGI', self.run_wsgi), ('ASGI', self.run_asgi)):
+                started = time.perf_counter()
+                statuses = run(requests, concurrency)
+                elapsed = time.perf_counter() - started
+                errors = sum(1 for status in statuses if status != 200)
+                self.stdout.write(
+                    f"{name}: {len(requests) / elapsed:.0f} req/s "
+                    f"({len(requests)} requests, concurrency {concurrency}, {errors} errors)"
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run_wsgi(self, requests, concurrency):
+        def get(url):
+            return Client().get(url).status_code
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(get, requests))
+
+    def run_asgi(self, requests, concurrency):
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+            client = AsyncClient()
+
+            async def get(url):
+                async with semaphore:
+                    return (await client.get(url)).status_code
+
+            return await asyncio.gather(*(get(url) for url in requests))
+
+        return asyncio.run(run())
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from booking import summaries
+from booking.models import Barber
+
+
+class Command(BaseCommand):
+    help = "Rebuild the BarberDaySummary table from the bookings, e.g. after bulk imports."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--barber', type=int, action='append', dest='barber_ids',
+                            help="Only rebuild this barber; may be given more than once.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        barbers = Barber.objects.all()
+        if options['barber_ids']:
+            barbers = barbers.filter(pk__in=options['barber_ids'])
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            written = summaries.rebuild(barbers, batch_size=options['batch_size'])
+        self.stdout.write(f"Wrote {written} day summaries in {time.perf_counter() - started:.1f}s")
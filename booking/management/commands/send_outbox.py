@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from booking import notifications
+
+
+class Command(BaseCommand):
+    help = "Deliver queued booking emails from the outbox, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the due emails and exit.")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when the outbox is idle.")
+        parser.add_argument('--max-attempts', type=int, default=notifications.MAX_ATTEMPTS)
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = notifications.send_pending(options['batch_size'], options['max_attempts'])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}")
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
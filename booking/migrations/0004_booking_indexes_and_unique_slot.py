@@ -0,0 +1,39 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:11
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_slots(apps, schema_editor):
+    """Keep only the earliest booking of any double-booked slot."""
+    Booking = apps.get_model('booking', 'Booking')
+    duplicates = (
+        Booking.objects.values('barber', 'date', 'time')
+        .annotate(count=Count('id'), keep=Min('id'))
+        .filter(count__gt=1)
+    )
+    for slot in duplicates:
+        Booking.objects.filter(
+            barber=slot['barber'], date=slot['date'], time=slot['time']
+        ).exclude(id=slot['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0003_barber_end_time_barber_start_time_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_slots, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer', 'date', 'time'], name='booking_customer_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(fields=('barber', 'date', 'time'), name='unique_barber_slot'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_summaries(apps, schema_editor):
+    """Summarize every (barber, date) that already has bookings."""
+    Barber = apps.get_model('booking', 'Barber')
+    Booking = apps.get_model('booking', 'Booking')
+    BarberDaySummary = apps.get_model('booking', 'BarberDaySummary')
+
+    for barber in Barber.objects.all():
+        start = barber.start_time.hour * 60 + barber.start_time.minute
+        capacity = int((barber.end_time.hour - barber.start_time.hour) * 2)
+        days = {}
+        for day, time in Booking.objects.filter(barber=barber).values_list('date', 'time').iterator():
+            count, booked = days.get(day, (0, 0))
+            offset = time.hour * 60 + time.minute - start
+            if offset % 30 == 0 and 0 <= offset // 30 < capacity:
+                booked |= 1 << (offset // 30)
+            days[day] = (count + 1, booked)
+        BarberDaySummary.objects.bulk_create(
+            [
+                BarberDaySummary(
+                    barber=barber, date=day, booked_count=count, capacity=capacity,
+                    free_mask=~booked & ((1 << capacity) - 1),
+                )
+                for day, (count, booked) in days.items()
+            ],
+            batch_size=5000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0005_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarberDaySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('booked_count', models.PositiveSmallIntegerField(default=0)),
+                ('capacity', models.PositiveSmallIntegerField()),
+                ('free_mask', models.BigIntegerField()),
+                ('barber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_summaries', to='booking.barber')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('barber', 'date'), name='unique_barber_day_summary')],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
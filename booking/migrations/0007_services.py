@@ -0,0 +1,90 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+DEFAULT_SERVICES = [
+    ('Haircut', 'Professional haircut tailored to your style.', 30),
+    ('Beard Trim', 'Expert beard grooming and styling.', 30),
+    ('Combo (Haircut + Beard Trim)', 'Haircut and beard trim package.', 60),
+]
+
+
+def create_services(apps, schema_editor):
+    """Create the services the site offered, plus any other name already booked.
+
+    Bookings get their service's duration, and the day summaries are rebuilt
+    because longer bookings now block more than one slot.
+    """
+    Barber = apps.get_model('booking', 'Barber')
+    Booking = apps.get_model('booking', 'Booking')
+    BarberDaySummary = apps.get_model('booking', 'BarberDaySummary')
+    Service = apps.get_model('booking', 'Service')
+
+    for name, description, duration in DEFAULT_SERVICES:
+        Service.objects.get_or_create(
+            name=name, defaults={'description': description, 'duration_minutes': duration},
+        )
+    known = set(Service.objects.values_list('name', flat=True))
+    booked = set(Booking.objects.values_list('service', flat=True).distinct())
+    Service.objects.bulk_create([Service(name=name) for name in sorted(booked - known)])
+
+    for name, duration in Service.objects.values_list('name', 'duration_minutes'):
+        Booking.objects.filter(service=name).update(duration_minutes=duration)
+
+    BarberDaySummary.objects.all().delete()
+    for barber in Barber.objects.all():
+        start = barber.start_time.hour * 60 + barber.start_time.minute
+        end = barber.end_time.hour * 60 + barber.end_time.minute
+        capacity = max(0, (end - start) // 30)
+        full = (1 << capacity) - 1
+        days = {}
+        rows = Booking.objects.filter(barber=barber).values_list('date', 'time', 'duration_minutes')
+        for day, time, duration in rows.iterator():
+            count, booked = days.get(day, (0, 0))
+            offset = time.hour * 60 + time.minute - start
+            if offset % 30 == 0 and 0 <= offset // 30 < capacity:
+                slots = max(1, -(-duration // 30))
+                booked |= ((1 << slots) - 1) << (offset // 30) & full
+            days[day] = (count + 1, booked)
+        BarberDaySummary.objects.bulk_create(
+            [
+                BarberDaySummary(
+                    barber=barber, date=day, booked_count=count, capacity=capacity, free_mask=~booked & full,
+                )
+                for day, (count, booked) in days.items()
+            ],
+            batch_size=5000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_barberdaysummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Service',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('duration_minutes', models.PositiveSmallIntegerField(default=30)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='duration_minutes',
+            field=models.PositiveSmallIntegerField(default=30),
+            preserve_default=False,
+        ),
+        migrations.RunPython(create_services, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='booking',
+            name='service',
+            field=models.ForeignKey(db_column='service', on_delete=django.db.models.deletion.PROTECT, related_name='bookings', to='booking.service', to_field='name'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:20
+
+import booking.weekdays
+from django.db import migrations, models
+
+
+DAY_CODES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def _codes(value):
+    # MultiSelectField hands back a list, raw rows a comma-joined string
+    if isinstance(value, str):
+        value = value.split(',')
+    return [day.strip() for day in value or () if day.strip()]
+
+
+def days_to_mask(apps, schema_editor):
+    Barber = apps.get_model('booking', 'Barber')
+    barbers = list(Barber.objects.only('working_days'))
+    for barber in barbers:
+        barber.working_days_mask = sum(
+            1 << DAY_CODES.index(day) for day in set(_codes(barber.working_days)) if day in DAY_CODES
+        )
+    Barber.objects.bulk_update(barbers, ['working_days_mask'], batch_size=1000)
+
+
+def mask_to_days(apps, schema_editor):
+    Barber = apps.get_model('booking', 'Barber')
+    barbers = list(Barber.objects.only('working_days_mask'))
+    for barber in barbers:
+        barber.working_days = [day for index, day in enumerate(DAY_CODES) if barber.working_days_mask >> index & 1]
+    Barber.objects.bulk_update(barbers, ['working_days'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_services'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='barber',
+            name='working_days_mask',
+            field=models.PositiveSmallIntegerField(default=31),
+        ),
+        migrations.RunPython(days_to_mask, mask_to_days),
+        migrations.RemoveField(
+            model_name='barber',
+            name='working_days',
+        ),
+        migrations.RenameField(
+            model_name='barber',
+            old_name='working_days_mask',
+            new_name='working_days',
+        ),
+        migrations.AlterField(
+            model_name='barber',
+            name='working_days',
+            field=booking.weekdays.WeekdaysField(db_index=True, default=31),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_barber_working_days_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('closed', 'Time off'), ('hours', 'Changed hours')], default='closed', max_length=10)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('barber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_exceptions', to='booking.barber')),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('end_date__gte', models.F('start_date'))), name='schedule_exception_date_order')],
+            },
+        ),
+    ]
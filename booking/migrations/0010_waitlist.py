@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_schedule_exceptions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('earliest_time', models.TimeField(blank=True, null=True)),
+                ('latest_time', models.TimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('booked', 'Booked'), ('cancelled', 'Cancelled')], default='waiting', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('barber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='booking.barber')),
+                ('booking', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='booking.booking')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(db_column='service', on_delete=django.db.models.deletion.PROTECT, related_name='waitlist_entries', to='booking.service', to_field='name')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'waiting')), fields=['barber', 'date', 'created_at'], name='waitlist_waiting_idx')],
+            },
+        ),
+    ]
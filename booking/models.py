@@ -1,17 +1,9 @@
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.db import models
-from multiselectfield import MultiSelectField
+from django.utils import timezone
 
-
-DAYS_OF_WEEK = [
-    ('Mon', 'Monday'),
-    ('Tue', 'Tuesday'),
-    ('Wed', 'Wednesday'),
-    ('Thu', 'Thursday'),
-    ('Fri', 'Friday'),
-    ('Sat', 'Saturday'),
-    ('Sun', 'Sunday'),
-]
+from .weekdays import DAYS_OF_WEEK, WEEKDAYS, WeekdaysField  # noqa: F401 (DAYS_OF_WEEK re-exported)
 
 
 class Barber(models.Model):
@@ -19,13 +11,65 @@ class Barber(models.Model):
     specialization = models.CharField(max_length=100)
     start_time = models.TimeField(default="09:00:00")  
     end_time = models.TimeField(default="17:00:00")    
-    working_days = MultiSelectField(choices=DAYS_OF_WEEK, default=['Mon', 'Tue', 'Wed', 'Thu', 'Fri'])
+    # Bit i is set when the barber works on weekday i (Monday = 0)
+    working_days = WeekdaysField(default=WEEKDAYS, db_index=True)
 
     def __str__(self):
         return self.name
 
 
 
+class ScheduleException(models.Model):
+    """Time off or changed working hours of a barber from ``start_date`` to ``end_date``.
+
+    Time off without times blocks whole days; with times it blocks those
+    hours on each day. Changed hours replace the barber's usual hours on
+    each day, including days they do not usually work.
+    """
+
+    CLOSED = 'closed'
+    HOURS = 'hours'
+    KIND_CHOICES = [
+        (CLOSED, 'Time off'),
+        (HOURS, 'Changed hours'),
+    ]
+
+    barber = models.ForeignKey('Barber', on_delete=models.CASCADE, related_name='schedule_exceptions')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=CLOSED)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end_date__gte=models.F('start_date')), name='schedule_exception_date_order',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.barber}: {self.get_kind_display()} {self.start_date} to {self.end_date}'
+
+    def clean(self):
+        if self.start_date and self.end_date and self.end_date < self.start_date:
+            raise ValidationError({'end_date': 'The end date cannot be before the start date.'})
+        if (self.start_time is None) != (self.end_time is None):
+            raise ValidationError('Give both a start and an end time, or neither.')
+        if self.start_time is not None and self.start_time >= self.end_time:
+            raise ValidationError({'end_time': 'The end time must be after the start time.'})
+        if self.kind == self.HOURS and self.start_time is None:
+            raise ValidationError('Changed hours need a start and an end time.')
+        if self.kind == self.HOURS and self.start_date and self.end_date:
+            overlapping = ScheduleException.objects.filter(
+                barber_id=self.barber_id, kind=self.HOURS,
+                start_date__lte=self.end_date, end_date__gte=self.start_date,
+            ).exclude(pk=self.pk)
+            if overlapping.exists():
+                raise ValidationError('These days already have changed hours.')
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField()
@@ -34,12 +78,146 @@ class Customer(models.Model):
         return self.name
 
 
+class Service(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    description = models.CharField(max_length=255, blank=True)
+    duration_minutes = models.PositiveSmallIntegerField(default=30)
+
+    def __str__(self):
+        return self.name
+
+
 class Booking(models.Model):
     customer = models.ForeignKey(User, on_delete=models.CASCADE)  # Link to Django's User model
     barber = models.ForeignKey('Barber', on_delete=models.CASCADE)
     date = models.DateField()
     time = models.TimeField()
-    service = models.CharField(max_length=100)
+    # Keyed on the name, so service_id is the service name without a join
+    service = models.ForeignKey(
+        'Service', on_delete=models.PROTECT, to_field='name', db_column='service', related_name='bookings',
+    )
+    # Copied from the service when booked, so later changes to the service
+    # do not move existing appointments
+    duration_minutes = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            # calendar_view and view_bookings filter on customer plus date
+            models.Index(fields=['customer', 'date', 'time'], name='booking_customer_date_idx'),
+        ]
+        constraints = [
+            # Also the index behind availability lookups on barber plus a date or date range
+            models.UniqueConstraint(fields=['barber', 'date', 'time'], name='unique_barber_slot'),
+        ]
 
     def __str__(self):
         return f'{self.customer.username} - {self.date} at {self.time}'
+
+    def save(self, *args, **kwargs):
+        if self.duration_minutes is None:
+            self.duration_minutes = self.service.duration_minutes
+        super().save(*args, **kwargs)
+
+
+class WaitlistEntry(models.Model):
+    """A customer waiting for time with a barber on a day to free up.
+
+    When a booking of that barber and day is deleted or moved away,
+    ``booking.waitlist.match`` books the first waiting customers whose
+    service fits the freed time, starting within their optional window.
+    """
+
+    WAITING = 'waiting'
+    BOOKED = 'booked'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (WAITING, 'Waiting'),
+        (BOOKED, 'Booked'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    barber = models.ForeignKey('Barber', on_delete=models.CASCADE, related_name='waitlist_entries')
+    date = models.DateField()
+    service = models.ForeignKey(
+        'Service', on_delete=models.PROTECT, to_field='name', db_column='service', related_name='waitlist_entries',
+    )
+    # Earliest and latest acceptable start; empty means any time that day
+    earliest_time = models.TimeField(null=True, blank=True)
+    latest_time = models.TimeField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=WAITING)
+    booking = models.OneToOneField(
+        'Booking', on_delete=models.SET_NULL, null=True, blank=True, related_name='waitlist_entry',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The matcher reads the waiting entries of one barber and day, oldest first
+            models.Index(
+                fields=['barber', 'date', 'created_at'], name='waitlist_waiting_idx',
+                condition=models.Q(status='waiting'),
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.customer.username} waiting for {self.barber} on {self.date} ({self.status})'
+
+    def clean(self):
+        if self.earliest_time and self.latest_time and self.earliest_time > self.latest_time:
+            raise ValidationError({'latest_time': 'The latest time cannot be before the earliest time.'})
+
+
+class BarberDaySummary(models.Model):
+    """Materialized availability of one barber on one day that has bookings.
+
+    Kept current by ``booking.signals`` and rebuilt in bulk with the
+    ``rebuild_day_summaries`` command. Days without a row have no bookings.
+    """
+
+    barber = models.ForeignKey('Barber', on_delete=models.CASCADE, related_name='day_summaries')
+    date = models.DateField()
+    booked_count = models.PositiveSmallIntegerField(default=0)
+    capacity = models.PositiveSmallIntegerField()
+    # Bit i is set when the i-th slot of the working day is free
+    free_mask = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['barber', 'date'], name='unique_barber_day_summary'),
+        ]
+
+    def __str__(self):
+        return f'{self.barber} on {self.date}: {self.booked_count}/{self.capacity} booked'
+
+
+class OutboundEmail(models.Model):
+    """An email waiting in the outbox for the ``send_outbox`` worker."""
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} to {", ".join(self.recipients)} ({self.status})'
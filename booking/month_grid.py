@@ -0,0 +1,48 @@
+"""Month grids for the calendar pages, computed once per month.
+
+A :class:`MonthGrid` is the Sunday-first skeleton of one month: its weeks
+of dates, the first and last date shown, and the neighbouring months.
+Grids are memoized per ``(year, month, week_count)`` and shared by every
+request, so they must not be modified; per-user data is laid over them with
+:meth:`MonthGrid.overlay`.
+"""
+from calendar import monthrange
+from datetime import date, timedelta
+from functools import lru_cache
+
+
+class MonthGrid:
+    """The weeks shown for one month, Sunday first."""
+
+    __slots__ = ('year', 'month', 'month_name', 'start_date', 'end_date', 'weeks', 'prev_month', 'next_month')
+
+    def __init__(self, year, month, week_count):
+        first_day = date(year, month, 1)
+        self.year = year
+        self.month = month
+        self.month_name = first_day.strftime('%B')
+        # The Sunday on or before the first of the month
+        self.start_date = first_day - timedelta(days=(first_day.weekday() + 1) % 7)
+        self.weeks = tuple(
+            tuple(self.start_date + timedelta(days=week * 7 + weekday) for weekday in range(7))
+            for week in range(week_count)
+        )
+        self.end_date = self.weeks[-1][-1]
+        self.prev_month = (first_day - timedelta(days=1)).replace(day=1)
+        self.next_month = first_day + timedelta(days=monthrange(year, month)[1])
+
+    def overlay(self, items_by_date):
+        """Return the weeks as lists of ``{'date', 'in_month', 'bookings'}`` cells."""
+        return [
+            [
+                {'date': day, 'in_month': day.month == self.month, 'bookings': items_by_date.get(day, [])}
+                for day in week
+            ]
+            for week in self.weeks
+        ]
+
+
+@lru_cache(maxsize=512)
+def get_grid(year, month, week_count=5):
+    """Return the shared :class:`MonthGrid` of a month."""
+    return MonthGrid(year, month, week_count)
@@ -0,0 +1,117 @@
+"""Durable outbox for booking emails.
+
+Emails are written to :class:`~booking.models.OutboundEmail` inside the
+booking transaction, so they are queued exactly when the booking commits
+and never block the request on SMTP. The ``send_outbox`` management command
+delivers them in batches over one connection, retrying failures with
+exponential backoff.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 30
+# How long a worker owns a claimed email before another worker may retry it.
+LEASE_SECONDS = 300
+
+
+def enqueue(subject, body, recipients, from_email=None):
+    """Queue an email for the outbox worker."""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        recipients=list(recipients),
+        from_email=from_email or settings.EMAIL_HOST_USER,
+    )
+
+
+def queue_confirmation_email(booking):
+    subject = "Booking Confirmation"
+    message = f"Dear {booking.customer.username},\n\nYour booking with {booking.barber.name} on {booking.date} at {booking.time} has been confirmed.\n\nThank you!"
+    return enqueue(subject, message, [booking.customer.email])
+
+
+def queue_waitlist_email(booking):
+    subject = "Booked From the Waitlist"
+    message = f"Dear {booking.customer.username},\n\nA slot opened up with {booking.barber.name} on {booking.date}, and you have been booked at {booking.time}.\n\nIf you can no longer make it, please cancel the booking so the next customer can have it.\n\nThank you!"
+    return enqueue(subject, message, [booking.customer.email])
+
+
+def queue_admin_notification(booking):
+    subject = "New Booking Created"
+    message = f"A new booking has been made for {booking.barber.name} on {booking.date} at {booking.time}."
+    return enqueue(subject, message, settings.BOOKING_NOTIFICATION_EMAILS)
+
+
+def _claim(batch_size, now):
+    """Lease up to ``batch_size`` due emails so no other worker sends them."""
+    due = OutboundEmail.objects.filter(
+        status=OutboundEmail.PENDING, next_attempt_at__lte=now
+    ).order_by('next_attempt_at', 'id')[:batch_size]
+
+    lease_until = now + timedelta(seconds=LEASE_SECONDS)
+    claimed = []
+    for email in due:
+        updated = OutboundEmail.objects.filter(
+            pk=email.pk, status=OutboundEmail.PENDING, next_attempt_at=email.next_attempt_at
+        ).update(next_attempt_at=lease_until)
+        if updated:
+            claimed.append(email)
+    return claimed
+
+
+def _failed(email, error, now, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = OutboundEmail.FAILED
+    else:
+        email.next_attempt_at = now + timedelta(seconds=BACKOFF_SECONDS * 2 ** (email.attempts - 1))
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def send_pending(batch_size=100, max_attempts=MAX_ATTEMPTS, connection=None):
+    """Send one batch of due emails over a single connection.
+
+    Returns ``(sent, failed)`` counts for the batch.
+    """
+    now = timezone.now()
+    emails = _claim(batch_size, now)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        for email in emails:
+            _failed(email, exc, now, max_attempts)
+        return 0, len(emails)
+
+    try:
+        for email in emails:
+            message = EmailMessage(
+                email.subject, email.body, email.from_email or None, email.recipients,
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as exc:
+                _failed(email, exc, now, max_attempts)
+                failed += 1
+            else:
+                email.status = OutboundEmail.SENT
+                email.sent_at = timezone.now()
+                email.attempts += 1
+                email.save(update_fields=['status', 'sent_at', 'attempts'])
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,131 @@
+"""Compact bitmask representation of a barber's booked slots on one day."""
+from . import slots as slot_templates
+from .slots import SLOT_MINUTES
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def slot_count(barber, slot_minutes=SLOT_MINUTES):
+    """Return how many slots fit in the barber's working day."""
+    return slot_templates.for_barber(barber, slot_minutes).count
+
+
+class Occupancy:
+    """Booked slots for one barber on one day, stored as an int bitmask.
+
+    Bit ``i`` is set when the ``i``-th slot of the barber's
+    :class:`~booking.slots.SlotTemplate` is booked. Free slots, the first
+    free slot and the fully booked check are all bit operations. Bookings
+    longer than one slot book (and need) a run of consecutive slots. Slots
+    touched by time off are ``closed``: never free, but not booked either.
+    """
+
+    __slots__ = ('template', 'booked', 'closed')
+
+    def __init__(self, template, booked=0, closed=0):
+        self.template = template
+        self.booked = booked
+        self.closed = closed
+
+    @classmethod
+    def for_barber(cls, barber, bookings=(), slot_minutes=SLOT_MINUTES, day=None, exceptions=None):
+        """Build the occupancy of a barber's day from ``(time, duration_minutes)`` pairs of its bookings.
+
+        With ``day`` and the barber's
+        :class:`~booking.schedule_exceptions.ExceptionIndex`, the slots are
+        those of the day's changed hours, if any, and the day's time off
+        closes the slots it touches.
+        """
+        template = None
+        blocked = ()
+        if day is not None and exceptions:
+            hours = exceptions.day_hours(day)
+            if hours is not None:
+                template = slot_templates.get_template(*hours, slot_minutes)
+            blocked = exceptions.blocked_intervals(day)
+        occupancy = cls(template or slot_templates.for_barber(barber, slot_minutes))
+        for start, end in blocked:
+            occupancy.closed |= occupancy.template.overlapping(start, end)
+        for value, duration in bookings:
+            occupancy.book(value, duration_minutes=duration)
+        return occupancy
+
+    @property
+    def slot_count(self):
+        return self.template.count
+
+    @property
+    def capacity(self):
+        """Return how many slots of the day can be booked, i.e. those not closed."""
+        return self.slot_count - self.closed.bit_count()
+
+    @property
+    def full_mask(self):
+        return self.template.full_mask
+
+    @property
+    def free_mask(self):
+        return ~(self.booked | self.closed) & self.full_mask
+
+    def index(self, value):
+        """Return the slot index for a time, or None if it is not a slot start."""
+        return self.template.index(value)
+
+    def time(self, index):
+        """Return the start time of the slot at ``index``."""
+        return self.template.times[index]
+
+    def book(self, value, slots=1, duration_minutes=None):
+        """Mark the slots a booking from ``value`` overlaps as booked.
+
+        The booking lasts ``duration_minutes``, or ``slots`` whole slots. Its
+        start is rounded down and its end up to the slot grid, as
+        :class:`~booking.schedule.DaySchedule` blocks them, and a span running
+        past the end of the day books the slots that exist.
+        """
+        if duration_minutes is None:
+            duration_minutes = slots * self.template.slot_minutes
+        start = _minutes(value)
+        self.booked |= self.template.overlapping(start, start + duration_minutes)
+
+    def is_free(self, value, slots=1):
+        """Whether ``slots`` consecutive free slots start at ``value``."""
+        span = self.template.span(value, slots)
+        return span is not None and not self.booked & span
+
+    def is_fully_booked(self):
+        return not self.free_mask
+
+    def first_free(self, slots=1):
+        """Return the first time ``slots`` free slots start, or None when there is none."""
+        free = self.template.starts(self.free_mask, slots)
+        if not free:
+            return None
+        return self.time((free & -free).bit_length() - 1)
+
+    def free_slots(self, after=None, slots=1):
+        """Return the times ``slots`` free slots start, optionally only those after ``after``."""
+        free = self.template.starts(self.free_mask, slots)
+        if after is not None:
+            first = (_minutes(after) - self.template.start) // self.template.slot_minutes + 1
+            if first > 0:
+                free &= ~((1 << first) - 1)
+        times = []
+        while free:
+            low = free & -free
+            times.append(self.time(low.bit_length() - 1))
+            free ^= low
+        return times
+
+    def booked_runs(self):
+        """Return the booked slots as ``(time, duration_minutes)`` pairs, one per run of consecutive slots."""
+        runs = []
+        booked = self.booked
+        while booked:
+            index = (booked & -booked).bit_length() - 1
+            length = ((booked >> index) ^ ((booked >> index) + 1)).bit_length() - 1
+            runs.append((self.time(index), length * self.template.slot_minutes))
+            booked &= ~(((1 << length) - 1) << index)
+        return runs
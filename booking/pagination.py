@@ -0,0 +1,47 @@
+"""Keyset (seek) pagination of bookings on (date, time, id).
+
+Each page continues strictly after the last row of the previous one, so
+fetching a page costs an index seek on the booking ordering columns instead
+of an OFFSET scan over every earlier row.
+"""
+from datetime import date, time
+
+from django.db.models import Q
+
+
+ORDERING = ('date', 'time', 'id')
+CURSOR_VAR = 'after'
+
+
+def encode_cursor(booking):
+    """Return the opaque cursor pointing just after ``booking``."""
+    return f'{booking.date.isoformat()}_{booking.time.strftime("%H:%M:%S")}_{booking.id}'
+
+
+def decode_cursor(cursor):
+    """Parse a cursor into ``(date, time, id)``; raises ValueError when malformed."""
+    day, at, pk = cursor.split('_')
+    return date.fromisoformat(day), time.fromisoformat(at), int(pk)
+
+
+def after(queryset, cursor):
+    """Order ``queryset`` by (date, time, id) and keep only rows after ``cursor``."""
+    queryset = queryset.order_by(*ORDERING)
+    if cursor is None:
+        return queryset
+    day, at, pk = decode_cursor(cursor)
+    return queryset.filter(
+        Q(date__gt=day) | Q(date=day, time__gt=at) | Q(date=day, time=at, id__gt=pk)
+    )
+
+
+def keyset_page(queryset, cursor=None, per_page=50):
+    """Return ``(rows, next_cursor)`` for the page after ``cursor``.
+
+    ``next_cursor`` is None on the last page.
+    """
+    rows = list(after(queryset, cursor)[:per_page + 1])
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,180 @@
+"""Per-request timing: wall time, database query count and SQL time.
+
+:class:`RequestProfilingMiddleware` reports every request as a
+``Server-Timing`` header and a structured log line on the
+``booking.profiling`` logger. With ``REQUEST_PROFILING_SAMPLE_RATE`` above
+zero, that fraction of sync requests also runs under cProfile, and the
+profile of those slower than ``REQUEST_PROFILING_SLOW_MS`` is logged (and
+written to ``REQUEST_PROFILING_DIR`` when set).
+
+Queries are counted by an execute wrapper installed on every database
+connection. The per-request totals live in a context variable, which
+``sync_to_async`` carries into the threads that run the ORM for async
+views, so queries are attributed to the right request under WSGI and ASGI.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_LINES = 30
+
+_current = ContextVar('booking_request_timing', default=None)
+# cProfile can only profile one thread at a time on newer Pythons
+_profiler_lock = threading.Lock()
+
+
+class RequestTiming:
+    """Timings of one request."""
+
+    __slots__ = ('started', 'queries', 'sql_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    @property
+    def sql_ms(self):
+        return self.sql_seconds * 1000
+
+
+def _record_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.queries += 1
+        timing.sql_seconds += time.perf_counter() - started
+
+
+def _install_wrapper(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install():
+    """Count queries on every current and future database connection."""
+    connection_created.connect(_install_wrapper, dispatch_uid='booking.profiling')
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(connection)
+
+
+class RequestProfilingMiddleware:
+    """Time each request and report it as ``Server-Timing`` and a log line.
+
+    Put it first in ``MIDDLEWARE`` so the total covers the other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'REQUEST_PROFILING_SERVER_TIMING', settings.DEBUG)
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0.0)
+        self.slow_ms = getattr(settings, 'REQUEST_PROFILING_SLOW_MS', 500)
+        self.profile_dir = getattr(settings, 'REQUEST_PROFILING_DIR', None)
+        install()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        profiler = self._start_profiler()
+        try:
+            response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _profiler_lock.release()
+            _current.reset(token)
+        self._report(request, response, timing, profiler)
+        return response
+
+    async def __acall__(self, request):
+        timing = RequestTiming()
+        token = _current.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._report(request, response, timing)
+        return response
+
+    def _start_profiler(self):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+        if not _profiler_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) is already active
+            _profiler_lock.release()
+            return None
+        return profiler
+
+    def _report(self, request, response, timing, profiler=None):
+        total_ms = timing.total_ms
+        sql_ms = timing.sql_ms
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'total;dur={total_ms:.1f}, '
+                f'db;dur={sql_ms:.1f};desc="{timing.queries} queries", '
+                f'app;dur={max(total_ms - sql_ms, 0):.1f}'
+            )
+
+        match = request.resolver_match
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 1),
+            'db_queries': timing.queries,
+            'db_ms': round(sql_ms, 1),
+        }
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                ' '.join(f'{key}=%s' for key in fields), *fields.values(), extra={'request_timing': fields},
+            )
+
+        if profiler is not None and total_ms >= self.slow_ms:
+            self._report_profile(fields, profiler)
+
+    def _report_profile(self, fields, profiler):
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        if self.profile_dir:
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{fields['view'] or 'unresolved'}-{os.getpid()}.prof"
+            profiler.dump_stats(os.path.join(self.profile_dir, name.replace(':', '_')))
+        logger.warning(
+            'Slow request %s %s took %.1fms\n%s', fields['method'], fields['path'], fields['duration_ms'],
+            stream.getvalue(), extra={'request_timing': fields},
+        )
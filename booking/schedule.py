@@ -0,0 +1,144 @@
+"""Interval scheduling for appointments of any length.
+
+A :class:`DaySchedule` keeps one barber's booked intervals on one day as two
+parallel sorted lists of start and end minutes. Checking whether an
+appointment fits is a bisection plus a look at the two neighbours, and
+finding start times walks the gaps between intervals, so neither grows with
+a scan over every slot of the day. Appointments still start on the
+barber's slot grid (see :mod:`booking.slots`), but may last any number of
+minutes.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import time
+
+from . import slots as slot_templates
+from .models import Booking
+from .slots import SLOT_MINUTES
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+class DaySchedule:
+    """Booked ``[start, end)`` minute intervals of one barber's working day."""
+
+    __slots__ = ('template', 'starts', 'ends')
+
+    def __init__(self, template, intervals=()):
+        self.template = template
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(intervals):
+            if self.ends and start < self.ends[-1]:
+                # Overlapping legacy bookings are merged into one interval
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    @classmethod
+    def for_barber(cls, barber, bookings=(), slot_minutes=SLOT_MINUTES, day=None, exceptions=None):
+        """Build a barber's day from ``(time, duration_minutes)`` pairs of its bookings.
+
+        With ``day`` and the barber's
+        :class:`~booking.schedule_exceptions.ExceptionIndex`, changed hours
+        replace the usual ones and time off is blocked like a booking.
+        """
+        template = None
+        intervals = [(_minutes(value), _minutes(value) + duration) for value, duration in bookings]
+        if day is not None and exceptions:
+            hours = exceptions.day_hours(day)
+            if hours is not None:
+                template = slot_templates.get_template(*hours, slot_minutes)
+            intervals.extend(exceptions.blocked_intervals(day))
+        return cls(template or slot_templates.for_barber(barber, slot_minutes), intervals)
+
+    @property
+    def intervals(self):
+        return list(zip(self.starts, self.ends))
+
+    def within_hours(self, value, duration):
+        """Whether ``value`` is a slot start and ``duration`` minutes from it end within the working day."""
+        return self.template.index(value) is not None and _minutes(value) + duration <= self.template.end
+
+    def fits(self, value, duration):
+        """Whether an appointment of ``duration`` minutes can start at ``value``."""
+        if not self.within_hours(value, duration):
+            return False
+        start = _minutes(value)
+        end = start + duration
+        i = bisect_right(self.starts, start)
+        # The interval starting at or before us must have ended, and the next
+        # one must not start before we finish.
+        return (i == 0 or self.ends[i - 1] <= start) and (i == len(self.starts) or self.starts[i] >= end)
+
+    def add(self, value, duration):
+        """Book ``duration`` minutes from ``value``; the caller checks :meth:`fits` first."""
+        start = _minutes(value)
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, start + duration)
+
+    def gaps(self, after=None):
+        """Yield the free ``(start, end)`` minute ranges of the working day."""
+        cursor = self.template.start
+        first = 0
+        if after is not None:
+            cursor = max(cursor, _minutes(after))
+            # Skip intervals that are over before ``after`` without scanning them
+            first = max(0, bisect_right(self.starts, cursor) - 1)
+        for start, end in zip(self.starts[first:], self.ends[first:]):
+            if start > cursor:
+                yield cursor, min(start, self.template.end)
+            cursor = max(cursor, end)
+            if cursor >= self.template.end:
+                return
+        if cursor < self.template.end:
+            yield cursor, self.template.end
+
+    def iter_free_starts(self, duration, after=None):
+        """Yield the slot times where an appointment of ``duration`` minutes fits.
+
+        With ``after``, only starts strictly later than it are returned.
+        """
+        template = self.template
+        step = template.slot_minutes
+        for gap_start, gap_end in self.gaps(after):
+            offset = gap_start - template.start
+            start = template.start + -(-offset // step) * step
+            if after is not None and start <= _minutes(after):
+                start += step
+            while start + duration <= gap_end:
+                yield time(*divmod(start, 60))
+                start += step
+
+    def free_starts(self, duration, after=None):
+        """List of :meth:`iter_free_starts`."""
+        return list(self.iter_free_starts(duration, after))
+
+    def first_fit(self, duration, after=None):
+        """Return the earliest slot time an appointment of ``duration`` fits, or None."""
+        return next(self.iter_free_starts(duration, after), None)
+
+
+def _interval_rows(barber_ids, day):
+    return Booking.objects.filter(barber_id__in=barber_ids, date=day).values_list(
+        'barber_id', 'time', 'duration_minutes',
+    )
+
+
+def intervals_by_barber(barber_ids, day):
+    """Return ``{barber_id: [(time, duration_minutes), ...]}`` of the day's bookings in one query."""
+    result = {barber_id: [] for barber_id in barber_ids}
+    for barber_id, value, duration in _interval_rows(barber_ids, day):
+        result[barber_id].append((value, duration))
+    return result
+
+
+async def aintervals_by_barber(barber_ids, day):
+    """Async version of :func:`intervals_by_barber`."""
+    result = {barber_id: [] for barber_id in barber_ids}
+    async for barber_id, value, duration in _interval_rows(barber_ids, day):
+        result[barber_id].append((value, duration))
+    return result
@@ -0,0 +1,142 @@
+"""Per-barber index of schedule exceptions: time off and one-off working hours.
+
+An :class:`ExceptionIndex` holds one barber's
+:class:`~booking.models.ScheduleException` rows as sorted lists of absolute
+minutes (``date.toordinal() * 1440 + minute``), so asking whether a slot or
+a day is blocked, or whether a day has changed hours, is a bisection no
+matter how many years of exceptions the barber has. Time off is merged into
+non-overlapping intervals on load; an exception blocking certain hours over
+a range of days becomes one interval per day.
+
+Indexes are built from one query for any number of barbers and kept in
+process memory by ``booking.caching`` until an exception of the barber
+changes.
+"""
+from bisect import bisect_right
+from datetime import timedelta
+
+from .models import ScheduleException
+
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _point(day, minute=0):
+    return day.toordinal() * MINUTES_PER_DAY + minute
+
+
+class ExceptionIndex:
+    """Time off and changed hours of one barber."""
+
+    __slots__ = ('closed_starts', 'closed_ends', 'hours_starts', 'hours_ends', 'hours')
+
+    def __init__(self, exceptions=()):
+        """Index ``(kind, start_date, end_date, start_time, end_time)`` rows."""
+        closed, hours = [], []
+        for kind, start_date, end_date, start_time, end_time in exceptions:
+            if kind == ScheduleException.HOURS:
+                hours.append((start_date.toordinal(), end_date.toordinal(), (start_time, end_time)))
+            elif start_time is None:
+                closed.append((_point(start_date), _point(end_date + timedelta(days=1))))
+            else:
+                day = start_date
+                while day <= end_date:
+                    closed.append((_point(day, _minutes(start_time)), _point(day, _minutes(end_time))))
+                    day += timedelta(days=1)
+
+        self.closed_starts = []
+        self.closed_ends = []
+        for start, end in sorted(closed):
+            if self.closed_ends and start <= self.closed_ends[-1]:
+                self.closed_ends[-1] = max(self.closed_ends[-1], end)
+            else:
+                self.closed_starts.append(start)
+                self.closed_ends.append(end)
+
+        # Changed hours do not overlap (see ScheduleException.clean)
+        hours.sort(key=lambda row: row[0])
+        self.hours_starts = [row[0] for row in hours]
+        self.hours_ends = [row[1] for row in hours]
+        self.hours = [row[2] for row in hours]
+
+    def __bool__(self):
+        return bool(self.closed_starts or self.hours_starts)
+
+    def day_hours(self, day):
+        """Return the ``(start_time, end_time)`` worked on ``day`` instead of the usual, or None."""
+        ordinal = day.toordinal()
+        i = bisect_right(self.hours_starts, ordinal) - 1
+        if i >= 0 and self.hours_ends[i] >= ordinal:
+            return self.hours[i]
+        return None
+
+    def is_blocked(self, day, start_minute, end_minute):
+        """Whether any minute of ``[start_minute, end_minute)`` on ``day`` is time off."""
+        start, end = _point(day, start_minute), _point(day, end_minute)
+        i = bisect_right(self.closed_starts, start)
+        return (i > 0 and self.closed_ends[i - 1] > start) or (
+            i < len(self.closed_starts) and self.closed_starts[i] < end
+        )
+
+    def covers(self, day, start_minute, end_minute):
+        """Whether all of ``[start_minute, end_minute)`` on ``day`` is time off."""
+        start = _point(day, start_minute)
+        i = bisect_right(self.closed_starts, start) - 1
+        return i >= 0 and self.closed_ends[i] >= _point(day, end_minute)
+
+    def blocked_intervals(self, day):
+        """Return the time off on ``day`` as ``(start, end)`` minutes of the day."""
+        day_start = _point(day)
+        day_end = day_start + MINUTES_PER_DAY
+        intervals = []
+        i = bisect_right(self.closed_ends, day_start)
+        while i < len(self.closed_starts) and self.closed_starts[i] < day_end:
+            intervals.append((
+                max(self.closed_starts[i], day_start) - day_start,
+                min(self.closed_ends[i], day_end) - day_start,
+            ))
+            i += 1
+        return intervals
+
+    def affects(self, day):
+        """Whether ``day`` has any time off or changed hours."""
+        return self.day_hours(day) is not None or self.is_blocked(day, 0, MINUTES_PER_DAY)
+
+    def is_working(self, day, usually_works, start_time, end_time):
+        """Whether a barber who ``usually_works`` on this weekday from ``start_time`` to ``end_time`` works ``day``."""
+        hours = self.day_hours(day)
+        if hours is None:
+            if not usually_works:
+                return False
+            hours = (start_time, end_time)
+        return not self.covers(day, _minutes(hours[0]), _minutes(hours[1]))
+
+
+EMPTY = ExceptionIndex()
+
+
+def _rows(barber_ids):
+    return ScheduleException.objects.filter(barber_id__in=barber_ids).values_list(
+        'barber_id', 'kind', 'start_date', 'end_date', 'start_time', 'end_time',
+    )
+
+
+def _group(barber_ids, rows):
+    grouped = {barber_id: [] for barber_id in barber_ids}
+    for barber_id, *row in rows:
+        grouped[barber_id].append(row)
+    return {barber_id: ExceptionIndex(rows) if rows else EMPTY for barber_id, rows in grouped.items()}
+
+
+def load_indexes(barber_ids):
+    """Return ``{barber_id: ExceptionIndex}`` built from one query."""
+    return _group(barber_ids, _rows(barber_ids))
+
+
+async def aload_indexes(barber_ids):
+    """Async version of :func:`load_indexes`."""
+    return _group(barber_ids, [row async for row in _rows(barber_ids)])
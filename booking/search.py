@@ -0,0 +1,65 @@
+"""Earliest free appointment slots across many barbers.
+
+Each barber contributes a lazy, time-ordered stream of free start times and
+:func:`heapq.merge` does the k-way merge, so the search stops as soon as it
+has ``limit`` results. Days are loaded only when the first stream reaches
+them, with one query (or cache lookup) for every barber at once, and days
+the summaries already show as fully booked, or that time off closes, are
+skipped without loading.
+"""
+import heapq
+from datetime import datetime, timedelta
+from itertools import islice
+
+from . import availability, caching, summaries
+
+
+class _DayLoader:
+    """Day schedules of the candidate barbers, loaded per day on first use."""
+
+    def __init__(self, barbers, full_days, exceptions):
+        self.barbers = barbers
+        self.full_days = full_days
+        self.exceptions = exceptions
+        self.weekdays = {barber.id: availability.working_weekdays(barber) for barber in barbers}
+        self._days = {}
+
+    def is_candidate(self, barber, day):
+        return availability.is_open(
+            barber, day, self.full_days, self.weekdays[barber.id], self.exceptions[barber.id],
+        )
+
+    def get(self, day):
+        schedules = self._days.get(day)
+        if schedules is None:
+            barbers = [barber for barber in self.barbers if self.is_candidate(barber, day)]
+            schedules = self._days[day] = caching.day_schedules(barbers, day)
+        return schedules
+
+
+def _free_starts(barber, loader, now, end_date, duration):
+    """Yield ``(datetime, barber_id)`` for each free start of the barber, earliest first."""
+    for day in availability.daterange(now.date(), end_date):
+        if not loader.is_candidate(barber, day):
+            continue
+        after = now.time() if day == now.date() else None
+        for start in loader.get(day)[barber.id].iter_free_starts(duration, after):
+            yield datetime.combine(day, start), barber.id
+
+
+def earliest_slots(barbers, duration, limit, now=None, days=availability.LOOKAHEAD_DAYS):
+    """Return the first ``limit`` ``(datetime, barber)`` pairs at which any of the barbers is free.
+
+    Only starts later than ``now`` (default: the current time) within the
+    next ``days`` days are considered; ties are broken by barber id.
+    """
+    barbers = list(barbers)
+    now = now or datetime.now()
+    end_date = now.date() + timedelta(days=days - 1)
+    loader = _DayLoader(
+        barbers, summaries.full_days(barbers, now.date(), end_date), caching.exception_indexes(barbers),
+    )
+    by_id = {barber.id: barber for barber in barbers}
+
+    streams = [_free_starts(barber, loader, now, end_date, duration) for barber in barbers]
+    return [(start, by_id[barber_id]) for start, barber_id in islice(heapq.merge(*streams), limit)]
@@ -0,0 +1,67 @@
+"""Synthetic barbers, customers and bookings for benchmarks."""
+import random
+from datetime import date, time, timedelta
+
+from django.contrib.auth.models import User
+
+from . import summaries
+from .models import Barber, Booking, Service
+from .weekdays import ALL_DAYS
+
+
+SLOTS_PER_DAY = 16
+
+
+def seed(barbers=10, customers=100, bookings=10_000, fill=0.5, start_date=None, batch_size=5000, rng_seed=0,
+         summarize=True):
+    """Bulk insert a reproducible dataset and return ``(barbers, customers)``.
+
+    Barbers work every day from 09:00 to 17:00. Bookings are spread over
+    enough days around ``start_date`` (default: today) that roughly ``fill``
+    of all slots are taken, and never collide on a slot. Day summaries are
+    rebuilt afterwards unless ``summarize`` is false.
+    """
+    rng = random.Random(rng_seed)
+    barber_objs = Barber.objects.bulk_create(
+        [
+            Barber(
+                name=f'Barber {i}',
+                specialization='Haircut',
+                start_time=time(9),
+                end_time=time(17),
+                working_days=ALL_DAYS,
+            )
+            for i in range(barbers)
+        ],
+        batch_size=batch_size,
+    )
+    customer_objs = User.objects.bulk_create(
+        [User(username=f'customer{i}', email=f'customer{i}@example.com', password='!') for i in range(customers)],
+        batch_size=batch_size,
+    )
+
+    service, _ = Service.objects.get_or_create(name='Haircut', defaults={'duration_minutes': 30})
+
+    slots_per_day = barbers * SLOTS_PER_DAY
+    days = max(1, -(-int(bookings / fill) // slots_per_day))
+    start_date = (start_date or date.today()) - timedelta(days=days // 2)
+
+    taken = rng.sample(range(days * slots_per_day), min(bookings, days * slots_per_day))
+    for offset in range(0, len(taken), batch_size):
+        batch = []
+        for index in taken[offset:offset + batch_size]:
+            day, rest = divmod(index, slots_per_day)
+            barber, slot = divmod(rest, SLOTS_PER_DAY)
+            batch.append(Booking(
+                customer=customer_objs[rng.randrange(customers)],
+                barber=barber_objs[barber],
+                date=start_date + timedelta(days=day),
+                time=time(9 + slot // 2, 30 * (slot % 2)),
+                service=service,
+                duration_minutes=service.duration_minutes,
+            ))
+        Booking.objects.bulk_create(batch)
+    if summarize:
+        # bulk_create skips the signals that maintain the day summaries
+        summaries.rebuild(barber_objs, batch_size=batch_size)
+    return barber_objs, customer_objs
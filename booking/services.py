@@ -0,0 +1,159 @@
+"""Transactional booking creation, rescheduling and waitlist booking.
+
+Both operations reserve the slot atomically: on PostgreSQL the barber row is
+locked with ``select_for_update`` so writers for the same barber queue up,
+and on every backend the unique (barber, date, time) constraint is the final
+arbiter for bookings starting at the same time. Overlap with the barber's
+other bookings that day and the barber's time off is checked on their
+intervals, since appointments last as long as their service. Past dates
+and days the barber does not work are refused under the same lock. SQLite
+lock contention is retried with a short backoff.
+"""
+import random
+import time
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from . import availability, caching, notifications
+from .models import Barber, Booking, Service, WaitlistEntry
+from .schedule import DaySchedule
+
+
+MAX_ATTEMPTS = 10
+BACKOFF_SECONDS = 0.01
+
+
+class _NoLongerWaiting(Exception):
+    """The waitlist entry was booked or cancelled before its booking was reserved."""
+
+
+class SlotUnavailable(Exception):
+    """The requested slot is already booked."""
+
+    def __init__(self, barber, date, time):
+        self.barber = barber
+        self.date = date
+        self.time = time
+        super().__init__(f"{barber.name} is already booked on {date} at {time.strftime('%H:%M')}.")
+
+
+class DayUnavailable(SlotUnavailable):
+    """The requested date is in the past or a day the barber does not work."""
+
+    def __init__(self, barber, date, time):
+        super().__init__(barber, date, time)
+        self.args = (f"{barber.name} is not taking bookings on {date}.",)
+
+
+def _is_lock_error(exc):
+    message = str(exc).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def _is_bookable_day(booking, exceptions):
+    if booking.date < timezone.localdate():
+        return False
+    weekdays = availability.working_weekdays(booking.barber)
+    return availability.is_working(booking.barber, booking.date, weekdays, exceptions)
+
+
+def _is_free(booking, exceptions):
+    others = Booking.objects.filter(
+        barber_id=booking.barber_id, date=booking.date
+    ).exclude(pk=booking.pk).values_list('time', 'duration_minutes')
+    day = DaySchedule.for_barber(booking.barber, others, day=booking.date, exceptions=exceptions)
+    return day.fits(booking.time, booking.duration_minutes)
+
+
+def _service(service):
+    return service if isinstance(service, Service) else Service.objects.get(name=service)
+
+
+def _reserve(booking, on_reserved=None):
+    """Save ``booking`` if its slots are still free, or raise SlotUnavailable.
+
+    Raises DayUnavailable, a SlotUnavailable, when the date is in the past
+    or the barber does not work that day.
+
+    ``on_reserved`` is called with the booking inside the same transaction,
+    so whatever it writes commits or rolls back together with the booking.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                Barber.objects.select_for_update().only('id').get(pk=booking.barber_id)
+                exceptions = caching.exception_indexes([booking.barber])[booking.barber_id]
+                if not _is_bookable_day(booking, exceptions):
+                    raise DayUnavailable(booking.barber, booking.date, booking.time)
+                if not _is_free(booking, exceptions):
+                    raise SlotUnavailable(booking.barber, booking.date, booking.time)
+                booking.save()
+                if on_reserved is not None:
+                    on_reserved(booking)
+            return booking
+        except IntegrityError:
+            # Another transaction took the slot between our check and insert.
+            raise SlotUnavailable(booking.barber, booking.date, booking.time) from None
+        except OperationalError as exc:
+            if not _is_lock_error(exc) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(BACKOFF_SECONDS * 2 ** attempt * random.random())
+
+
+def _queue_booking_emails(booking):
+    notifications.queue_confirmation_email(booking)
+    notifications.queue_admin_notification(booking)
+
+
+def create_booking(customer, barber, date, time, service):
+    """Atomically book a free slot for a customer and queue the notification emails.
+
+    ``service`` is a :class:`Service` or its name. The booking lasts for the
+    service's duration.
+    """
+    service = _service(service)
+    booking = Booking(
+        customer=customer, barber=barber, date=date, time=time,
+        service=service, duration_minutes=service.duration_minutes,
+    )
+    return _reserve(booking, on_reserved=_queue_booking_emails)
+
+
+def move_booking(booking, barber, date, time, service=None):
+    """Atomically move an existing booking to another slot."""
+    booking.barber = barber
+    booking.date = date
+    booking.time = time
+    if service is not None:
+        booking.service = _service(service)
+        booking.duration_minutes = booking.service.duration_minutes
+    return _reserve(booking)
+
+
+def book_from_waitlist(entry, time):
+    """Atomically book a waiting customer into a free slot, mark the entry booked and queue the emails.
+
+    Returns the booking, or None if the entry stopped waiting meanwhile
+    (for instance because a concurrent match booked it first).
+    """
+    service = entry.service
+    booking = Booking(
+        customer=entry.customer, barber=entry.barber, date=entry.date, time=time,
+        service=service, duration_minutes=service.duration_minutes,
+    )
+
+    def on_reserved(booking):
+        waiting = WaitlistEntry.objects.filter(pk=entry.pk, status=WaitlistEntry.WAITING)
+        if not waiting.update(status=WaitlistEntry.BOOKED, booking=booking):
+            raise _NoLongerWaiting
+        notifications.queue_waitlist_email(booking)
+        notifications.queue_admin_notification(booking)
+
+    try:
+        _reserve(booking, on_reserved=on_reserved)
+    except _NoLongerWaiting:
+        return None
+    entry.status = WaitlistEntry.BOOKED
+    entry.booking = booking
+    return booking
@@ -0,0 +1,161 @@
+"""Model signal handlers keeping day summaries and cached availability and calendars in step with the database.
+
+Deleting a booking, or moving it to other time, also offers the freed time
+to the barber's waitlist for that day once the transaction commits, and
+every committed change of a booking's time is published to live viewers
+(see :mod:`booking.live`).
+
+Bulk operations (``QuerySet.update``, ``bulk_create``) bypass these; run the
+``rebuild_day_summaries`` command after them.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, live, slots, summaries, waitlist
+from .models import Barber, Booking, ScheduleException
+
+
+def _invalidate(*barber_ids):
+    """Bump the barbers' cache versions now and again once the transaction commits.
+
+    The second bump drops anything a concurrent request cached from the
+    database between the first bump and the commit.
+    """
+    barber_ids = {barber_id for barber_id in barber_ids if barber_id is not None}
+    for barber_id in barber_ids:
+        caching.bump_version(barber_id)
+    transaction.on_commit(lambda: [caching.bump_version(barber_id) for barber_id in barber_ids])
+
+
+def _invalidate_customer(customer_id):
+    """Bump a customer's bookings version now and again once the transaction commits."""
+    caching.bump_user_bookings(customer_id)
+    transaction.on_commit(lambda: caching.bump_user_bookings(customer_id))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        # The id may have belonged to a deleted user with cached calendars
+        caching.bump_user_bookings(instance.pk)
+
+
+def _match_waitlist(barber_id, day):
+    """Offer a barber's freed time on ``day`` to its waitlist once the transaction commits."""
+    transaction.on_commit(lambda: waitlist.match(barber_id, day), robust=True)
+
+
+@receiver(pre_save, sender=Booking)
+def remember_previous_slot(sender, instance, **kwargs):
+    """Record the stored customer, barber, date and time so moving a booking refreshes both sides."""
+    instance._previous_slot = instance._previous_interval = instance._previous_customer_id = None
+    if instance.pk:
+        previous = (
+            Booking.objects.filter(pk=instance.pk)
+            .values_list('barber_id', 'date', 'time', 'duration_minutes', 'customer_id').first()
+        )
+        if previous:
+            instance._previous_slot = previous[:2]
+            instance._previous_interval = previous[:4]
+            instance._previous_customer_id = previous[4]
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_slot', None)
+    summaries.refresh_day(instance.barber, instance.date)
+    if previous and previous != (instance.barber_id, instance.date):
+        barber_id, day = previous
+        barber = instance.barber if barber_id == instance.barber_id else Barber.objects.filter(pk=barber_id).first()
+        if barber is not None:
+            summaries.refresh_day(barber, day)
+    _invalidate(instance.barber_id, previous[0] if previous else None)
+    _invalidate_customer(instance.customer_id)
+    previous_customer_id = getattr(instance, '_previous_customer_id', None)
+    if previous_customer_id is not None and previous_customer_id != instance.customer_id:
+        # The booking left this customer's calendar and list
+        _invalidate_customer(previous_customer_id)
+    interval = getattr(instance, '_previous_interval', None)
+    current = (instance.barber_id, instance.date, instance.time, instance.duration_minutes)
+    if interval != current:
+        if interval:
+            live.publish_on_commit(live.FREED, *interval)
+            _match_waitlist(*previous)
+        live.publish_on_commit(live.TAKEN, *current)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    summaries.refresh_day(instance.barber, instance.date)
+    _invalidate(instance.barber_id)
+    _invalidate_customer(instance.customer_id)
+    live.publish_on_commit(live.FREED, instance.barber_id, instance.date, instance.time, instance.duration_minutes)
+    _match_waitlist(instance.barber_id, instance.date)
+
+
+@receiver(pre_save, sender=Barber)
+def remember_previous_hours(sender, instance, **kwargs):
+    instance._previous_hours = None
+    if instance.pk:
+        instance._previous_hours = (
+            Barber.objects.filter(pk=instance.pk).values_list('start_time', 'end_time').first()
+        )
+
+
+@receiver(post_save, sender=Barber)
+def barber_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_hours', None)
+    if previous and previous != (instance.start_time, instance.end_time):
+        # Capacity and slot positions changed for every day of this barber
+        slots.clear()
+        summaries.rebuild([instance])
+    _invalidate(instance.pk)
+    if created:
+        # The id may have belonged to a deleted barber with exceptions
+        caching.bump_version(instance.pk, caching.EXCEPTIONS)
+
+
+@receiver(post_delete, sender=Barber)
+def barber_deleted(sender, instance, **kwargs):
+    _invalidate(instance.pk)
+
+
+def _invalidate_exceptions(*barber_ids):
+    """Drop the barbers' exception indexes and cached availability, now and on commit."""
+    barber_ids = {barber_id for barber_id in barber_ids if barber_id is not None}
+    for barber_id in barber_ids:
+        caching.bump_version(barber_id, caching.EXCEPTIONS)
+    transaction.on_commit(
+        lambda: [caching.bump_version(barber_id, caching.EXCEPTIONS) for barber_id in barber_ids]
+    )
+    _invalidate(*barber_ids)
+
+
+@receiver(pre_save, sender=ScheduleException)
+def remember_previous_range(sender, instance, **kwargs):
+    """Record the stored barber and dates so moving an exception refreshes both sides."""
+    instance._previous_range = None
+    if instance.pk:
+        instance._previous_range = (
+            ScheduleException.objects.filter(pk=instance.pk)
+            .values_list('barber_id', 'start_date', 'end_date').first()
+        )
+
+
+@receiver(post_save, sender=ScheduleException)
+def schedule_exception_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_range', None)
+    _invalidate_exceptions(instance.barber_id, previous[0] if previous else None)
+    # Changed hours and time off both set the capacity of the booked days they cover
+    current = (instance.barber_id, instance.start_date, instance.end_date)
+    summaries.refresh_days(*current)
+    if previous and previous != current:
+        summaries.refresh_days(*previous)
+
+
+@receiver(post_delete, sender=ScheduleException)
+def schedule_exception_deleted(sender, instance, **kwargs):
+    _invalidate_exceptions(instance.barber_id)
+    summaries.refresh_days(instance.barber_id, instance.start_date, instance.end_date)
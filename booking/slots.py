@@ -0,0 +1,114 @@
+"""Precomputed slot grids for barber schedules.
+
+A barber's slot grid depends only on ``(start_time, end_time, slot_minutes)``,
+so each distinct schedule is computed once into an immutable
+:class:`SlotTemplate` and shared by every barber, day and request that uses
+it. Templates are keyed by value, so a barber whose hours change simply maps
+to another template; saving a barber also clears the memo (see
+``booking.signals``) so templates of retired schedules do not linger.
+
+A booking blocks every slot its duration touches, so a 60 minute service
+takes two 30 minute slots.
+"""
+from datetime import time
+from functools import lru_cache
+from types import MappingProxyType
+
+from django.db.models import ExpressionWrapper, F, IntegerField
+
+
+SLOT_MINUTES = 30
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _as_time(value):
+    # Unsaved barbers still hold the string defaults of their TimeFields
+    return time.fromisoformat(value) if isinstance(value, str) else value
+
+
+class SlotTemplate:
+    """The slot start times of one working day, with their bitmask layout.
+
+    Bit ``i`` of a mask stands for ``times[i]``. Instances are shared between
+    callers and must not be modified.
+    """
+
+    __slots__ = ('start', 'end', 'slot_minutes', 'times', 'indexes', 'count', 'full_mask')
+
+    def __init__(self, start_time, end_time, slot_minutes=SLOT_MINUTES):
+        self.start = _minutes(start_time)
+        self.end = _minutes(end_time)
+        self.slot_minutes = slot_minutes
+        # Only slots that end by end_time; minutes count, not just hours
+        self.times = tuple(
+            time(*divmod(minute, 60))
+            for minute in range(self.start, self.end - slot_minutes + 1, slot_minutes)
+        )
+        self.indexes = MappingProxyType({value: index for index, value in enumerate(self.times)})
+        self.count = len(self.times)
+        self.full_mask = (1 << self.count) - 1
+
+    def __repr__(self):
+        return f'<SlotTemplate {self.count} x {self.slot_minutes} min from {self.times[:1]}>'
+
+    def index(self, value):
+        """Return the slot index for a time, or None if it is not a slot start."""
+        return self.indexes.get(value)
+
+    def span(self, value, slots=1):
+        """Return the mask of ``slots`` consecutive slots starting at ``value``.
+
+        Returns None when ``value`` is not a slot start or the span would run
+        past the end of the day.
+        """
+        index = self.indexes.get(value)
+        if index is None or index + slots > self.count:
+            return None
+        return ((1 << slots) - 1) << index
+
+    def overlapping(self, start_minute, end_minute):
+        """Return the mask of slots overlapping the ``[start_minute, end_minute)`` minutes of the day."""
+        first = max(0, (start_minute - self.start) // self.slot_minutes)
+        last = min(self.count, -(-(end_minute - self.start) // self.slot_minutes))
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def starts(self, free_mask, slots=1):
+        """Return the mask of slots where ``slots`` consecutive slots are free."""
+        starts = free_mask
+        for shift in range(1, slots):
+            starts &= free_mask >> shift
+        return starts
+
+
+@lru_cache(maxsize=256)
+def get_template(start_time, end_time, slot_minutes=SLOT_MINUTES):
+    """Return the shared :class:`SlotTemplate` of a schedule."""
+    return SlotTemplate(start_time, end_time, slot_minutes)
+
+
+def for_barber(barber, slot_minutes=SLOT_MINUTES):
+    """Return the :class:`SlotTemplate` of a barber's working day."""
+    return get_template(_as_time(barber.start_time), _as_time(barber.end_time), slot_minutes)
+
+
+def clear():
+    """Forget every memoized template."""
+    get_template.cache_clear()
+
+
+def slots_for(duration_minutes, slot_minutes=SLOT_MINUTES):
+    """Return how many consecutive slots an appointment of ``duration_minutes`` blocks."""
+    return max(1, -(-duration_minutes // slot_minutes))
+
+
+def booked_slots_expression(slot_minutes=SLOT_MINUTES):
+    """Database expression for :func:`slots_for` of a booking's ``duration_minutes``."""
+    # Integer division on every supported backend
+    return ExpressionWrapper(
+        (F('duration_minutes') + slot_minutes - 1) / slot_minutes, output_field=IntegerField(),
+    )
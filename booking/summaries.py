@@ -0,0 +1,133 @@
+"""Maintenance and reads of the materialized :class:`BarberDaySummary` table.
+
+Writes go through :func:`refresh_day`, called from ``booking.signals`` for
+every (barber, date) a booking enters or leaves, so the table only ever
+changes one row at a time. A day's capacity follows its changed hours and
+time off, so saving or deleting a schedule exception refreshes the booked
+days it covers through :func:`refresh_days`. Reads are indexed range scans over
+(barber, date) that only return fully booked days.
+"""
+from datetime import date, timedelta
+
+from . import availability, caching
+from .models import BarberDaySummary, Barber, Booking
+from .occupancy import Occupancy
+
+
+def _summary(barber, day, bookings, exceptions):
+    occupancy = Occupancy.for_barber(
+        barber, bookings, slot_minutes=availability.SLOT_MINUTES, day=day, exceptions=exceptions,
+    )
+    return BarberDaySummary(
+        barber=barber,
+        date=day,
+        booked_count=len(bookings),
+        capacity=occupancy.capacity,
+        free_mask=occupancy.free_mask,
+    )
+
+
+def refresh_day(barber, day):
+    """Recompute the summary row of one barber and day from its bookings."""
+    bookings = list(Booking.objects.filter(barber=barber, date=day).values_list('time', 'duration_minutes'))
+    if not bookings:
+        BarberDaySummary.objects.filter(barber=barber, date=day).delete()
+        return
+    summary = _summary(barber, day, bookings, caching.exception_indexes([barber])[barber.id])
+    # One upsert instead of update_or_create's lookup, savepoints and write
+    BarberDaySummary.objects.bulk_create(
+        [summary],
+        update_conflicts=True,
+        unique_fields=['barber', 'date'],
+        update_fields=['booked_count', 'capacity', 'free_mask'],
+    )
+
+
+def rebuild(barbers=None, batch_size=5000):
+    """Rebuild the summary rows of the given barbers (default: all) from scratch.
+
+    Returns the number of rows written.
+    """
+    barbers = list(Barber.objects.all() if barbers is None else barbers)
+    BarberDaySummary.objects.filter(barber__in=barbers).delete()
+
+    written = 0
+    indexes = caching.exception_indexes(barbers)
+    for barber in barbers:
+        batch = []
+        current_day, bookings = None, []
+        rows = (
+            Booking.objects.filter(barber=barber)
+            .order_by('date')
+            .values_list('date', 'time', 'duration_minutes')
+            .iterator(chunk_size=batch_size)
+        )
+        for day, time, duration in rows:
+            if day != current_day:
+                if bookings:
+                    batch.append(_summary(barber, current_day, bookings, indexes[barber.id]))
+                current_day, bookings = day, []
+            bookings.append((time, duration))
+            if len(batch) >= batch_size:
+                BarberDaySummary.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if bookings:
+            batch.append(_summary(barber, current_day, bookings, indexes[barber.id]))
+        BarberDaySummary.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def refresh_days(barber_id, start_date, end_date):
+    """Recompute the summary rows of a barber's booked days in a date range, after its hours there changed."""
+    barber = Barber.objects.filter(pk=barber_id).first()
+    if barber is None:
+        return
+    days = (
+        Booking.objects.filter(barber=barber, date__range=(start_date, end_date))
+        .values_list('date', flat=True).distinct()
+    )
+    for day in days:
+        refresh_day(barber, day)
+
+
+def _full_day_rows(barbers, start_date, end_date):
+    return BarberDaySummary.objects.filter(
+        barber_id__in=[barber.id for barber in barbers],
+        date__range=(start_date, end_date),
+        free_mask=0,
+    ).values_list('barber_id', 'date')
+
+
+def full_days(barbers, start_date, end_date):
+    """Return the fully booked ``(barber_id, date)`` pairs in the window."""
+    return set(_full_day_rows(barbers, start_date, end_date))
+
+
+async def afull_days(barbers, start_date, end_date):
+    """Async version of :func:`full_days`."""
+    return {row async for row in _full_day_rows(barbers, start_date, end_date)}
+
+
+def available_dates_by_barber(barbers, start_date, end_date, exceptions=None):
+    """Summary-table version of :func:`booking.availability.available_dates_by_barber`."""
+    barbers = list(barbers)
+    full = full_days(barbers, start_date, end_date)
+    return availability.open_dates_by_barber(barbers, start_date, end_date, full, exceptions)
+
+
+async def aavailable_dates_by_barber(barbers, start_date, end_date, exceptions=None):
+    """Async version of :func:`available_dates_by_barber`."""
+    barbers = list(barbers)
+    full = await afull_days(barbers, start_date, end_date)
+    return availability.open_dates_by_barber(barbers, start_date, end_date, full, exceptions)
+
+
+def next_available_dates(barbers, today=None, days=availability.LOOKAHEAD_DAYS, exceptions=None):
+    """Summary-table version of :func:`booking.availability.next_available_dates`."""
+    barbers = list(barbers)
+    today = today or date.today()
+    end_date = today + timedelta(days=days - 1)
+    full = full_days(barbers, today, end_date)
+    return availability.first_open_dates(barbers, today, end_date, full, exceptions)
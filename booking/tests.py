@@ -1,3 +1,1384 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from barber_system import databases
+
+from . import (
+    availability, caching, importing, live, month_grid, notifications, schedule_exceptions, search, services, slots,
+    summaries, views, waitlist,
+)
+from .models import Barber, BarberDaySummary, Booking, OutboundEmail, ScheduleException, Service, WaitlistEntry
+from .occupancy import Occupancy
+from .schedule import DaySchedule
+from .services import DayUnavailable, SlotUnavailable, create_booking, move_booking
+
+
+def next_weekday(weekday=0):
+    """Return the next date (after today) falling on ``weekday``."""
+    today = date.today()
+    return today + timedelta(days=(weekday - today.weekday() - 1) % 7 + 1)
+
+
+class OccupancyTests(SimpleTestCase):
+    def setUp(self):
+        # Four half-hour slots, 9:00 to 11:00
+        self.barber = Barber(name='Sam', start_time=time(9), end_time=time(11))
+
+    def test_bits_follow_the_slots_of_the_day(self):
+        occupancy = Occupancy.for_barber(self.barber)
+        self.assertEqual(occupancy.full_mask, 0b1111)
+        occupancy.book(time(9))
+        occupancy.book(time(10, 30))
+        self.assertEqual(occupancy.booked, 0b1001)
+        self.assertEqual(occupancy.free_mask, 0b0110)
+        self.assertEqual(occupancy.first_free(), time(9, 30))
+        self.assertEqual(occupancy.free_slots(), [time(9, 30), time(10)])
+        self.assertEqual(occupancy.booked_runs(), [(time(9), 30), (time(10, 30), 30)])
+
+    def test_bookings_book_every_slot_they_overlap(self):
+        occupancy = Occupancy.for_barber(self.barber)
+        # 9:15 to 9:45 rounds out to the 9:00 and 9:30 slots
+        occupancy.book(time(9, 15))
+        self.assertEqual(occupancy.booked, 0b0011)
+        occupancy.book(time(10), duration_minutes=20)
+        self.assertEqual(occupancy.booked, 0b0111)
+        self.assertEqual(occupancy.booked_runs(), [(time(9), 90)])
+
+        bookings = [(time(9, 15), 30), (time(10), 20)]
+        schedule = DaySchedule.for_barber(self.barber, bookings)
+        self.assertEqual(Occupancy.for_barber(self.barber, bookings).free_slots(), schedule.free_starts(30))
+
+    def test_edges_of_the_day(self):
+        occupancy = Occupancy.for_barber(self.barber)
+        # Times outside the working day book nothing
+        occupancy.book(time(11))
+        occupancy.book(time(8), slots=2)
+        self.assertEqual(occupancy.booked, 0)
+        self.assertFalse(occupancy.is_free(time(9, 15)))
+        self.assertFalse(occupancy.is_free(time(11)))
+
+        # A span running past the end of the day is cut there
+        occupancy.book(time(10, 30), slots=3)
+        self.assertEqual(occupancy.booked, 0b1000)
+        self.assertEqual(occupancy.booked_runs(), [(time(10, 30), 30)])
+        self.assertFalse(occupancy.is_free(time(10, 30)))
+        self.assertEqual(occupancy.free_slots(after=time(9)), [time(9, 30), time(10)])
+
+        occupancy.book(time(8, 30), duration_minutes=120)
+        self.assertTrue(occupancy.is_fully_booked())
+        self.assertIsNone(occupancy.first_free())
+        self.assertEqual(occupancy.free_slots(), [])
+
+
+class AvailabilityEngineTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.barbers = [
+            Barber.objects.create(name=name, specialization='Fades', start_time=time(9), end_time=time(10))
+            for name in ('Sam', 'Kim', 'Lee')
+        ]
+        self.monday = next_weekday()
+        self.friday = self.monday + timedelta(days=4)
+        for offset, barber in enumerate(self.barbers):
+            day = self.monday + timedelta(days=offset)
+            Booking.objects.create(customer=user, barber=barber, date=day, time=time(9), service_id='Haircut')
+
+    def test_free_slots_of_a_whole_roster_cost_one_query(self):
+        barbers, monday, friday = self.barbers, self.monday, self.friday
+        with self.assertNumQueries(1):
+            occupancies = availability.load_occupancy(barbers, monday, friday)
+            result = {
+                barber.id: {
+                    day: availability.free_slots(barber, day, occupancies)
+                    for day in availability.daterange(monday, friday)
+                }
+                for barber in barbers
+            }
+
+        self.assertEqual(result[barbers[0].id][monday], [time(9, 30)])
+        self.assertEqual(result[barbers[0].id][friday], [time(9), time(9, 30)])
+        self.assertEqual(result[barbers[2].id][monday + timedelta(days=2)], [time(9, 30)])
+        self.assertEqual(len(result[barbers[1].id]), 5)
+
+    def test_next_available_date_of_a_whole_roster_costs_one_query(self):
+        user = User.objects.get()
+        Booking.objects.create(
+            customer=user, barber=self.barbers[0], date=self.monday, time=time(9, 30), service_id='Haircut'
+        )
+
+        with self.assertNumQueries(1):
+            next_dates = availability.next_available_dates(self.barbers, today=self.monday, days=5)
+        barbers = availability.annotate_next_available(self.barbers, next_dates)
+
+        self.assertEqual(barbers[0].next_available_date, self.monday + timedelta(days=1))
+        self.assertEqual(barbers[1].next_available_date, self.monday)
+        self.assertFalse(barbers[0].is_fully_booked)
+
+    def test_batch_and_single_day_slots_agree_on_off_grid_bookings(self):
+        barber = Barber.objects.create(name='Ash', specialization='Fades', start_time=time(9), end_time=time(11))
+        Booking.objects.create(
+            customer=User.objects.get(), barber=barber, date=self.friday, time=time(9, 45),
+            service_id='Haircut', duration_minutes=30,
+        )
+        single = self.client.get('/available_time_slots/', {'barber_id': barber.id, 'date': self.friday})
+        batch = self.client.get(
+            '/availability/', {'barber_ids': barber.id, 'start': self.friday, 'end': self.friday},
+        )
+        self.assertEqual(single.json()['available_slots'], ['09:00', '10:30'])
+        self.assertEqual(batch.json()['availability'][str(barber.id)][self.friday.isoformat()], ['09:00', '10:30'])
+
+
+class FullDaysTests(TestCase):
+    def test_day_is_full_only_once_every_slot_of_the_barber_is_booked(self):
+        user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        # Three half-hour slots; counting whole hours would make it one or two
+        barber = Barber.objects.create(name='Sam', specialization='Fades', start_time=time(9), end_time=time(10, 30))
+        long_cut = Service.objects.create(name='Long cut', duration_minutes=60)
+        monday = next_weekday()
+
+        create_booking(user, barber, monday, time(9), long_cut)
+        counts = availability.booked_counts([barber], monday, monday)
+        self.assertEqual(counts, {(barber.id, monday): 2})
+        self.assertEqual(availability.full_days_from_counts([barber], counts), set())
+        self.assertEqual(availability.available_dates_by_barber([barber], monday, monday), {barber.id: [monday]})
+
+        create_booking(user, barber, monday, time(10), 'Haircut')
+        counts = availability.booked_counts([barber], monday, monday)
+        self.assertEqual(availability.full_days_from_counts([barber], counts), {(barber.id, monday)})
+        self.assertEqual(availability.available_dates_by_barber([barber], monday, monday), {barber.id: []})
+
+    def test_available_dates_of_a_whole_roster_cost_one_query(self):
+        user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        barbers = [
+            Barber.objects.create(name=name, specialization='Fades', start_time=time(9), end_time=time(10))
+            for name in ('Sam', 'Kim')
+        ]
+        monday = next_weekday()
+        tuesday = monday + timedelta(days=1)
+        for barber in barbers:
+            for value in (time(9), time(9, 30)):
+                Booking.objects.create(customer=user, barber=barber, date=monday, time=value, service_id='Haircut')
+
+        with self.assertNumQueries(1):
+            dates = availability.available_dates(barbers, monday, tuesday + timedelta(days=5))
+        self.assertEqual(dates, [tuesday + timedelta(days=offset) for offset in range(4)])
+
+
+class BookingConstraintTests(TestCase):
+    def test_a_slot_can_only_be_booked_once(self):
+        user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        barber = Barber.objects.create(name='Sam', specialization='Fades')
+        monday = next_weekday()
+        Booking.objects.create(customer=user, barber=barber, date=monday, time=time(9), service_id='Haircut')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Booking.objects.create(customer=user, barber=barber, date=monday, time=time(9), service_id='Haircut')
+        Booking.objects.create(customer=user, barber=barber, date=monday, time=time(9, 30), service_id='Haircut')
+
+    def test_lookups_are_indexed(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Booking._meta.db_table)
+        self.assertEqual(constraints['unique_barber_slot']['columns'], ['barber_id', 'date', 'time'])
+        self.assertTrue(constraints['unique_barber_slot']['unique'])
+        self.assertEqual(constraints['booking_customer_date_idx']['columns'], ['customer_id', 'date', 'time'])
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    CUSTOMERS = 200
+
+    def setUp(self):
+        # TransactionTestCase flushes the services created by the migration
+        Service.objects.get_or_create(name='Haircut', defaults={'duration_minutes': 30})
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades')
+        self.day = next_weekday()
+        self.users = User.objects.bulk_create(
+            [User(username=f'customer{i}', password='!') for i in range(self.CUSTOMERS)]
+        )
+
+    def test_exactly_one_of_many_simultaneous_requests_wins(self):
+        barrier = threading.Barrier(self.CUSTOMERS, timeout=60)
+        statuses = []
+        errors = []
+
+        clients = []
+        for user in self.users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        def book(client):
+            try:
+                barrier.wait()
+                response = client.post('/book/', {
+                    'barber': self.barber.id,
+                    'date': self.day.isoformat(),
+                    'time': '10:00',
+                    'service': 'Haircut',
+                })
+                statuses.append(response.status_code)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(statuses.count(302), 1)
+        self.assertEqual(statuses.count(200), self.CUSTOMERS - 1)
+        self.assertEqual(Booking.objects.filter(barber=self.barber, date=self.day, time=time(10)).count(), 1)
+
+    def test_create_booking_rejects_taken_slot(self):
+        create_booking(self.users[0], self.barber, self.day, time(10), 'Haircut')
+        with self.assertRaises(SlotUnavailable):
+            create_booking(self.users[1], self.barber, self.day, time(10), 'Haircut')
+
+    def test_move_booking_into_taken_slot_keeps_original(self):
+        create_booking(self.users[0], self.barber, self.day, time(10), 'Haircut')
+        booking = create_booking(self.users[1], self.barber, self.day, time(11), 'Haircut')
+        with self.assertRaises(SlotUnavailable):
+            move_booking(booking, self.barber, self.day, time(10))
+        booking.refresh_from_db()
+        self.assertEqual(booking.time, time(11))
+
+
+class BookableDayTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades')
+        self.monday = next_weekday()
+        self.sunday = self.monday - timedelta(days=1)
+        self.past_monday = self.monday - timedelta(days=7)
+        self.client.force_login(self.user)
+
+    def post(self, url, day):
+        return self.client.post(url, {'barber': self.barber.id, 'date': day, 'time': '10:00', 'service': 'Haircut'})
+
+    def test_booking_page_refuses_past_dates_and_days_off(self):
+        response = self.post('/book/', self.past_monday)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].non_field_errors(), ["You cannot book a past date."])
+        response = self.post('/book/', self.sunday)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Sam does not work on Sunday', response.context['form'].non_field_errors()[0])
+        self.assertFalse(Booking.objects.exists())
+
+        self.assertEqual(self.post('/book/', self.monday).status_code, 302)
+
+    def test_moving_a_booking_refuses_past_dates_and_days_off(self):
+        booking = create_booking(self.user, self.barber, self.monday, time(10), 'Haircut')
+        for day in (self.past_monday, self.sunday):
+            self.assertEqual(self.post(f'/booking/update/{booking.pk}/', day).status_code, 200)
+            with self.assertRaises(DayUnavailable):
+                move_booking(booking, self.barber, day, time(10))
+            booking.refresh_from_db()
+            self.assertEqual(booking.date, self.monday)
+
+    def test_services_refuse_past_dates_and_days_off(self):
+        for day in (self.past_monday, self.sunday):
+            with self.assertRaises(DayUnavailable):
+                create_booking(self.user, self.barber, day, time(10), 'Haircut')
+        self.assertFalse(Booking.objects.exists())
+
+        # Changed hours open a day the barber does not usually work
+        sunday = self.monday + timedelta(days=6)
+        ScheduleException.objects.create(
+            barber=self.barber, kind=ScheduleException.HOURS, start_date=sunday, end_date=sunday,
+            start_time=time(10), end_time=time(12),
+        )
+        create_booking(self.user, self.barber, sunday, time(10), 'Haircut')
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades')
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+
+    def test_booking_queues_emails_without_sending(self):
+        create_booking(self.user, self.barber, next_weekday(), time(10), 'Haircut')
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.PENDING).count(), 2)
+        self.assertEqual(mail.outbox, [])
+
+    def test_worker_sends_batch_over_one_connection(self):
+        for i in range(3):
+            notifications.enqueue(f'Subject {i}', 'Body', ['alex@example.com'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as opened:
+            self.assertEqual(notifications.send_pending(), (3, 0))
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.SENT).exists())
+
+    def test_failed_send_is_retried_with_backoff(self):
+        email = notifications.enqueue('Subject', 'Body', ['alex@example.com'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(notifications.send_pending(max_attempts=2), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), (OutboundEmail.PENDING, 1, 'down'))
+        # Not due again until the backoff has passed
+        self.assertEqual(notifications.send_pending(), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=email.created_at)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            notifications.send_pending(max_attempts=2)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.FAILED)
+
+
+class BatchAvailabilityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.barbers = [Barber.objects.create(name=f'Barber {i}', specialization='Fades') for i in range(3)]
+        self.monday = next_weekday()
+        Booking.objects.create(customer=self.user, barber=self.barbers[0], date=self.monday, time=time(9), service_id='Haircut')
+
+    def test_week_for_all_barbers_in_one_bookings_query(self):
+        ids = ','.join(str(barber.id) for barber in self.barbers)
+        end = self.monday + timedelta(days=6)
+        # One query for the barbers, one for their bookings, one for their time off
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/availability/?barber_ids={ids}&start={self.monday}&end={end}')
+        availability = response.json()['availability']
+
+        self.assertEqual(len(availability), 3)
+        first = availability[str(self.barbers[0].id)]
+        # Weekends are not working days
+        self.assertEqual(len(first), 5)
+        self.assertEqual(first[self.monday.isoformat()][0], '09:30')
+        self.assertEqual(availability[str(self.barbers[1].id)][self.monday.isoformat()][0], '09:00')
+
+    def test_rejects_unknown_barber_and_long_range(self):
+        self.assertEqual(self.client.get('/availability/?barber_ids=999').status_code, 404)
+        end = self.monday + timedelta(days=100)
+        self.assertEqual(self.client.get(f'/availability/?start={self.monday}&end={end}').status_code, 400)
+
+
+class CacheInvalidationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.client.force_login(self.user)
+        # Two slots a day, so two bookings fill it
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades', start_time=time(9), end_time=time(10))
+        self.monday = next_weekday()
+        self.tuesday = self.monday + timedelta(days=1)
+
+    def slots(self, day):
+        response = self.client.get(
+            '/available_time_slots/', {'barber_id': self.barber.id, 'date': day, 'service': 'Haircut'},
+        )
+        return response.json()['available_slots']
+
+    def monday_is_open(self):
+        response = self.client.get(
+            '/fetch_available_dates/',
+            {'barber_id': self.barber.id, 'year': self.monday.year, 'month': self.monday.month},
+        )
+        return self.monday.isoformat() in response.json()['available_dates']
+
+    def book(self, at):
+        response = self.client.post('/book/', {
+            'barber': self.barber.id, 'date': self.monday, 'time': at, 'service': 'Haircut',
+        })
+        self.assertEqual(response.status_code, 302)
+        return Booking.objects.get(barber=self.barber, date=self.monday, time=at)
+
+    def test_booking_views_never_serve_stale_availability(self):
+        # Fill the cache, then change bookings through the views
+        self.assertEqual(self.slots(self.monday), ['09:00', '09:30'])
+        self.assertTrue(self.monday_is_open())
+
+        self.book('09:00')
+        self.assertEqual(self.slots(self.monday), ['09:30'])
+        self.assertTrue(self.monday_is_open())
+        booking = self.book('09:30')
+        self.assertEqual(self.slots(self.monday), [])
+        self.assertFalse(self.monday_is_open())
+
+        self.assertEqual(self.slots(self.tuesday), ['09:00', '09:30'])
+        response = self.client.post(f'/booking/update/{booking.pk}/', {
+            'barber': self.barber.id, 'date': self.tuesday, 'time': '09:00', 'service': 'Haircut',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.slots(self.monday), ['09:30'])
+        self.assertEqual(self.slots(self.tuesday), ['09:30'])
+        self.assertTrue(self.monday_is_open())
+
+        response = self.client.post(f'/booking/delete/{booking.pk}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.slots(self.tuesday), ['09:00', '09:30'])
+
+    def test_versions_are_bumped_again_when_the_transaction_commits(self):
+        before = caching.get_versions([self.barber.id])[self.barber.id]
+        with self.captureOnCommitCallbacks(execute=True):
+            create_booking(self.user, self.barber, self.monday, time(9), 'Haircut')
+            during = caching.get_versions([self.barber.id])[self.barber.id]
+            self.assertNotEqual(during, before)
+            # Whatever a concurrent request caches before the commit uses this version
+            self.slots(self.monday)
+        self.assertNotEqual(caching.get_versions([self.barber.id])[self.barber.id], during)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades', start_time=time(9), end_time=time(10))
+        self.monday = next_weekday()
+        create_booking(self.user, self.barber, self.monday, time(9), 'Haircut')
+
+    async def test_availability_endpoints_run_on_the_event_loop(self):
+        for view in (views.fetch_available_dates, views.available_time_slots, views.batch_availability):
+            self.assertTrue(asyncio.iscoroutinefunction(view))
+
+        response = await self.async_client.get(
+            '/available_time_slots/', {'barber_id': self.barber.id, 'date': self.monday, 'service': 'Haircut'},
+        )
+        self.assertEqual(response.json(), {'available_slots': ['09:30']})
+
+        response = await self.async_client.get(
+            '/fetch_available_dates/',
+            {'barber_id': self.barber.id, 'year': self.monday.year, 'month': self.monday.month},
+        )
+        self.assertIn(self.monday.isoformat(), response.json()['available_dates'])
+
+        response = await self.async_client.get(
+            '/availability/', {'barber_ids': self.barber.id, 'start': self.monday, 'end': self.monday},
+        )
+        self.assertEqual(response.json()['availability'][str(self.barber.id)], {self.monday.isoformat(): ['09:30']})
+
+
+class DaySummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades', start_time=time(9), end_time=time(10))
+        self.other = Barber.objects.create(name='Kim', specialization='Beards', start_time=time(9), end_time=time(10))
+        self.day = next_weekday()
+
+    def summary(self, barber, day):
+        return BarberDaySummary.objects.filter(barber=barber, date=day).values_list('booked_count', 'free_mask').first()
+
+    def test_summary_follows_create_move_and_delete(self):
+        booking = create_booking(self.user, self.barber, self.day, time(9), 'Haircut')
+        self.assertEqual(self.summary(self.barber, self.day), (1, 0b10))
+        create_booking(self.user, self.barber, self.day, time(9, 30), 'Haircut')
+        self.assertEqual(self.summary(self.barber, self.day), (2, 0))
+
+        move_booking(booking, self.other, self.day, time(9, 30))
+        self.assertEqual(self.summary(self.barber, self.day), (1, 0b01))
+        self.assertEqual(self.summary(self.other, self.day), (1, 0b01))
+
+        booking.delete()
+        self.assertIsNone(self.summary(self.other, self.day))
+
+    def test_fully_booked_day_is_unavailable_and_rebuild_matches(self):
+        create_booking(self.user, self.barber, self.day, time(9), 'Haircut')
+        create_booking(self.user, self.barber, self.day, time(9, 30), 'Haircut')
+        dates = summaries.available_dates_by_barber([self.barber, self.other], self.day, self.day)
+        self.assertEqual(dates, {self.barber.id: [], self.other.id: [self.day]})
+
+        before = list(BarberDaySummary.objects.values_list('barber_id', 'date', 'booked_count', 'capacity', 'free_mask'))
+        self.assertEqual(summaries.rebuild(), 1)
+        after = list(BarberDaySummary.objects.values_list('barber_id', 'date', 'booked_count', 'capacity', 'free_mask'))
+        self.assertEqual(before, after)
+
+    def test_refreshing_a_day_reads_its_bookings_and_upserts_one_row(self):
+        create_booking(self.user, self.barber, self.day, time(9), 'Haircut')
+        caching.exception_indexes([self.barber])
+        with self.assertNumQueries(2):
+            summaries.refresh_day(self.barber, self.day)
+        self.assertEqual(self.summary(self.barber, self.day), (1, 0b10))
+
+
+class BookingListQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        barbers = [Barber.objects.create(name=f'Barber {i}', specialization='Fades') for i in range(5)]
+        self.month_start = date.today().replace(day=1)
+        Booking.objects.bulk_create([
+            Booking(
+                customer=self.user,
+                barber=barbers[i % 5],
+                date=self.month_start + timedelta(days=i // 16 % 28),
+                time=time(9 + i % 16 // 2, 30 * (i % 2)),
+                service_id='Haircut',
+                duration_minutes=30,
+            )
+            for i in range(300)
+        ])
+        self.client.force_login(self.user)
+
+    def test_calendar_view_query_count_is_fixed(self):
+        # Session, user and one bookings query joined to barbers
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/calendar/{self.month_start.year}/{self.month_start.month}/')
+        self.assertEqual(len(response.context['weeks']()), 5)
+        self.assertContains(response, 'Barber 4 at')
+
+    def test_calendar_grid_is_cached_until_the_users_bookings_change(self):
+        url = f'/calendar/{self.month_start.year}/{self.month_start.month}/'
+        self.client.get(url)
+        # Session and user only: the grid fragment comes from the cache
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(response, 'Barber 4 at')
+        self.assertNotContains(response, 'Beard Trim')
+
+        booking = Booking.objects.filter(customer=self.user).first()
+        booking.service_id = 'Beard Trim'
+        booking.save()
+        self.assertContains(self.client.get(url), 'Beard Trim')
+
+    def test_handing_bookings_to_another_customer_refreshes_both_calendars(self):
+        other = User.objects.create_user('kim', 'kim@example.com', 'pw')
+        other_client = Client()
+        other_client.force_login(other)
+        url = f'/calendar/{self.month_start.year}/{self.month_start.month}/'
+        self.assertNotContains(other_client.get(url), 'Barber 4 at')
+        self.assertContains(self.client.get(url), 'Barber 4 at')
+
+        for booking in Booking.objects.filter(customer=self.user, barber__name='Barber 4'):
+            booking.customer = other
+            booking.save()
+        self.assertContains(other_client.get(url), 'Barber 4 at')
+        self.assertNotContains(self.client.get(url), 'Barber 4 at')
+
+    def test_view_bookings_query_count_is_fixed(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/bookings/')
+        self.assertContains(response, '<tr>', count=51)
+
+    def test_view_bookings_keyset_pages_cover_every_booking_once(self):
+        seen = []
+        cursor = None
+        while True:
+            url = '/bookings/' + (f'?after={cursor}' if cursor else '')
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            seen.extend(booking.id for booking in response.context['bookings'])
+            cursor = response.context['next_cursor']
+            if cursor is None:
+                break
+        expected = list(Booking.objects.order_by('date', 'time', 'id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(self.client.get('/bookings/?after=bogus').status_code, 400)
+
+    def test_admin_changelist_pages_by_cursor(self):
+        staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(staff)
+        seen = []
+        url = '/admin/booking/booking/'
+        while url:
+            response = self.client.get(url)
+            seen.extend(booking.id for booking in response.context['cl'].result_list)
+            cursor = response.context.get('next_cursor')
+            url = f'/admin/booking/booking/?after={cursor}' if cursor else None
+        self.assertEqual(sorted(seen), sorted(Booking.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_export_streams_every_booking(self):
+        self.assertEqual(self.client.get('/bookings/export/').status_code, 302)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+        response = self.client.get('/bookings/export/')
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 301)
+
+        response = self.client.get(f'/bookings/export/?format=ndjson&start={self.month_start}&end={self.month_start}')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 16)
+        self.assertEqual(rows[0]['date'], self.month_start.isoformat())
+
+
+
+class MonthGridTests(SimpleTestCase):
+    def test_grids_are_shared_per_month_and_week_count(self):
+        grid = month_grid.get_grid(2026, 2)
+        self.assertIs(month_grid.get_grid(2026, 2), grid)
+        self.assertIsNot(month_grid.get_grid(2026, 2, 6), grid)
+        # February 2026 starts on a Sunday
+        self.assertEqual((grid.start_date, grid.end_date), (date(2026, 2, 1), date(2026, 3, 7)))
+        self.assertEqual((grid.prev_month, grid.next_month), (date(2026, 1, 1), date(2026, 3, 1)))
+
+class ImportScheduleTests(TestCase):
+    BARBERS = (
+        'name,specialization,working_days,start_time,end_time\n'
+        'Sam,Fades,"Mon,Tue,Wed,Thu,Fri",09:00,17:00\n'
+        'Kim,Beards,Sun,09:00,17:00\n'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.tuesday = next_weekday(1)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def test_imports_barbers_and_recurring_bookings_skipping_conflicts(self):
+        Barber.objects.create(name='Sam', specialization='Old', start_time=time(10), end_time=time(12))
+        barbers = self.write('barbers.csv', self.BARBERS)
+        # Every other Tuesday for six occurrences, the third of which is taken below
+        taken = self.tuesday + timedelta(weeks=4)
+        rows = [
+            {'customer': 'alex', 'barber': 'Sam', 'date': self.tuesday.isoformat(), 'time': '10:00',
+             'service': 'Haircut', 'every_weeks': 2, 'count': 6},
+            {'customer': 'new', 'barber': 'Sam', 'date': taken.isoformat(), 'time': '10:00', 'service': 'Beard Trim'},
+            {'customer': 'alex', 'barber': 'Kim', 'date': self.tuesday.isoformat(), 'time': '10:00', 'service': 'Beard Trim'},
+            {'customer': 'alex', 'barber': 'Nobody', 'date': self.tuesday.isoformat(), 'time': '10:00', 'service': 'Beard Trim'},
+        ]
+        bookings = self.write('bookings.jsonl', ''.join(json.dumps(row) + '\n' for row in rows))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_schedule', barbers=barbers, bookings=bookings, create_customers=True,
+                         stdout=io.StringIO(), stderr=io.StringIO())
+
+        sam = Barber.objects.get(name='Sam')
+        self.assertEqual((sam.start_time, sam.end_time, Barber.objects.count()), (time(9), time(17), 2))
+        booked = list(Booking.objects.filter(barber=sam).order_by('date').values_list('date', 'customer__username'))
+        self.assertEqual(booked, [(self.tuesday + timedelta(weeks=2 * i), 'alex') for i in range(6)])
+        # The imported days show up in the day summaries
+        self.assertEqual(BarberDaySummary.objects.filter(barber=sam).count(), 6)
+        self.assertFalse(User.objects.filter(username='new').exists())
+
+    def test_malformed_jsonl_rows_are_reported_and_skipped(self):
+        Barber.objects.create(name='Sam', specialization='Fades')
+        day = self.tuesday.isoformat()
+        lines = [
+            json.dumps({'customer': 'alex', 'barber': 'Sam', 'date': day, 'time': '09:00', 'service': 'Haircut'}),
+            '{"customer": "alex", "barber": ',
+            '["not", "an", "object"]',
+            json.dumps({'customer': 'alex', 'barber': 'Sam', 'date': 20261020, 'time': '10:00', 'service': 'Haircut'}),
+            json.dumps({'customer': 'alex', 'barber': 'Sam', 'date': day, 'time': 1100, 'service': 'Haircut'}),
+            json.dumps({'customer': 'alex', 'barber': 'Sam', 'date': day, 'time': '12:00', 'service': 'Haircut',
+                        'every_weeks': [1], 'count': 2}),
+            json.dumps({'customer': 'alex', 'barber': 'Sam', 'date': day, 'time': '13:00', 'service': 'Haircut'}),
+        ]
+        rows = importing.read_rows(io.StringIO('\n'.join(lines) + '\n'), 'jsonl')
+
+        result = importing.import_bookings(rows)
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual(
+            [message.split(':')[0] for message in result.errors], ['line 2', 'line 3', 'line 4', 'line 5', 'line 6'],
+        )
+        self.assertIn('invalid JSON', result.errors[0])
+        self.assertIn('date must be a string', result.errors[2])
+        self.assertIn('time must be a string', result.errors[3])
+        self.assertIn('every_weeks must be a whole number', result.errors[4])
+        self.assertEqual(
+            list(Booking.objects.order_by('time').values_list('time', flat=True)), [time(9), time(13)],
+        )
+
+    def test_conflicts_use_real_intervals_and_schedule_exceptions(self):
+        sam = Barber.objects.create(name='Sam', specialization='Fades', start_time=time(9), end_time=time(17))
+        tuesday, wednesday, thursday = self.tuesday, self.tuesday + timedelta(days=1), self.tuesday + timedelta(days=2)
+        # Off the grid, and running past the end of the day
+        Booking.objects.bulk_create([
+            Booking(customer=self.user, barber=sam, date=tuesday, time=time(10, 15), service_id='Haircut',
+                    duration_minutes=30),
+            Booking(customer=self.user, barber=sam, date=tuesday, time=time(16, 30), service_id='Haircut',
+                    duration_minutes=60),
+        ])
+        ScheduleException.objects.create(barber=sam, kind=ScheduleException.CLOSED, start_date=wednesday,
+                                         end_date=wednesday, start_time=time(12), end_time=time(13))
+        ScheduleException.objects.create(barber=sam, kind=ScheduleException.HOURS, start_date=thursday,
+                                         end_date=thursday, start_time=time(18), end_time=time(20))
+        wanted = [
+            (tuesday, '10:00'), (tuesday, '10:30'), (tuesday, '11:00'), (tuesday, '16:30'),
+            (wednesday, '12:00'), (wednesday, '13:00'), (thursday, '10:00'), (thursday, '18:00'),
+        ]
+        rows = enumerate((
+            {'customer': f'new{i % 3}', 'barber': 'Sam', 'date': day.isoformat(), 'time': at, 'service': 'Haircut'}
+            for i, (day, at) in enumerate(wanted)
+        ), start=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = importing.import_bookings(rows, create_customers=True)
+
+        self.assertEqual(result.created, 3)
+        self.assertEqual([message.split(':')[0] for message in result.errors],
+                         ['line 1', 'line 2', 'line 4', 'line 5', 'line 7'])
+        self.assertIn('already booked', result.errors[2])
+        self.assertIn('is off', result.errors[3])
+        self.assertIn('does not fit', result.errors[4])
+        imported = Booking.objects.filter(customer__username__startswith='new')
+        self.assertEqual(
+            sorted(imported.values_list('date', 'time', 'customer__username')),
+            [(tuesday, time(11), 'new2'), (wednesday, time(13), 'new2'), (thursday, time(18), 'new1')],
+        )
+        new_customers = User.objects.filter(username__startswith='new')
+        self.assertEqual(result.customer_ids, set(new_customers.values_list('id', flat=True)))
+        self.assertEqual(new_customers.count(), 2)
+        # Both new customers are created by one insert
+        self.assertEqual(sum('INSERT INTO "auth_user"' in query['sql'] for query in queries.captured_queries), 1)
+
+    def test_dry_run_rolls_back(self):
+        barbers = self.write('barbers.csv', self.BARBERS)
+        call_command('import_schedule', barbers=barbers, dry_run=True, stdout=io.StringIO())
+        self.assertFalse(Barber.objects.exists())
+
+
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        Barber.objects.create(name='Sam', specialization='Fades')
+
+    def test_server_timing_and_log_line_count_queries(self):
+        with self.settings(REQUEST_PROFILING_SERVER_TIMING=True), self.assertLogs('booking.profiling', 'INFO') as logs:
+            response = self.client.get('/fetch_available_dates/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        timing = logs.records[0].request_timing
+        self.assertEqual(timing['view'], 'fetch_available_dates')
+        self.assertGreaterEqual(timing['db_queries'], 1)
+        self.assertIn(f'db_queries={timing["db_queries"]}', logs.output[0])
+
+    def test_sampled_slow_request_logs_profile(self):
+        with self.settings(REQUEST_PROFILING_SAMPLE_RATE=1.0, REQUEST_PROFILING_SLOW_MS=0), \
+                self.assertLogs('booking.profiling', 'WARNING') as logs:
+            self.client.get('/')
+        self.assertIn('cumulative', logs.output[0])
+
+
+class BenchmarkHotpathsTests(TestCase):
+    SCENARIOS = {
+        'book_appointment', 'fetch_available_dates (one barber)', 'fetch_available_dates (all barbers)',
+        'available_time_slots', 'calendar_view', 'create booking',
+    }
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def benchmark(self, **options):
+        command = 'booking.management.commands.benchmark_hotpaths'
+        test_db = connection.settings_dict['NAME']
+        stdout = io.StringIO()
+        # The test runner already set up the test environment and database, so the command works in them
+        with mock.patch(f'{command}.setup_test_environment'), mock.patch(f'{command}.teardown_test_environment'), \
+                mock.patch.object(connection.creation, 'create_test_db', return_value=test_db), \
+                mock.patch.object(connection.creation, 'destroy_test_db'):
+            call_command('benchmark_hotpaths', sizes=['2:20'], customers=3, repeat=2, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_writes_results_as_json(self):
+        path = os.path.join(self.directory.name, 'results.json')
+        self.benchmark(output=path)
+
+        with open(path) as file:
+            results = json.load(file)
+        self.assertEqual(
+            set(results), {'commit', 'created_at', 'python', 'django', 'database', 'repeat', 'datasets'},
+        )
+        self.assertEqual((results['database'], results['repeat']), (connection.vendor, 2))
+        [dataset] = results['datasets']
+        self.assertEqual((dataset['barbers'], dataset['bookings'], dataset['customers']), (2, 20, 3))
+        self.assertEqual(set(dataset['scenarios']), self.SCENARIOS)
+        for result in dataset['scenarios'].values():
+            self.assertEqual(
+                set(result), {'first_ms', 'median_ms', 'p95_ms', 'min_ms', 'max_ms', 'queries', 'warm_queries'},
+            )
+            self.assertLessEqual(result['min_ms'], result['median_ms'])
+        # Every timed booking request created a booking
+        self.assertEqual(Booking.objects.count(), 20 + 3)
+
+    def test_compares_against_earlier_results(self):
+        path = os.path.join(self.directory.name, 'baseline.json')
+        with open(path, 'w') as file:
+            json.dump({'datasets': [{'barbers': 2, 'bookings': 20, 'scenarios': {
+                'calendar_view': {'median_ms': 1000.0, 'queries': 9, 'warm_queries': 8},
+            }}]}, file)
+
+        output = self.benchmark(compare=path)
+
+        [calendar_line] = [line for line in output.splitlines() if 'calendar_view' in line]
+        self.assertIn('% median, was 9/8 queries)', calendar_line)
+        self.assertNotIn('was', next(line for line in output.splitlines() if 'book_appointment' in line))
+
+
+class SlotTemplateTests(TestCase):
+    COMBO = 'Combo (Haircut + Beard Trim)'
+
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades', start_time=time(9, 30), end_time=time(12))
+        self.barber.refresh_from_db()
+        self.day = next_weekday()
+
+    def test_templates_count_minutes_and_are_shared(self):
+        template = slots.for_barber(self.barber)
+        self.assertEqual(template.times, (time(9, 30), time(10), time(10, 30), time(11), time(11, 30)))
+        self.assertIs(slots.for_barber(Barber.objects.get(pk=self.barber.pk)), template)
+
+        self.barber.end_time = time(11)
+        self.barber.save()
+        self.assertEqual(slots.for_barber(self.barber).count, 3)
+
+    def test_longer_service_blocks_consecutive_slots(self):
+        create_booking(self.user, self.barber, self.day, time(10, 30), 'Haircut')
+        with self.assertRaises(SlotUnavailable):
+            create_booking(self.user, self.barber, self.day, time(10), self.COMBO)
+        create_booking(self.user, self.barber, self.day, time(11), self.COMBO)
+
+        response = self.client.get(f'/available_time_slots/?barber_id={self.barber.id}&date={self.day}')
+        self.assertEqual(response.json()['available_slots'], ['09:30', '10:00'])
+        response = self.client.get(
+            '/available_time_slots/', {'barber_id': self.barber.id, 'date': self.day, 'service': self.COMBO}
+        )
+        self.assertEqual(response.json()['available_slots'], ['09:30'])
+        self.assertEqual(BarberDaySummary.objects.get(barber=self.barber, date=self.day).free_mask, 0b00011)
+
+
+class DayScheduleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades', start_time=time(9), end_time=time(12))
+        self.colour = Service.objects.create(name='Colour', duration_minutes=45)
+        self.day = next_weekday()
+
+    def test_gaps_fit_mixed_durations(self):
+        day = DaySchedule.for_barber(self.barber, [(time(11), 30), (time(9), 45)])
+        self.assertEqual(day.intervals, [(540, 585), (660, 690)])
+        self.assertFalse(day.fits(time(9, 30), 30))
+        self.assertTrue(day.fits(time(10), 45))
+        self.assertFalse(day.fits(time(10, 30), 45))
+        self.assertEqual(day.free_starts(30), [time(10), time(10, 30), time(11, 30)])
+        self.assertEqual(day.free_starts(45), [time(10)])
+        self.assertEqual(day.free_starts(30, after=time(10)), [time(10, 30), time(11, 30)])
+        self.assertIsNone(day.first_fit(90))
+
+    def test_booking_lasts_for_its_service(self):
+        booking = create_booking(self.user, self.barber, self.day, time(9), self.colour)
+        self.assertEqual(booking.duration_minutes, 45)
+        with self.assertRaises(SlotUnavailable):
+            create_booking(self.user, self.barber, self.day, time(9, 30), 'Haircut')
+
+        # Later changes to the service do not stretch existing bookings
+        Service.objects.filter(pk=self.colour.pk).update(duration_minutes=120)
+        create_booking(self.user, self.barber, self.day, time(10), 'Haircut')
+
+        response = self.client.get(
+            '/available_time_slots/', {'barber_id': self.barber.id, 'date': self.day, 'service': 'Colour'}
+        )
+        self.assertEqual(response.json()['available_slots'], [])
+        response = self.client.get(
+            '/available_time_slots/', {'barber_id': self.barber.id, 'date': self.day, 'service': 'Nope'}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class EarliestSlotsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.barbers = [
+            Barber.objects.create(name=name, specialization=specialization, start_time=time(9), end_time=time(10))
+            for name, specialization in (('Sam', 'Fades'), ('Kim', 'Beards'), ('Lee', 'Beards'))
+        ]
+        for barber in self.barbers:
+            barber.refresh_from_db()
+        self.monday = next_weekday()
+
+    def test_merges_barbers_in_time_order_and_loads_only_the_days_reached(self):
+        create_booking(self.user, self.barbers[0], self.monday, time(9), 'Haircut')
+        create_booking(self.user, self.barbers[1], self.monday, time(9), 'Haircut')
+        create_booking(self.user, self.barbers[1], self.monday, time(9, 30), 'Haircut')
+
+        # The full day summaries, Lee's time off (booking loaded the others'),
+        # Monday's bookings, and Tuesday's because Kim's stream moves past
+        # their fully booked Monday when primed
+        with self.assertNumQueries(4):
+            slots = search.earliest_slots(self.barbers, 30, 3, now=datetime.combine(self.monday, time(8)))
+        self.assertEqual(
+            [(start.time(), barber.name) for start, barber in slots],
+            [(time(9), 'Lee'), (time(9, 30), 'Sam'), (time(9, 30), 'Lee')],
+        )
+        self.assertEqual(slots[0][0].date(), self.monday)
+
+        # An hour-long service only fits Lee on Monday, then everyone on Tuesday
+        slots = search.earliest_slots(self.barbers, 60, 2, now=datetime.combine(self.monday, time(8)))
+        self.assertEqual(
+            [(start.date(), barber.name) for start, barber in slots],
+            [(self.monday, 'Lee'), (self.monday + timedelta(days=1), 'Sam')],
+        )
+
+    def test_endpoint_filters_by_specialization(self):
+        response = self.client.get('/availability/next/', {'n': 3, 'specialization': 'beards'})
+        names = {slot['barber'] for slot in response.json()['slots']}
+        self.assertEqual(names, {'Kim', 'Lee'})
+        self.assertEqual(len(response.json()['slots']), 3)
+        self.assertEqual(self.client.get('/availability/next/?n=500').status_code, 400)
+
+
+class WorkingDaysMaskTests(TestCase):
+    def setUp(self):
+        self.sam = Barber.objects.create(name='Sam', specialization='Fades')
+        self.kim = Barber.objects.create(name='Kim', specialization='Beards', working_days=['Sat', 'Sun'])
+
+    def test_day_codes_are_stored_as_a_mask(self):
+        self.assertEqual(self.sam.working_days, 0b0011111)
+        self.kim.refresh_from_db()
+        self.assertEqual(self.kim.working_days, 0b1100000)
+        self.assertEqual(availability.working_weekdays(self.kim), {5, 6})
+
+    def test_filters_by_weekday_in_the_database(self):
+        saturday = next_weekday(5)
+        self.assertQuerySetEqual(Barber.objects.filter(working_days__works_on='Sat'), [self.kim])
+        self.assertQuerySetEqual(Barber.objects.filter(working_days__works_on=saturday - timedelta(days=1)), [self.sam])
+        self.assertEqual(Barber.objects.filter(working_days__works_on=6).count(), 1)
+
+    def test_admin_form_uses_day_checkboxes(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        url = f'/admin/booking/barber/{self.kim.id}/change/'
+        self.assertContains(self.client.get(url), 'type="checkbox" name="working_days" value="Sat"')
+        response = self.client.post(url, {
+            'name': 'Kim', 'specialization': 'Beards', 'start_time': '09:00', 'end_time': '17:00',
+            'working_days': ['Mon', 'Sun'],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.kim.refresh_from_db()
+        self.assertEqual(self.kim.working_days, 0b1000001)
+
+
+class ScheduleExceptionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades', start_time=time(9), end_time=time(12))
+        self.monday = next_weekday()
+        self.saturday = self.monday + timedelta(days=5)
+
+    def add(self, start_date, end_date=None, kind=ScheduleException.CLOSED, start_time=None, end_time=None):
+        return ScheduleException.objects.create(
+            barber=self.barber, kind=kind, start_date=start_date, end_date=end_date or start_date,
+            start_time=start_time, end_time=end_time,
+        )
+
+    def test_index_answers_by_bisection_over_years(self):
+        start = self.monday
+        # Two years of lunch breaks, plus a week off in the middle
+        self.add(start, start + timedelta(days=730), start_time=time(10), end_time=time(10, 30))
+        self.add(start + timedelta(days=400), start + timedelta(days=406))
+        index = schedule_exceptions.load_indexes([self.barber.id])[self.barber.id]
+
+        day = start + timedelta(days=100)
+        self.assertTrue(index.is_blocked(day, 600, 630))
+        self.assertFalse(index.is_blocked(day, 570, 600))
+        self.assertEqual(index.blocked_intervals(day), [(600, 630)])
+        self.assertTrue(index.covers(start + timedelta(days=403), 0, 24 * 60))
+        self.assertFalse(index.affects(start + timedelta(days=800)))
+
+    def test_time_off_blocks_slots_dates_and_bookings(self):
+        # A fixed future Monday, so the day off after it falls in the same month
+        monday = date(2030, 6, 3)
+        tuesday = monday + timedelta(days=1)
+        self.add(monday, start_time=time(9), end_time=time(10))
+        self.add(tuesday)
+
+        response = self.client.get('/available_time_slots/', {'barber_id': self.barber.id, 'date': monday})
+        self.assertEqual(response.json()['available_slots'], ['10:00', '10:30', '11:00', '11:30'])
+        with self.assertRaises(SlotUnavailable):
+            create_booking(self.user, self.barber, monday, time(9, 30), 'Haircut')
+
+        response = self.client.get(
+            '/fetch_available_dates/', {'barber_id': self.barber.id, 'year': monday.year, 'month': monday.month},
+        )
+        dates = response.json()['available_dates']
+        self.assertIn(monday.isoformat(), dates)
+        self.assertNotIn(tuesday.isoformat(), dates)
+
+    def test_partial_time_off_counts_against_a_full_day(self):
+        def open_dates():
+            indexes = caching.exception_indexes([self.barber])
+            counted = availability.available_dates_by_barber([self.barber], self.monday, self.monday, indexes)
+            summarized = summaries.available_dates_by_barber([self.barber], self.monday, self.monday, indexes)
+            self.assertEqual(counted, summarized)
+            return counted[self.barber.id]
+
+        for value in (time(10, 30), time(11), time(11, 30)):
+            create_booking(self.user, self.barber, self.monday, value, 'Haircut')
+        self.assertEqual(open_dates(), [self.monday])
+
+        # Off until 10:15, so the 10:00 slot is lost too
+        time_off = self.add(self.monday, start_time=time(9), end_time=time(10, 15))
+        self.assertEqual(open_dates(), [])
+        summary = BarberDaySummary.objects.get(barber=self.barber, date=self.monday)
+        self.assertEqual((summary.capacity, summary.free_mask), (3, 0))
+
+        time_off.delete()
+        self.assertEqual(open_dates(), [self.monday])
+
+    def test_changed_hours_open_a_day_off(self):
+        self.add(self.saturday, kind=ScheduleException.HOURS, start_time=time(14), end_time=time(15))
+        end = self.saturday + timedelta(days=1)
+        availability = self.client.get(
+            '/availability/', {'barber_ids': self.barber.id, 'start': self.saturday, 'end': end},
+        ).json()['availability'][str(self.barber.id)]
+        self.assertEqual(availability, {self.saturday.isoformat(): ['14:00', '14:30']})
+
+        create_booking(self.user, self.barber, self.saturday, time(14, 30), 'Haircut')
+        slots = search.earliest_slots([self.barber], 30, 1, now=datetime.combine(self.saturday, time(8)))
+        self.assertEqual(slots, [(datetime.combine(self.saturday, time(14)), self.barber)])
+
+        # Overlapping changed hours are rejected
+        clash = ScheduleException(
+            barber=self.barber, kind=ScheduleException.HOURS, start_date=self.saturday, end_date=self.saturday,
+            start_time=time(9), end_time=time(10),
+        )
+        with self.assertRaises(ValidationError):
+            clash.full_clean()
+
+    def test_longer_hours_reopen_a_day_the_usual_hours_fill(self):
+        def open_dates():
+            response = self.client.get('/fetch_available_dates/', {
+                'barber_id': self.barber.id, 'year': self.monday.year, 'month': self.monday.month,
+            })
+            counted = availability.available_dates_by_barber(
+                [self.barber], self.monday, self.monday, caching.exception_indexes([self.barber]),
+            )[self.barber.id]
+            self.assertEqual(self.monday.isoformat() in response.json()['available_dates'], self.monday in counted)
+            return self.monday in counted
+
+        def batch_slots():
+            response = self.client.get(
+                '/availability/', {'barber_ids': self.barber.id, 'start': self.monday, 'end': self.monday},
+            )
+            return response.json()['availability'][str(self.barber.id)][self.monday.isoformat()]
+
+        for hour in (9, 10, 11):
+            create_booking(self.user, self.barber, self.monday, time(hour), 'Haircut')
+            create_booking(self.user, self.barber, self.monday, time(hour, 30), 'Haircut')
+        self.assertFalse(open_dates())
+
+        hours = self.add(self.monday, kind=ScheduleException.HOURS, start_time=time(9), end_time=time(13))
+        summary = BarberDaySummary.objects.get(barber=self.barber, date=self.monday)
+        self.assertEqual((summary.capacity, summary.booked_count), (8, 6))
+        self.assertTrue(open_dates())
+        self.assertEqual(batch_slots(), ['12:00', '12:30'])
+
+        create_booking(self.user, self.barber, self.monday, time(12), 'Haircut')
+        self.assertEqual(batch_slots(), ['12:30'])
+        self.assertTrue(open_dates())
+        create_booking(self.user, self.barber, self.monday, time(12, 30), 'Haircut')
+        self.assertFalse(open_dates())
+
+        # Back to the usual hours, which are still fully booked
+        hours.delete()
+        self.assertEqual(BarberDaySummary.objects.get(barber=self.barber, date=self.monday).capacity, 6)
+        self.assertFalse(open_dates())
+
+
+class ConditionalAvailabilityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades')
+        self.monday = next_weekday()
+        self.slots = {'barber_id': self.barber.id, 'date': self.monday, 'service': 'Haircut'}
+
+    def test_matching_etag_answers_304_without_computing(self):
+        response = self.client.get('/available_time_slots/', self.slots)
+        etag = response['ETag']
+        self.assertIn('must-revalidate', response['Cache-Control'])
+
+        # One query for the service's duration; no bookings or barber lookups
+        with self.assertNumQueries(1):
+            response = self.client.get('/available_time_slots/', self.slots, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        create_booking(self.user, self.barber, self.monday, time(9), 'Haircut')
+        response = self.client.get('/available_time_slots/', self.slots, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['available_slots'][0], '09:30')
+
+    def test_available_dates_etag_covers_every_barber(self):
+        params = {'year': self.monday.year, 'month': self.monday.month}
+        etag = self.client.get('/fetch_available_dates/', params)['ETag']
+        self.assertEqual(
+            self.client.get('/fetch_available_dates/', params, HTTP_IF_NONE_MATCH=etag).status_code, 304,
+        )
+        Barber.objects.create(name='Kim', specialization='Beards')
+        self.assertEqual(
+            self.client.get('/fetch_available_dates/', params, HTTP_IF_NONE_MATCH=etag).status_code, 200,
+        )
+        response = self.client.get('/fetch_available_dates/', {'barber_id': 999, **params})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.alex = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.kim = User.objects.create_user('kim', 'kim@example.com', 'pw')
+        self.lee = User.objects.create_user('lee', 'lee@example.com', 'pw')
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades', start_time=time(9), end_time=time(11))
+        self.monday = next_weekday()
+        self.booking = create_booking(self.alex, self.barber, self.monday, time(9), 'Haircut')
+
+    def wait(self, customer, earliest_time=None, latest_time=None):
+        return WaitlistEntry.objects.create(
+            customer=customer, barber=self.barber, date=self.monday, service_id='Haircut',
+            earliest_time=earliest_time, latest_time=latest_time,
+        )
+
+    def test_cancellation_books_the_first_waiting_customer_in_their_window(self):
+        # 9:30 to 11:00 is taken, so only the cancelled 9:00 can free up
+        for start in (time(9, 30), time(10), time(10, 30)):
+            create_booking(self.alex, self.barber, self.monday, start, 'Haircut')
+        late = self.wait(self.kim, earliest_time=time(10))
+        first = self.wait(self.kim, latest_time=time(9))
+        second = self.wait(self.lee)
+        OutboundEmail.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.delete()
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, WaitlistEntry.BOOKED)
+        self.assertEqual((first.booking.customer, first.booking.time), (self.kim, time(9)))
+        self.assertEqual(WaitlistEntry.objects.filter(status=WaitlistEntry.WAITING).count(), 2)
+        self.assertIn(late, WaitlistEntry.objects.filter(status=WaitlistEntry.WAITING))
+        self.assertIn(second, WaitlistEntry.objects.filter(status=WaitlistEntry.WAITING))
+        self.assertEqual(
+            list(OutboundEmail.objects.values_list('subject', flat=True).order_by('id')),
+            ['Booked From the Waitlist', 'New Booking Created'],
+        )
+
+    def test_moving_a_booking_away_frees_its_time(self):
+        for start in (time(9, 30), time(10), time(10, 30)):
+            create_booking(self.alex, self.barber, self.monday, start, 'Haircut')
+        entry = self.wait(self.lee)
+        other = Barber.objects.create(name='Kim', specialization='Beards')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            move_booking(self.booking, other, self.monday, time(9))
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, WaitlistEntry.BOOKED)
+        self.assertEqual((entry.booking.barber, entry.booking.time), (self.barber, time(9)))
+        # Nothing more to hand out
+        self.assertEqual(waitlist.match(self.barber.id, self.monday), [])
+
+    def test_join_endpoint(self):
+        self.client.force_login(self.lee)
+        response = self.client.post('/waitlist/join/', {
+            'barber': self.barber.id, 'date': self.monday, 'service': 'Haircut',
+            'earliest_time': '10:00', 'latest_time': '09:00',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('latest_time', response.json()['errors'])
+
+        response = self.client.post('/waitlist/join/', {
+            'barber': self.barber.id, 'date': self.monday, 'service': 'Haircut',
+        })
+        self.assertEqual(response.status_code, 201)
+        entry = WaitlistEntry.objects.get(pk=response.json()['id'])
+        self.assertEqual((entry.customer, entry.status), (self.lee, WaitlistEntry.WAITING))
+
+
+class LiveUpdatesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades')
+        self.monday = next_weekday()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def subscribe(self):
+        async def subscribe():
+            return live.get_broker().subscribe(live.channel(self.barber.id, self.monday))
+
+        subscription = self.loop.run_until_complete(subscribe())
+        self.addCleanup(subscription.close)
+        return subscription
+
+    def messages(self, subscription):
+        messages = []
+        while (message := self.loop.run_until_complete(subscription.get(0.01))) is not None:
+            messages.append(message)
+        return messages
+
+    def test_committed_booking_changes_are_published_as_deltas(self):
+        subscription = self.subscribe()
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = create_booking(self.user, self.barber, self.monday, time(9), 'Haircut')
+        with self.captureOnCommitCallbacks(execute=True):
+            move_booking(booking, self.barber, self.monday, time(10))
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+
+        self.assertEqual(self.messages(subscription), [
+            {'event': live.TAKEN, 'time': '09:00', 'duration': 30},
+            {'event': live.FREED, 'time': '09:00', 'duration': 30},
+            {'event': live.TAKEN, 'time': '10:00', 'duration': 30},
+            {'event': live.FREED, 'time': '10:00', 'duration': 30},
+        ])
+        # Nothing is published for other days, or before the commit
+        create_booking(self.user, self.barber, self.monday + timedelta(days=1), time(9), 'Haircut')
+        create_booking(self.user, self.barber, self.monday, time(11), 'Haircut')
+        self.assertEqual(self.messages(subscription), [])
+
+    def test_slow_viewer_is_told_to_resync(self):
+        subscription = self.subscribe()
+        for _ in range(live.QUEUE_SIZE + 1):
+            live.publish(live.TAKEN, self.barber.id, self.monday, time(9), 30)
+        self.assertEqual(self.messages(subscription), [{'event': live.RESYNC}])
+
+    async def test_event_stream(self):
+        response = await self.async_client.get('/availability/events/', {'barber_id': self.barber.id})
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.async_client.get(
+            '/availability/events/', {'barber_id': self.barber.id, 'date': self.monday},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        live.publish(live.FREED, self.barber.id, self.monday, time(9), 30)
+        self.assertEqual(
+            await anext(stream), b'event: slot-freed\ndata: {"time": "09:00", "duration": 30}\n\n',
+        )
+        # The ASGI handler cancels the response when the client disconnects
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertFalse(live.get_broker()._subscriptions)
+
+    @override_settings(LIVE_UPDATES_KEEPALIVE_SECONDS=0.05, LIVE_UPDATES_WSGI_STREAM_SECONDS=0.3)
+    def test_event_stream_ends_under_wsgi(self):
+        response = self.client.get('/availability/events/', {'barber_id': self.barber.id, 'date': self.monday})
+        stream = iter(response.streaming_content)
+        self.assertEqual(next(stream), b'retry: 5000\n\n')
+        threading.Thread(target=live.publish, args=(live.TAKEN, self.barber.id, self.monday, time(9), 30)).start()
+        rest = b''.join(stream)
+        self.assertIn(b'event: slot-taken\ndata: {"time": "09:00", "duration": 30}\n\n', rest)
+        self.assertIn(b': keepalive\n\n', rest)
+        self.assertFalse(live.get_broker()._subscriptions)
+
+    def test_booking_page_only_subscribes_under_asgi(self):
+        self.client.force_login(self.user)
+        self.assertNotContains(self.client.get('/book/'), '/availability/events/')
+
+    async def test_booking_page_subscribes_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/book/')
+        self.assertContains(response, '/availability/events/')
+
+    def test_incomplete_broker_fails_on_creation(self):
+        class PublishOnly(live.Broker):
+            def publish(self, channel, message):
+                return 0
+
+        with self.assertRaises(TypeError):
+            PublishOnly()
+
+
+class WaitlistLockTests(TransactionTestCase):
+    def setUp(self):
+        Service.objects.get_or_create(name='Haircut', defaults={'duration_minutes': 30})
+        self.barber = Barber.objects.create(name='Sam', specialization='Fades', start_time=time(9), end_time=time(10))
+        self.day = next_weekday()
+        self.entry = WaitlistEntry.objects.create(
+            customer=User.objects.create_user('lee', 'lee@example.com', 'pw'),
+            barber=self.barber, date=self.day, service_id='Haircut',
+        )
+
+    def test_match_retries_while_another_transaction_holds_the_lock(self):
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    Barber.objects.select_for_update().get(pk=self.barber.pk)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        self.assertTrue(locked.wait(10))
+        # Fail on the lock straight away rather than waiting it out, so the retries run
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout=0')
+        threading.Timer(0.2, release.set).start()
+        try:
+            with mock.patch.object(services.time, 'sleep', wraps=services.time.sleep) as sleep:
+                booked = waitlist.match(self.barber.id, self.day)
+        finally:
+            release.set()
+            holder.join()
+            connection.close()
+
+        self.assertTrue(sleep.called)
+        self.assertEqual(booked, [self.entry])
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.status, WaitlistEntry.BOOKED)
+        self.assertEqual(self.entry.booking.time, time(9))
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    base_dir = Path('/srv/barbers')
+
+    def profile(self, **environ):
+        with mock.patch.dict(os.environ, environ, clear=True):
+            return databases.from_environment(self.base_dir)
+
+    def test_sqlite_is_the_default(self):
+        settings = self.profile()
+        self.assertEqual(settings['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(settings['NAME'], self.base_dir / 'db.sqlite3')
+        self.assertEqual(settings['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(settings['OPTIONS']['timeout'], 20)
+        self.assertIn('PRAGMA journal_mode=WAL', settings['OPTIONS']['init_command'])
+
+        settings = self.profile(DATABASE_PROFILE='sqlite', SQLITE_PATH='/data/db.sqlite3', SQLITE_BUSY_TIMEOUT='5')
+        self.assertEqual((settings['NAME'], settings['OPTIONS']['timeout']), ('/data/db.sqlite3', 5))
+
+    def test_postgres_with_persistent_connections_or_a_pool(self):
+        settings = self.profile(
+            DATABASE_PROFILE='postgres', POSTGRES_DB='shop', POSTGRES_USER='barber', POSTGRES_HOST='db',
+            DB_CONN_MAX_AGE='120',
+        )
+        self.assertEqual(settings['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((settings['NAME'], settings['USER'], settings['HOST']), ('shop', 'barber', 'db'))
+        self.assertEqual(settings['CONN_MAX_AGE'], 120)
+        self.assertTrue(settings['CONN_HEALTH_CHECKS'])
+        self.assertEqual(settings['OPTIONS'], {})
+
+        settings = self.profile(DATABASE_PROFILE='postgres', DB_POOL='1', DB_POOL_MAX_SIZE='20')
+        self.assertEqual(settings['CONN_MAX_AGE'], 0)
+        self.assertFalse(settings['CONN_HEALTH_CHECKS'])
+        self.assertEqual(settings['OPTIONS']['pool']['max_size'], 20)
+
+    def test_unknown_profile_is_rejected(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, "Unknown DATABASE_PROFILE 'mysql'"):
+            self.profile(DATABASE_PROFILE='mysql')
+
+    def test_benchmark_replaces_the_profiles_journal_mode(self):
+        from booking.management.commands.benchmark_writes import Command
+
+        command = Command().with_journal_mode(self.profile()['OPTIONS']['init_command'], 'delete')
+        self.assertIn('PRAGMA journal_mode=delete', command)
+        self.assertNotIn('WAL', command)
+        self.assertEqual(Command().with_journal_mode(None, 'wal'), 'PRAGMA journal_mode=wal')
@@ -4,13 +4,19 @@ from . import views
 urlpatterns = [
     path('', views.landing_page, name='landing_page'),
     path('home/', views.view_bookings, name='home'),
+    path('bookings/', views.view_bookings, name='view_bookings'),
+    path('bookings/export/', views.export_bookings, name='export_bookings'),
     path('book/', views.book_appointment, name='book_appointment'),
     path('available_time_slots/', views.available_time_slots, name='available_time_slots'),
     path('register/', views.register, name='register'),
     path('accounts/logout/', views.CustomLogoutView.as_view(), name='logout'),
     path('booking/update/<int:pk>/', views.update_booking, name='update_booking'),
     path('booking/delete/<int:pk>/', views.delete_booking, name='delete_booking'),
+    path('waitlist/join/', views.join_waitlist, name='join_waitlist'),
     path('calendar/', views.calendar_view, name='calendar_view'),
     path('calendar/<int:year>/<int:month>/', views.calendar_view, name='calendar_view_by_month'),
     path('fetch_available_dates/', views.fetch_available_dates, name='fetch_available_dates'),
+    path('availability/', views.batch_availability, name='batch_availability'),
+    path('availability/events/', views.slot_events, name='slot_events'),
+    path('availability/next/', views.next_available_slots, name='next_available_slots'),
 ]
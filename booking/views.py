@@ -1,20 +1,57 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth import login
 from django.contrib.auth.views import LogoutView
-from django.core.mail import send_mail
-from django.conf import settings
-from django.http import JsonResponse
-from django.db.models import Count
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
 from datetime import date, timedelta, datetime
-from calendar import monthrange
-from .models import Booking, Barber
-from .forms import BookingForm, CustomUserCreationForm
+from .models import Booking, Barber, Service
+from . import availability, caching, conditional, live, month_grid, search
+from .forms import BookingForm, CustomUserCreationForm, WaitlistForm
+from .pagination import keyset_page
+from .services import SlotUnavailable, create_booking, move_booking
+from .slots import SLOT_MINUTES
 import calendar
+import csv
+import json
+import logging
 from itertools import chain
+from time import monotonic
+
+
+BATCH_MAX_DAYS = 62
+NEXT_SLOTS_MAX = 50
+BOOKINGS_PER_PAGE = 50
+EXPORT_CHUNK_SIZE = 2000
+BOOKING_GRID_WEEKS = 6
+CALENDAR_GRID_WEEKS = 5
+CALENDAR_FRAGMENT_TIMEOUT = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+async def _available_dates_etag(request):
+    barber_id = request.GET.get("barber_id")
+    try:
+        year = int(request.GET.get("year", date.today().year))
+        month = int(request.GET.get("month", date.today().month))
+        barber_ids = [int(barber_id)] if barber_id else None
+    except ValueError:
+        return None
+    if barber_ids is None:
+        # Adding or removing a barber changes the set of versions
+        barber_ids = [pk async for pk in Barber.objects.values_list("id", flat=True)]
+    return conditional.make_etag("dates", year, month, *await conditional.barber_versions(barber_ids))
 
 
-def fetch_available_dates(request):
+@conditional.etag_condition(_available_dates_etag)
+async def fetch_available_dates(request):
     """Fetch available dates for either all barbers or a specific barber."""
     barber_id = request.GET.get("barber_id", None)
 
@@ -30,93 +67,134 @@ def fetch_available_dates(request):
 
     if barber_id:  # Fetch dates for a specific barber
         try:
-            barber = Barber.objects.get(id=barber_id)
-            print(f"Barber ID: {barber_id}, Year: {year}, Month: {month}")
-
-            working_days = {day[:3]: idx for idx, day in enumerate(calendar.day_name)}
-            barber_working_days = [working_days[day] for day in barber.working_days]
-
-            # Calculate available dates for the specific barber
-            available_dates = [
-                (start_date + timedelta(days=i)).isoformat()
-                for i in range((end_date - start_date).days + 1)
-                if (start_date + timedelta(days=i)).weekday() in barber_working_days
-            ]
-
-            # Exclude fully booked dates
-            bookings = Booking.objects.filter(barber=barber, date__range=(start_date, end_date))
-            booked_dates = set(booking.date for booking in bookings)
-
-            available_dates = [d for d in available_dates if date.fromisoformat(d) not in booked_dates]
-
-            return JsonResponse({"available_dates": available_dates})
-
+            barber = await Barber.objects.aget(id=barber_id)
+            logger.debug("Fetching dates for barber %s, year %s, month %s", barber_id, year, month)
         except Barber.DoesNotExist:
             return JsonResponse({"error": "Barber not found"}, status=404)
-
+        barbers = [barber]
     else:  # Fetch combined availability across all barbers
-        print(f"Fetching dates for all barbers, Year: {year}, Month: {month}")
-
-        # Find available dates for all barbers
-        all_available_dates = set()
-
-        for barber in Barber.objects.all():
-            working_days = {day[:3]: idx for idx, day in enumerate(calendar.day_name)}
-            barber_working_days = [working_days[day] for day in barber.working_days]
+        logger.debug("Fetching dates for all barbers, year %s, month %s", year, month)
+        barbers = [barber async for barber in Barber.objects.all()]
 
-            # Calculate barber's available dates
-            barber_available_dates = [
-                (start_date + timedelta(days=i)).isoformat()
-                for i in range((end_date - start_date).days + 1)
-                if (start_date + timedelta(days=i)).weekday() in barber_working_days
-            ]
+    dates = await caching.aavailable_dates(barbers, start_date, end_date)
+    return JsonResponse({"available_dates": [d.isoformat() for d in dates]})
 
-            # Exclude barber's fully booked dates
-            bookings = Booking.objects.filter(barber=barber, date__range=(start_date, end_date))
-            booked_dates = set(booking.date for booking in bookings)
 
-            barber_available_dates = [d for d in barber_available_dates if date.fromisoformat(d) not in booked_dates]
+async def _aservice_duration(request):
+    """Minutes of the ``service`` named in the query string (one slot if none)."""
+    name = request.GET.get("service")
+    if not name:
+        return SLOT_MINUTES
+    return (await aget_object_or_404(Service, name=name)).duration_minutes
 
-            # Add to the combined set
-            all_available_dates.update(barber_available_dates)
 
-        return JsonResponse({"available_dates": list(all_available_dates)})
-
-    
-    
-def fetch_barber_availability(request):
+async def fetch_barber_availability(request):
     """Fetch availability for a barber on a specific date."""
     barber_id = request.GET.get("barber_id")
     selected_date = request.GET.get("date")
 
-    # Fetch the barber and their bookings for the selected date
-    barber = Barber.objects.get(id=barber_id)
-    bookings = Booking.objects.filter(barber=barber, date=selected_date)
+    barber = await Barber.objects.aget(id=barber_id)
+    selected_date_obj = datetime.strptime(selected_date, '%Y-%m-%d').date()
+    day = await caching.aday_schedule(barber, selected_date_obj)
 
-    # Define barber's working hours
-    start_time = barber.start_time  # Assuming Barber model has start_time (e.g., 09:00)
-    end_time = barber.end_time  # Assuming Barber model has end_time (e.g., 17:00)
+    # Past slots are excluded when looking at today
+    now = datetime.now()
+    slots = day.free_starts(
+        await _aservice_duration(request),
+        after=now.time() if selected_date_obj == now.date() else None,
+    )
+    available_slots = [slot.strftime('%H:%M') for slot in slots]
 
-    # Calculate all possible time slots
-    total_slots = [
-        (datetime.combine(date.today(), start_time) + timedelta(minutes=30 * i)).time()
-        for i in range(int((end_time.hour - start_time.hour) * 2))
-    ]
+    return JsonResponse({"available_slots": available_slots})
 
-    # Adjust for the current day to exclude past time slots
-    selected_date_obj = datetime.strptime(selected_date, '%Y-%m-%d').date()
-    if selected_date_obj == datetime.today().date():
-        current_time = datetime.now().time()
-        total_slots = [slot for slot in total_slots if slot > current_time]
 
-    # Subtract booked slots from total slots
-    booked_slots = [booking.time for booking in bookings]
-    available_slots = [slot.strftime('%H:%M') for slot in total_slots if slot not in booked_slots]
+async def next_available_slots(request):
+    """Return the earliest free slots across all barbers.
 
-    return JsonResponse({"available_slots": available_slots})
+    Query parameters: ``n`` (results, default 10, at most NEXT_SLOTS_MAX),
+    optional ``service`` (name; only gaps long enough for it) and
+    ``specialization`` (case-insensitive match on the barber's).
+    """
+    try:
+        limit = int(request.GET.get("n", 10))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= NEXT_SLOTS_MAX:
+        return JsonResponse({"error": f"n must be between 1 and {NEXT_SLOTS_MAX}"}, status=400)
+
+    duration = await _aservice_duration(request)
+    barbers = Barber.objects.order_by("id")
+    if request.GET.get("specialization"):
+        barbers = barbers.filter(specialization__iexact=request.GET["specialization"])
+    barbers = [barber async for barber in barbers]
+
+    slots = await sync_to_async(search.earliest_slots)(barbers, duration, limit)
+    return JsonResponse({
+        "slots": [
+            {
+                "barber_id": barber.id,
+                "barber": barber.name,
+                "date": start.date().isoformat(),
+                "time": start.strftime("%H:%M"),
+            }
+            for start, barber in slots
+        ]
+    })
+
+
+async def batch_availability(request):
+    """Fetch free slots for several barbers over a date range in one request.
+
+    Query parameters: ``barber_ids`` (comma separated, default all barbers),
+    ``start`` and ``end`` (ISO dates, inclusive, at most BATCH_MAX_DAYS apart).
+    """
+    try:
+        start_date = date.fromisoformat(request.GET.get("start", date.today().isoformat()))
+        end_date = date.fromisoformat(request.GET.get("end", start_date.isoformat()))
+        barber_ids = [int(i) for i in request.GET.get("barber_ids", "").split(",") if i]
+    except ValueError:
+        return JsonResponse({"error": "Invalid barber_ids, start or end"}, status=400)
+    if not start_date <= end_date < start_date + timedelta(days=BATCH_MAX_DAYS):
+        return JsonResponse({"error": f"The range must span 1 to {BATCH_MAX_DAYS} days"}, status=400)
+
+    barbers = Barber.objects.all()
+    if barber_ids:
+        barbers = barbers.filter(id__in=barber_ids)
+    barbers = [barber async for barber in barbers]
+    if barber_ids and len(barbers) != len(set(barber_ids)):
+        return JsonResponse({"error": "Barber not found"}, status=404)
+
+    # One bookings query for every barber and day in the range
+    exceptions = await caching.aexception_indexes(barbers)
+    occupancies = await availability.aload_occupancy(barbers, start_date, end_date, exceptions)
+    slots = availability.free_slots_by_barber(
+        barbers, start_date, end_date, occupancies, now=datetime.now(), exceptions=exceptions,
+    )
+    return JsonResponse({
+        "availability": {
+            str(barber_id): {
+                day.isoformat(): [slot.strftime('%H:%M') for slot in day_slots]
+                for day, day_slots in days.items()
+            }
+            for barber_id, days in slots.items()
+        }
+    })
 
 
 def book_appointment(request):
+    form = None
+    if request.method == "POST":
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        form = BookingForm(request.POST)
+        if form.is_valid():
+            try:
+                create_booking(request.user, **form.cleaned_data)
+            except SlotUnavailable as exc:
+                form.add_error(None, str(exc))
+            else:
+                return redirect('view_bookings')
+
     today = date.today()
     selected_date = request.GET.get("date", None)
 
@@ -127,186 +205,174 @@ def book_appointment(request):
     year = selected_date_obj.year
     month = selected_date_obj.month
 
-    first_day_of_month = date(year, month, 1)
-    days_in_month = monthrange(year, month)[1]
-    first_weekday = (first_day_of_month.weekday() + 1) % 7
-
-    start_date = first_day_of_month - timedelta(days=first_weekday)
-    end_date = start_date + timedelta(days=41)
+    # Six Sunday-first weeks, shared by every request for this month
+    calendar_days = month_grid.get_grid(year, month, BOOKING_GRID_WEEKS).weeks
 
-    calendar_days = []
-    current_date = start_date
-    week = []
-
-    while current_date <= end_date:
-        week.append(current_date)
-        if len(week) == 7:
-            calendar_days.append(week)
-            week = []
-        current_date += timedelta(days=1)
-
-    barbers = Barber.objects.all()
-    for barber in barbers:
-        start_time = barber.start_time
-        end_time = barber.end_time
-
-        # Check availability for the next 30 days
-        available_dates = []
-        for single_date in (today + timedelta(days=i) for i in range(30)):
-            total_slots = [
-                (datetime.combine(single_date, start_time) + timedelta(minutes=30 * i)).time()
-                for i in range(int((end_time.hour - start_time.hour) * 2))
-            ]
-
-            # Check for booked slots
-            bookings = Booking.objects.filter(barber=barber, date=single_date)
-            booked_slots = [b.time for b in bookings]
-
-            # If any slot is available, add the date to available dates
-            if any(slot for slot in total_slots if slot not in booked_slots):
-                available_dates.append(single_date)
-
-        barber.next_available_date = available_dates[0] if available_dates else None
-        barber.is_fully_booked = not bool(available_dates)
-
-    services = [
-        {"id": 1, "name": "Haircut"},
-        {"id": 2, "name": "Beard Trim"},
-        {"id": 3, "name": "Combo (Haircut + Beard Trim)"},
-    ]
+    # Next available date per barber over the next 30 days, from one bookings query
+    barbers = list(Barber.objects.all())
+    availability.annotate_next_available(barbers, caching.next_available_dates(barbers, today))
 
     context = {
         "barbers": barbers,
-        "services": services,
+        "services": Service.objects.order_by("id"),
         "selected_date": selected_date,
         "calendar_days": calendar_days,
         "year": year,
         "month": month,
+        "form": form,
+        # Only ASGI streams live updates without holding a worker per viewer
+        "live_updates": isinstance(request, ASGIRequest),
     }
-    print(f"Barber: {barber.name}, Fully Booked: {barber.is_fully_booked}, Next Available Date: {barber.next_available_date}")
+    if logger.isEnabledFor(logging.DEBUG):
+        for barber in barbers:
+            logger.debug(
+                "Barber: %s, fully booked: %s, next available date: %s",
+                barber.name, barber.is_fully_booked, barber.next_available_date,
+            )
 
     return render(request, "booking/book_appointment.html", context)
 
 
-
-
-
-
-def available_time_slots(request):
+async def _time_slots_etag(request):
+    try:
+        barber_id = int(request.GET.get("barber_id"))
+        day = datetime.strptime(request.GET.get("date"), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+    # The service's duration, not its name, decides which starts fit
+    duration = await _aservice_duration(request)
+    return conditional.make_etag(
+        "slots", barber_id, day, duration, *await conditional.barber_versions([barber_id]),
+    )
+
+
+@conditional.etag_condition(_time_slots_etag)
+async def available_time_slots(request):
     """Fetch available time slots for a barber and date."""
     if request.method == "GET":
         barber_id = request.GET.get("barber_id")
         selected_date = request.GET.get("date")
-        barber = get_object_or_404(Barber, id=barber_id)
-        bookings = Booking.objects.filter(barber=barber, date=selected_date)
-
-        # Generate all possible time slots (e.g., 9:00 AM to 5:00 PM)
-        start_time = barber.start_time
-        end_time = barber.end_time
-        all_time_slots = [
-            (datetime.combine(date.today(), start_time) + timedelta(minutes=30 * i)).time()
-            for i in range(int((end_time.hour - start_time.hour) * 2))
-        ]
-
-        # Exclude booked time slots
-        booked_slots = [b.time for b in bookings]
-        available_slots = [slot.strftime("%H:%M") for slot in all_time_slots if slot not in booked_slots]
+        barber = await aget_object_or_404(Barber, id=barber_id)
+        selected_date_obj = datetime.strptime(selected_date, '%Y-%m-%d').date()
+        # Only start times with a gap long enough for the service
+        day = await caching.aday_schedule(barber, selected_date_obj)
+        slots = day.free_starts(await _aservice_duration(request))
+        available_slots = [slot.strftime("%H:%M") for slot in slots]
         return JsonResponse({"available_slots": available_slots})
 
-    
-    
-@login_required
-def calendar_view(request, year=None, month=None):
-    """Display a calendar with bookings for a specific month."""
-    today = date.today()
 
-    # Default to current year and month if not provided
-    year = year or today.year
-    month = month or today.month
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    # Get the first day and the number of days in the current month
-    first_day_of_month = date(year, month, 1)
-    days_in_month = monthrange(year, month)[1]  # Total days in the current month
 
-    # Weekday of the first day of the month (0 = Monday, 6 = Sunday)
-    first_weekday = first_day_of_month.weekday()
+def _sse_message(message):
+    # Messages are shared between viewers, so leave them as they are
+    return _sse(message["event"], {key: value for key, value in message.items() if key != "event"})
 
-    # Adjust for Sunday-based calendars (Sunday = 0, Saturday = 6)
-    first_weekday = (first_weekday + 1) % 7
 
-    # Calculate the start date (the Sunday before the first day of the month)
-    start_date = first_day_of_month - timedelta(days=first_weekday)
+async def _aslot_stream(channel, keepalive):
+    subscription = live.get_broker().subscribe(channel)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            message = await subscription.get(keepalive)
+            yield ": keepalive\n\n" if message is None else _sse_message(message)
+    finally:
+        subscription.close()
+
+
+def _slot_stream(channel, keepalive, lifetime):
+    """Sync stream for WSGI, which ends after ``lifetime`` seconds so the worker is freed; browsers reconnect."""
+    subscription = live.get_broker().subscribe(channel)
+    deadline = monotonic() + lifetime
+    try:
+        yield "retry: 5000\n\n"
+        while (remaining := deadline - monotonic()) > 0:
+            message = subscription.get(min(keepalive, remaining))
+            yield ": keepalive\n\n" if message is None else _sse_message(message)
+    finally:
+        subscription.close()
 
-    # Calculate the end date (ensure there are 35 slots: 5 rows × 7 columns)
-    end_date = start_date + timedelta(days=34)
 
-    # Generate a list of all days to display in the calendar
-    calendar_days = []
-    current_date = start_date
-    while current_date <= end_date:
-        calendar_days.append(current_date)
-        current_date += timedelta(days=1)
+async def slot_events(request):
+    """Stream slot-taken and slot-freed deltas of a barber's day as server-sent events.
+
+    Under ASGI every open stream is a coroutine waiting on its subscription.
+    WSGI buffers async streams whole, so there the stream is read on the
+    worker thread and closed after ``LIVE_UPDATES_WSGI_STREAM_SECONDS``.
+    """
+    try:
+        barber_id = int(request.GET.get("barber_id"))
+        day = datetime.strptime(request.GET.get("date"), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "barber_id and date (YYYY-MM-DD) are required"}, status=400)
+    if not await Barber.objects.filter(pk=barber_id).aexists():
+        return JsonResponse({"error": "Barber not found"}, status=404)
+
+    channel = live.channel(barber_id, day)
+    keepalive = getattr(settings, "LIVE_UPDATES_KEEPALIVE_SECONDS", 15)
+    if isinstance(request, ASGIRequest):
+        stream = _aslot_stream(channel, keepalive)
+    else:
+        stream = _slot_stream(channel, keepalive, getattr(settings, "LIVE_UPDATES_WSGI_STREAM_SECONDS", 30))
+
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
 
-    # Get bookings for the range of dates
-    bookings = Booking.objects.filter(customer=request.user, date__range=(start_date, end_date))
 
-    # Group bookings by date
-    bookings_by_date = {}
-    for booking in bookings:
-        if booking.date not in bookings_by_date:
-            bookings_by_date[booking.date] = []
-        bookings_by_date[booking.date].append(booking)
+@login_required
+def calendar_view(request, year=None, month=None):
+    """Display a calendar with bookings for a specific month."""
+    today = date.today()
+
+    # Default to current year and month if not provided
+    year = year or today.year
+    month = month or today.month
 
-    # Get the previous and next months
-    prev_month = (first_day_of_month - timedelta(days=1)).replace(day=1)
-    next_month = (first_day_of_month + timedelta(days=days_in_month)).replace(day=1)
+    # Five Sunday-first weeks, shared by every request for this month
+    grid = month_grid.get_grid(year, month, CALENDAR_GRID_WEEKS)
+
+    def weeks():
+        # Only called when the template's cached fragment for this user's
+        # bookings version is missing
+        bookings = (
+            Booking.objects.filter(customer=request.user, date__range=(grid.start_date, grid.end_date))
+            .select_related('barber')
+            .only('date', 'time', 'service', 'barber__name')
+            .order_by('date', 'time')
+        )
+        bookings_by_date = {}
+        for booking in bookings:
+            bookings_by_date.setdefault(booking.date, []).append(booking)
+        return grid.overlay(bookings_by_date)
 
     context = {
         'year': year,
         'month': month,
-        'month_name': first_day_of_month.strftime('%B'),
-        'calendar_days': calendar_days,
-        'bookings_by_date': bookings_by_date,
-        'prev_month': prev_month,
-        'next_month': next_month,
+        'month_name': grid.month_name,
+        'weeks': weeks,
+        'prev_month': grid.prev_month,
+        'next_month': grid.next_month,
+        'bookings_version': caching.user_bookings_version(request.user.id),
+        'fragment_timeout': CALENDAR_FRAGMENT_TIMEOUT,
     }
 
     return render(request, 'booking/calendar.html', context)
 
 
-def send_confirmation_email(booking):
-    subject = "Booking Confirmation"
-    message = f"Dear {booking.customer.username},\n\nYour booking with {booking.barber.name} on {booking.date} at {booking.time} has been confirmed.\n\nThank you!"
-    recipient = [booking.customer.email]
-    send_mail(subject, message, settings.EMAIL_HOST_USER, recipient, fail_silently=False)
-    
-    
 def landing_page(request):
     """Landing page displaying services and barbers."""
-    # Example: Fetch barbers and services from the database
     barbers = Barber.objects.all()
-    services = [
-        {"name": "Haircut", "description": "Professional haircut tailored to your style."},
-        {"name": "Beard Trim", "description": "Expert beard grooming and styling."},
-        {"name": "Combo", "description": "Haircut and beard trim package."},
-    ]
     context = {
         "barbers": barbers,
-        "services": services,
+        "services": Service.objects.order_by("id"),
     }
     return render(request, 'booking/landing_page.html', context)
 
 
-@login_required
-def view_bookings(request):
-    """View all bookings for the logged-in user"""
-    bookings = Booking.objects.filter(customer=request.user)  # Only logged-in user's bookings
-    return render(request, 'booking/view_bookings.html', {'bookings': bookings})
-
-
-
-
-
 def register(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
@@ -325,10 +391,23 @@ class CustomLogoutView(LogoutView):
 
 @login_required
 def view_bookings(request):
-    """View all bookings for the logged-in user"""
-    bookings = Booking.objects.filter(customer=request.user)
-    return render(request, 'booking/view_bookings.html', {'bookings': bookings})
-
+    """View the logged-in user's bookings, one keyset page at a time"""
+    bookings = (
+        Booking.objects.filter(customer=request.user)
+        .select_related('barber')
+        .only('date', 'time', 'service', 'barber__name')
+    )
+    cursor = request.GET.get('after')
+    try:
+        bookings, next_cursor = keyset_page(bookings, cursor, BOOKINGS_PER_PAGE)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid page cursor")
+    context = {
+        'bookings': bookings,
+        'next_cursor': next_cursor,
+        'is_first_page': cursor is None,
+    }
+    return render(request, 'booking/view_bookings.html', context)
 
 
 @login_required
@@ -338,8 +417,12 @@ def update_booking(request, pk):
     if request.method == 'POST':
         form = BookingForm(request.POST, instance=booking)
         if form.is_valid():
-            form.save()
-            return redirect('view_bookings')
+            try:
+                move_booking(booking, **form.cleaned_data)
+            except SlotUnavailable as exc:
+                form.add_error(None, str(exc))
+            else:
+                return redirect('view_bookings')
     else:
         form = BookingForm(instance=booking)
     return render(request, 'booking/booking_form.html', {'form': form})
@@ -354,10 +437,64 @@ def delete_booking(request, pk):
     return render(request, 'booking/delete_booking.html', {'booking': booking})
 
 
-def send_admin_notification(booking):
-    subject = "New Booking Created"
-    message = f"A new booking has been made for {booking.barber.name} on {booking.date} at {booking.time}."
-    recipient = ['admin@example.com', booking.barber.email]
-    send_mail(subject, message, settings.EMAIL_HOST_USER, recipient, fail_silently=False)
+@login_required
+@require_POST
+def join_waitlist(request):
+    """Put the customer on a barber's waitlist for a day, to be booked when time frees up."""
+    form = WaitlistForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    entry = form.save(commit=False)
+    entry.customer = request.user
+    entry.save()
+    return JsonResponse({"id": entry.pk, "status": entry.status}, status=201)
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer rows."""
+
+    def write(self, value):
+        return value
+
+
+EXPORT_FIELDS = ['id', 'date', 'time', 'service', 'barber__name', 'customer__username', 'customer__email']
 
 
+@staff_member_required
+def export_bookings(request):
+    """Stream bookings as CSV or NDJSON with constant memory.
+
+    Query parameters: ``format`` (``csv`` or ``ndjson``), optional ``start``
+    and ``end`` ISO dates.
+    """
+    export_format = request.GET.get("format", "csv")
+    if export_format not in ("csv", "ndjson"):
+        return HttpResponseBadRequest("format must be csv or ndjson")
+
+    bookings = Booking.objects.order_by('date', 'time', 'id')
+    try:
+        if request.GET.get("start"):
+            bookings = bookings.filter(date__gte=date.fromisoformat(request.GET["start"]))
+        if request.GET.get("end"):
+            bookings = bookings.filter(date__lte=date.fromisoformat(request.GET["end"]))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid start or end date")
+
+    rows = bookings.values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if export_format == "csv":
+        writer = csv.writer(_Echo())
+        lines = chain(
+            [writer.writerow(EXPORT_FIELDS)],
+            (writer.writerow(row) for row in rows),
+        )
+        content_type = "text/csv"
+    else:
+        lines = (
+            json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + "\n"
+            for row in rows
+        )
+        content_type = "application/x-ndjson"
+
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="bookings.{export_format}"'
+    return response
@@ -0,0 +1,95 @@
+"""Waitlist matching: hand freed time to waiting customers.
+
+When a booking is deleted or moved away (see :mod:`booking.signals`),
+:func:`match` runs once the transaction commits. It lays the day's
+bookings and time off into a :class:`~booking.schedule.DaySchedule` and
+walks the waiting entries of that barber and day oldest first, offering
+each customer the earliest start inside their window that fits their
+service. Offers are booked through
+:func:`booking.services.book_from_waitlist`, which locks, rechecks and
+retries like any other booking and queues the customer's confirmation in
+the same transaction.
+Waiting entries are read through a partial index on
+``(barber, date, created_at)``, so the matcher does not grow with the
+number of entries ever booked or cancelled.
+"""
+from django.utils import timezone
+
+from . import caching, services
+from .models import Barber, Booking, WaitlistEntry
+from .schedule import DaySchedule
+
+
+# Times an entry is retried after the slot it was offered is taken by someone else
+MATCH_ATTEMPTS = 3
+
+
+def _before(value):
+    """Return the time one minute before ``value``, for the exclusive ``after`` of the schedule."""
+    minutes = value.hour * 60 + value.minute - 1
+    return None if minutes < 0 else value.replace(hour=minutes // 60, minute=minutes % 60)
+
+
+def _first_fit(schedule, entry, now):
+    after = _before(entry.earliest_time) if entry.earliest_time else None
+    if now is not None and (after is None or now > after):
+        after = now
+    duration = entry.service.duration_minutes
+    for start in schedule.iter_free_starts(duration, after):
+        if entry.latest_time and start > entry.latest_time:
+            return None
+        return start
+    return None
+
+
+def _schedule(barber, day):
+    exceptions = caching.exception_indexes([barber])[barber.pk]
+    return DaySchedule.for_barber(
+        barber, Booking.objects.filter(barber=barber, date=day).values_list('time', 'duration_minutes'),
+        day=day, exceptions=exceptions,
+    )
+
+
+def match(barber_id, day):
+    """Book waiting customers of a barber and day into its free time.
+
+    Returns the entries that were booked.
+    """
+    today = timezone.localdate()
+    if day < today:
+        return []
+    # On the day itself only starts still ahead count
+    now = timezone.localtime().time() if day == today else None
+
+    barber = Barber.objects.filter(pk=barber_id).first()
+    if barber is None:
+        return []
+    waiting = list(
+        WaitlistEntry.objects.filter(barber=barber, date=day, status=WaitlistEntry.WAITING)
+        .select_related('customer', 'service').order_by('created_at', 'id')
+    )
+    if not waiting:
+        return []
+
+    booked = []
+    schedule = _schedule(barber, day)
+    for entry in waiting:
+        entry.barber = barber
+        for _ in range(MATCH_ATTEMPTS):
+            start = _first_fit(schedule, entry, now)
+            if start is None:
+                break
+            try:
+                booking = services.book_from_waitlist(entry, start)
+            except services.DayUnavailable:
+                # A day the barber does not work takes no bookings at all
+                return booked
+            except services.SlotUnavailable:
+                # Booked by someone else since the schedule was read
+                schedule = _schedule(barber, day)
+                continue
+            if booking is not None:
+                schedule.add(start, booking.duration_minutes)
+                booked.append(entry)
+            break
+    return booked
@@ -0,0 +1,160 @@
+"""Working days stored as a weekday bitmask.
+
+Bit ``i`` of a mask is set when the barber works on weekday ``i`` (Monday =
+0, as in :meth:`datetime.date.weekday`), so Monday to Friday is ``0b11111``.
+:class:`WeekdaysField` stores the mask in a small integer column and accepts
+the day codes of the old comma-separated field wherever a mask is expected,
+so ``Barber(working_days=['Mon', 'Tue'])`` keeps working and forms still show
+one checkbox per day.
+
+Filtering by weekday happens in the database::
+
+    Barber.objects.filter(working_days__works_on='Sat')
+    Barber.objects.filter(working_days__works_on=some_date)
+
+The lookup compares against the masks that contain the day, so it can use
+the index on the column.
+"""
+from datetime import date
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models.lookups import In
+from django.db.models.query_utils import DeferredAttribute
+
+
+DAYS_OF_WEEK = [
+    ('Mon', 'Monday'),
+    ('Tue', 'Tuesday'),
+    ('Wed', 'Wednesday'),
+    ('Thu', 'Thursday'),
+    ('Fri', 'Friday'),
+    ('Sat', 'Saturday'),
+    ('Sun', 'Sunday'),
+]
+
+DAY_CODES = [code for code, _ in DAYS_OF_WEEK]
+DAY_INDEX = {code: index for index, code in enumerate(DAY_CODES)}
+
+ALL_DAYS = (1 << len(DAY_CODES)) - 1
+WEEKDAYS = 0b0011111
+
+# Every mask fits in 7 bits, so decoding is a table lookup
+_WEEKDAY_SETS = tuple(
+    frozenset(index for index in range(len(DAY_CODES)) if mask >> index & 1) for mask in range(ALL_DAYS + 1)
+)
+
+
+def weekday_bit(day):
+    """Return the bit of a weekday given as a number (Monday = 0), a day code or a date."""
+    if isinstance(day, date):
+        return 1 << day.weekday()
+    if isinstance(day, str):
+        code = day.strip()[:3].title()
+        if code not in DAY_INDEX:
+            raise ValueError(f'unknown weekday {day!r}')
+        return 1 << DAY_INDEX[code]
+    if isinstance(day, int) and 0 <= day < len(DAY_CODES):
+        return 1 << day
+    raise ValueError(f'unknown weekday {day!r}')
+
+
+def to_mask(value):
+    """Return the mask of an int mask, an iterable of days or a comma-separated string of codes."""
+    if isinstance(value, int):
+        if not 0 <= value <= ALL_DAYS:
+            raise ValueError(f'invalid weekday mask {value!r}')
+        return value
+    if isinstance(value, str):
+        value = [day for day in value.split(',') if day.strip()]
+    mask = 0
+    for day in value:
+        mask |= weekday_bit(day)
+    return mask
+
+
+def weekdays(mask):
+    """Return the frozenset of weekday numbers (Monday = 0) in ``mask``."""
+    return _WEEKDAY_SETS[mask]
+
+
+def day_codes(mask):
+    """Return the day codes in ``mask``, Monday first."""
+    return [DAY_CODES[index] for index in sorted(_WEEKDAY_SETS[mask])]
+
+
+def display(mask):
+    return ', '.join(day_codes(mask))
+
+
+class WeekdaysFormField(forms.TypedMultipleChoiceField):
+    """One checkbox per day, cleaned to a mask."""
+
+    widget = forms.CheckboxSelectMultiple
+
+    def __init__(self, **kwargs):
+        kwargs.pop('choices', None)
+        super().__init__(choices=DAYS_OF_WEEK, **kwargs)
+
+    def prepare_value(self, value):
+        if isinstance(value, int):
+            return day_codes(value)
+        return value
+
+    def clean(self, value):
+        return to_mask(super().clean(value))
+
+    def has_changed(self, initial, data):
+        if self.disabled:
+            return False
+        try:
+            return to_mask(initial or 0) != to_mask(data or [])
+        except ValueError:
+            return True
+
+
+class WeekdaysDescriptor(DeferredAttribute):
+    """Turns day codes assigned to the field into a mask."""
+
+    def __set__(self, instance, value):
+        if value is not None:
+            value = to_mask(value)
+        instance.__dict__[self.field.attname] = value
+
+
+class WeekdaysField(models.PositiveSmallIntegerField):
+    """A weekday bitmask; see the module docstring."""
+
+    descriptor_class = WeekdaysDescriptor
+
+    def to_python(self, value):
+        if value is None:
+            return value
+        try:
+            return to_mask(value)
+        except (TypeError, ValueError):
+            raise ValidationError(f'{value!r} is not a set of weekdays.', code='invalid')
+
+    def get_prep_value(self, value):
+        return None if value is None else to_mask(value)
+
+    def formfield(self, **kwargs):
+        # The admin asks every integer field for a number input
+        widget = kwargs.get('widget')
+        if widget is not None and issubclass(widget if isinstance(widget, type) else type(widget), forms.NumberInput):
+            del kwargs['widget']
+        # Skip IntegerField's min_value and max_value, which a choice field does not take
+        return models.Field.formfield(self, **{'form_class': WeekdaysFormField, **kwargs})
+
+
+@WeekdaysField.register_lookup
+class WorksOn(In):
+    """``working_days__works_on=day``: the mask includes ``day``."""
+
+    lookup_name = 'works_on'
+
+    def get_prep_lookup(self):
+        bit = weekday_bit(self.rhs)
+        self.rhs = [mask for mask in range(ALL_DAYS + 1) if mask & bit]
+        return super().get_prep_lookup()